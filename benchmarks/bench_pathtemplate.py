@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: compiled path templates vs. parsing template per call.
+
+Usage: python benchmarks/bench_pathtemplate.py [number_of_paths]
+"""
+import os
+import sys
+import timeit
+
+job_root_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path = [job_root_path] + sys.path
+
+from job.pathtemplate import compile_path_template
+
+
+TEMPLATE = "@root/@job_current/@job_asset_type/@job_asset_name/$USER"
+
+
+class Template(dict):
+    """Three level deep parent chain, like job -> asset -> location."""
+
+    def __init__(self, values, parent=None):
+        super(Template, self).__init__(values)
+        self.parent_template = parent
+
+    def __getitem__(self, key):
+        if key in self.keys():
+            value = super(Template, self).__getitem__(key)
+            if value == None and self.parent_template:
+                return self.parent_template[key]
+            return value
+        return self.parent_template[key]
+
+
+def legacy_expand_path_template(template_object, template):
+    """Copy of LocationTemplate.expand_path_template before compilation."""
+    from os.path import join
+
+    if type(template) in (list, tuple):
+        consists = template
+    elif isinstance(template, str):
+        consists = template.split("/")
+    else:
+        raise EnvironmentError
+
+    expanded_directores = []
+    for element in consists:
+        keyword = element[1:]
+        if element.startswith("@"):
+            value = template_object[keyword]
+        elif element.startswith("$"):
+            value = os.getenv(keyword, None)
+        else:
+            value = element
+        if not value:
+            raise EnvironmentError
+        expanded_directores += [value]
+
+    return join(*expanded_directores)
+
+
+def compiled_expand_path_template(template_object, template):
+    compiled = compile_path_template(template)
+    keywords = {}
+    for keyword in compiled.keywords:
+        keywords[keyword] = template_object[keyword]
+    return compiled.expand(keywords)
+
+
+def main(number=10000):
+    os.environ.setdefault("USER", "artist")
+    job = Template(
+        {
+            "root": "/mnt/jobs",
+            "job_current": "sandbox",
+            "job_asset_type": "shot",
+            "job_asset_name": "shot0010",
+        }
+    )
+    asset = Template({"job_asset_name": None}, parent=job)
+    location = Template({"names": ["work"]}, parent=asset)
+
+    assert legacy_expand_path_template(
+        location, TEMPLATE
+    ) == compiled_expand_path_template(location, TEMPLATE)
+
+    compiled = compile_path_template(TEMPLATE)
+    keywords = dict((k, location[k]) for k in compiled.keywords)
+
+    results = [
+        ("legacy", lambda: legacy_expand_path_template(location, TEMPLATE)),
+        ("compiled", lambda: compiled_expand_path_template(location, TEMPLATE)),
+        ("compiled, pre-resolved", lambda: compiled.expand(keywords)),
+    ]
+
+    print("Expanding %s paths:" % number)
+    for name, function in results:
+        timing = min(timeit.repeat(function, number=number, repeat=5))
+        print("  %-24s %8.2f ms (%.2f us/path)" % (name, timing * 1e3, timing / number * 1e6))
+
+    # Single call expanding all rows at once (see JobTemplate.expand_many()):
+    rows = [("shot%04d" % index,) for index in range(number)]
+    columns = ("job_asset_name",)
+    timing = min(
+        timeit.repeat(lambda: compiled.expand_many(rows, columns, keywords), number=1, repeat=5)
+    )
+    print("  %-24s %8.2f ms (%.2f us/path)" % ("batch", timing * 1e3, timing / number * 1e6))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Startup benchmark: JobTemplate creation with lazy vs. eager subsystems.
+
+Both variants are asked for the same thing (JobTemplate(...)["path_template"]).
+The eager one creates everything JobTemplate.__init__ used to create up
+front (project manager, plugins, preferences and options), the lazy one
+only loads schemas. Schemas come from a temporary fixture, which is kept
+as raw json (schema objects of job.schemas cost the same in both variants).
+
+Usage: python benchmarks/bench_startup.py [number_of_jobs]
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import tempfile
+import timeit
+
+job_root_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path = [job_root_path] + sys.path
+
+from job.template import JobTemplate
+
+
+SETTINGS = {
+    "job_current": "sandbox",
+    "job_asset_type": "shot",
+    "job_asset_name": "shot0010",
+}
+
+SCHEMAS = {
+    "job": {
+        "version": 1,
+        "names": ["sandbox"],
+        "root": "/tmp/jobs",
+        "path_template": "@root/@job_current",
+        "is_link": False,
+        "link_target": None,
+        "user_dirs": False,
+        "sub_dirs": [{"name": "shot", "type": "template"}],
+    },
+    "shot": {
+        "version": 1,
+        "names": ["shot0010"],
+        "path_template": None,
+        "sub_dirs": [{"name": "work", "type": "location", "options": {"names": ["work"]}}],
+    },
+}
+
+
+class LazyJobTemplate(JobTemplate):
+    def make_schema_object(self, candidate, file):
+        return candidate
+
+
+class EagerJobTemplate(LazyJobTemplate):
+    """JobTemplate creating its subsystems in __init__, as it used to."""
+
+    def __init__(self, *args, **kwargs):
+        super(EagerJobTemplate, self).__init__(*args, **kwargs)
+        self.manager, self.plg_manager, self.preferences, self.job_options
+
+
+def make_schemas(root):
+    """Writes SCHEMAS into root/schema/*.schema."""
+    path = os.path.join(root, "schema")
+    os.makedirs(path)
+    for name, schema in SCHEMAS.items():
+        with open(os.path.join(path, name + ".schema"), "w") as file:
+            json.dump(schema, file)
+
+
+def lookup(template=LazyJobTemplate):
+    job = template(log_level=logging.ERROR, schema_cache=False, **SETTINGS)
+    return job["path_template"]
+
+
+def main(number=20):
+    root = tempfile.mkdtemp()
+    os.environ[JobTemplate.JOB_TEMPLATE_PATH_ENV] = root
+    try:
+        make_schemas(root)
+        # First job imports modules.
+        lookup(EagerJobTemplate)
+
+        results = [
+            ("eager __init__", lambda: lookup(EagerJobTemplate)),
+            ("lazy __init__", lambda: lookup(LazyJobTemplate)),
+        ]
+
+        print("Creating %s jobs:" % number)
+        for name, function in results:
+            timing = min(timeit.repeat(function, number=number, repeat=3))
+            print("  %-24s %8.2f ms per job" % (name, timing / number * 1e3))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
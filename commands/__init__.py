@@ -2,6 +2,8 @@ from .create import *
 from .set import *
 from .read import *
 from .write import *
+from .schema import *
+from .helper import *
 import jobcli
 
 # from .samplecommand import *
@@ -57,6 +57,8 @@ def setup_cli():
     # parser.add_argument('--root', default='prefix', help='Overrides root directory (for debugging)')
     # parser.add_argument('--no-local-schema', action='store_true', help='Disable saving/loading local copy of schema on "create"')
     parser.add_argument('--fromdb', action='store_true')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of threads making directories, helps on network file systems [default: 1]')
+    parser.add_argument('--profile', nargs='?', const='job-profile.json', default=None, help='Print timings of create phases and save them as json [default: job-profile.json]')
     # parser.add_argument('--sanitize', action='store_true', help='Convert external names (from Shotgun i.e.)')
     parser.set_defaults(command=lambda args: CreateJobTemplate(cli_options=vars(args)).run())
     return parser
@@ -117,44 +119,139 @@ class CreateJobTemplate(BaseSubCommand):
 
         return job_asset_name_list
 
-    def create_job(
-        self, project, dry_run=False
-    ):
-        """Creates a number of insances of JobTemplates, and executes
-        its create() command to render disk locations.
-        Allows for bulk execution of expression based asset names.
+    def render_job(self, project):
+        """Renders directories of a single asset with ProjectManager.
+
+        Returns: (job_root_path, [paths, ...])
+        """
+        from job.profile import get_profiler
+
+        profiler = get_profiler()
+        with profiler.phase("manager.dry_load"):
+            self.set_manager(project)
+            targets = list(self.manager.dry_load(str(self.manager.project)).get_all_directories())
+        profiler.count("render.paths", len(targets))
+        return self.manager.get_job_root_path(), targets
+
+    def render_job_range(self, project, assets):
+        """Renders directories for a number of assets sharing the same shape.
+        Only a few assets are rendered by ProjectManager: the first one, whose
+        paths make a skeleton (see PathSkeleton), and to verify it the last one
+        plus one asset of every other length of name. The rest is made from the
+        skeleton with asset's name substituted. If any verified asset doesn't
+        match its expansion, assets don't share the shape and the rest is
+        rendered one by one. An asset whose name collides with other parts of
+        its paths is rendered as well.
+
+        When the first asset is yielded, self.manager is its ProjectManager.
 
         Params:
-            project, type, asset, root: to pass to JobTemplate class.
+            project: ProjectManager's settings ('asset' key is ignored).
+            assets:  list of asset names.
+        Yields: (asset, job_root_path, [paths, ...]) in order of assets.
         """
-        
-        from copy import deepcopy
-        from job.template import JobTemplate
-        # from os import environ
-        
-        # Pack arguments so we can ommit None one (like root):
-        # Should we standarize it with some class?
-        # kwargs = {}
-        # kwargs["job_current"] = project
-        # kwargs["job_asset_type"] = type_
-        # kwargs["job_asset_name"] = asset
-        # kwargs["log_level"] = log_level
-        # if root and root != "prefix":
-        #     kwargs["root"] = root
-
-       
-        self.set_manager(project)
-        targets = self.manager.dry_load(str(self.manager.project)).get_all_directories()
+        from job.pathtemplate import PathSkeleton
+        from job.profile import get_profiler
+
+        profiler = get_profiler()
+
+        def with_asset(asset):
+            kwargs = dict(project)
+            kwargs["asset"] = asset
+            return kwargs
+
+        if len(assets) < 3:
+            for asset in assets:
+                yield (asset,) + self.render_job(with_asset(asset))
+            return
+
+        first = assets[0]
+        job_root_path, targets = self.render_job(with_asset(first))
+        first_manager = self.manager
+        skeleton = PathSkeleton([job_root_path] + targets, first)
+
+        samples = [assets[-1]]
+        lengths = set([len(first), len(assets[-1])])
+        for asset in assets[1:-1]:
+            if len(asset) not in lengths:
+                lengths.add(len(asset))
+                samples += [asset]
+
+        rendered = {}
+        shared = True
+        for asset in samples:
+            rendered[asset] = self.render_job(with_asset(asset))
+            expanded = skeleton.expand(asset)
+            if (expanded[0], expanded[1:]) != rendered[asset]:
+                self.logger.warning("Assets don't share the shape (%s), rendering one by one.", asset)
+                shared = False
+                break
+        self.manager = first_manager
+
+        yield first, job_root_path, targets
+        for asset in assets[1:]:
+            if asset in rendered:
+                yield (asset,) + rendered[asset]
+                continue
+            if shared:
+                with profiler.phase("render.skeleton"):
+                    paths = skeleton.expand(asset)
+                if skeleton.verify(asset, paths):
+                    profiler.count("render.paths", len(paths) - 1)
+                    yield asset, paths[0], paths[1:]
+                    continue
+                self.logger.warning("Asset name %s collides with its paths, rendering it.", asset)
+            yield (asset,) + self.render_job(with_asset(asset))
+
+    def get_device(self):
+        """Returns device driver preferred by self.manager's project
+        or None (see create_job()).
+        """
+        from job.profile import get_profiler, DEVICE_OPERATIONS
+
         prefered_devices = self.manager.eval_element('development_variables/DeviceDriver') 
         prefered_devices_list = []
         prefered_devices_list.append(prefered_devices)
-        device = self.plg_manager.get_first_maching_plugin(prefered_devices_list)
+        jobs = self.cli_options.get("jobs") or 1
+        if jobs > 1:
+            device = self.plg_manager.get_first_configured_plugin(prefered_devices_list, jobs=jobs)
+        else:
+            device = self.plg_manager.get_first_maching_plugin(prefered_devices_list)
         if not device:
             self.logger.exception("Can't find prefered device %s", prefered_devices_list)
-            return        
+            return None
         print("Device", device)
+        native_operations = self.plg_manager.get_native_operations(device)
+        device.logger.debug(
+            "Selecting device driver %s (native batch operations: %s)",
+            device, native_operations,
+        )
+        return get_profiler().instrument(device, DEVICE_OPERATIONS, prefix="device.")
+
+    def create_job(
+        self, project, dry_run=False, rendered=None, device=None
+    ):
+        """Creates directories of a project's asset using preferred
+        device driver.
+
+        Params:
+            project:  ProjectManager's settings (project, episode, group, asset).
+            rendered: (job_root_path, targets) if already rendered
+                      (see render_job_range()).
+            device:   device driver if already chosen (see get_device()).
+        """
+        from job.plugin import PathAttributes
+
+        if rendered:
+            job_root_path, targets = rendered
+        else:
+            job_root_path, targets = self.render_job(project)
+
+        if device is None:
+            device = self.get_device()
+        if not device:
+            return
         # Create root asset just in case (project/project/project)
-        job_root_path = self.manager.get_job_root_path()
 
         if device.is_dir(job_root_path):
             self.logger.warning(
@@ -162,16 +259,9 @@ class CreateJobTemplate(BaseSubCommand):
             )
             return
 
-        device.logger.debug("Selecting device driver %s", device)
-    
-
-        for path in targets:
-            if not dry_run:
-                device.make_dir(path)
-                # create_link(path, targets)
-                device.remove_write_permissions(path)
-                device.add_write_permissions(path, {'user': 'read', 'group': 'write'})
-                device.set_ownership(path)
+        if not dry_run:
+            # create_link(path, targets)
+            device.make_dirs([(path, PathAttributes()) for path in targets])
         print("Done")
         
 
@@ -181,6 +271,7 @@ class CreateJobTemplate(BaseSubCommand):
         from copy import deepcopy
         import logging
         from jobcli.job.logger import LoggerFactory
+        from job.profile import profiled
         # from os.path import join
 
         # type_range = self.create_job_asset_range(type_, number_mult=1, zeros=2)
@@ -191,19 +282,37 @@ class CreateJobTemplate(BaseSubCommand):
         for cli_option in self.cli_options:
             print(cli_option, self.cli_options[cli_option])
 
+        try:
+            with profiled(self.cli_options.get("profile")):
+                self.create_assets()
+        finally:
+            # Drivers (and their sessions, log files) are pooled, see PluginManager.create()
+            self.plg_manager.__class__.close_plugins()
+
+    def create_assets(self):
+        """Creates assets given in cli options (see run())."""
         if not self.cli_options["fromdb"]:
             asset = self.cli_options["asset"]
             asset_range = self.create_job_asset_range(asset)
             # type_ = self.cli_options["type"]
         
-             # Assets may contain range expression which we might want to expand:
-            for asset in asset_range:
+            # Assets may contain range expression which we might want to expand.
+            # All assets in a range share directory shape, so we render it once:
+            project = {'project': self.cli_options['project'], 
+                'episode': '$EP', 
+                'group': 'user', 
+                'asset': asset}
+            device = None
+            for asset, job_root_path, targets in self.render_job_range(project, asset_range):
                 print(f"Creating asset {asset}")
-                project = {'project': self.cli_options['project'], 
-                    'episode': '$EP', 
-                    'group': 'user', 
-                    'asset': asset}
-                self.create_job(project)
+                project['asset'] = asset
+                if device is None:
+                    # Device is project's preference, so it's chosen once
+                    # with the first asset's manager (see render_job_range()).
+                    device = self.get_device()
+                    if not device:
+                        return
+                self.create_job(project, rendered=(job_root_path, targets), device=device)
             
 
         # else:
@@ -0,0 +1,111 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+from jobcli.commands.base import BaseSubCommand
+import argparse
+import logging
+
+
+def setup_cli():
+    parser = argparse.ArgumentParser(description='Privileged helper performing device operations')
+    parser.add_argument('action', choices=['start', 'status'], help='start: serve requests in foreground, status: check if helper responds')
+    parser.add_argument('--socket', default=None, help='Unix socket of helper [default: $JOB_HELPER_SOCKET or /var/run/job-helper.sock]')
+    parser.add_argument('--root', action='append', default=None, help='Directory helper may modify (repeatable) [default: $JOB_HELPER_ROOTS]')
+    parser.add_argument('--group', default=None, help='Group allowed to use the socket')
+    parser.add_argument('--mode', default='660', help='Permissions of the socket (octal) [default: 660]')
+    parser.add_argument('--client', action='append', default=[], help='User allowed to send requests (repeatable) [default: --group members or helper\'s user]')
+    parser.add_argument('--client-group', action='append', default=[], help='Group whose members may send requests (repeatable)')
+    parser.add_argument('--owner', action='append', default=[], help='User entries may be given to (repeatable)')
+    parser.add_argument('--owner-group', action='append', default=[], help='Group entries may be given to (repeatable)')
+    parser.set_defaults(command=lambda args: HelperCommand(cli_options=vars(args)).run())
+    return parser
+
+
+class HelperCommand(BaseSubCommand):
+    """Sub command running helper (see job.helper), which performs
+    mkdir/chmod/chown/symlink/copy for LocalDeviceHelper driver, so create
+    doesn't start sudo per operation (or at all).
+    """
+
+    def get_roots(self):
+        import os
+        from job.helper import JOB_HELPER_ROOTS_ENV
+
+        if self.cli_options["root"]:
+            return self.cli_options["root"]
+        return [root for root in os.getenv(JOB_HELPER_ROOTS_ENV, "").split(os.pathsep) if root]
+
+    def run(self):
+        """Entry point for sub command."""
+        from job.helper import HelperServer, HelperClient, get_socket_path
+
+        path = get_socket_path(self.cli_options["socket"])
+
+        if self.cli_options["action"] == "status":
+            if HelperClient(path, timeout=5).ping():
+                self.logger.info("Helper responds on %s", path)
+                return True
+            self.logger.error("Helper doesn't respond on %s", path)
+            return False
+
+        roots = self.get_roots()
+        if not roots:
+            self.logger.error("Helper needs allowed roots (--root or $JOB_HELPER_ROOTS).")
+            return False
+
+        # Helper's own log (connections, malformed requests) goes to stderr:
+        logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        clients = self.cli_options["client"]
+        client_groups = self.cli_options["client_group"]
+        if not clients and not client_groups and self.cli_options["group"]:
+            # Socket's group is who helper serves:
+            client_groups = [self.cli_options["group"]]
+        server = HelperServer(
+            path,
+            roots,
+            mode=int(self.cli_options["mode"], 8),
+            group=self.cli_options["group"],
+            clients=clients,
+            client_groups=client_groups,
+            owners=self.cli_options["owner"],
+            owner_groups=self.cli_options["owner_group"],
+        )
+        self.logger.info("Helper listens on %s for %s", path, ", ".join(roots))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return True
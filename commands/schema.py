@@ -0,0 +1,100 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+from jobcli.commands.base import BaseSubCommand
+import argparse
+
+
+def setup_cli():
+    parser = argparse.ArgumentParser(description='Manage job schemas')
+    parser.add_argument('action', choices=['pack'], help='pack: compile schemas, options and preferences into a single file')
+    parser.add_argument('--output', default=None, help='Pack file [default: $JOB_SCHEMA_PACK or ~/.job/schema.pack]')
+    parser.add_argument('--check', action='store_true', help='Only check if existing pack is up to date')
+    parser.set_defaults(command=lambda args: SchemaCommand(cli_options=vars(args)).run())
+    return parser
+
+
+class SchemaCommand(BaseSubCommand):
+    """Sub command which compiles schemas found in JOB_TEMPLATE_PATH
+    into a pack file, which JobTemplate can load in place of directory scan
+    (see JOB_SCHEMA_PACK environment variable).
+    """
+
+    def get_pack_path(self):
+        import os
+        from os.path import expanduser, join
+        from job.pack import JOB_SCHEMA_PACK_ENV
+
+        if self.cli_options["output"]:
+            return self.cli_options["output"]
+        if os.getenv(JOB_SCHEMA_PACK_ENV, None):
+            return os.getenv(JOB_SCHEMA_PACK_ENV)
+        return join(expanduser("~"), ".job", "schema.pack")
+
+    def run(self):
+        """Entry point for sub command."""
+        from os.path import join
+        from job.pack import SchemaPack, SchemaPackError, get_option_locations
+        from job.template import JobTemplate
+
+        path = self.get_pack_path()
+
+        if self.cli_options["check"]:
+            try:
+                pack = SchemaPack.read(path)
+            except (IOError, OSError, SchemaPackError) as e:
+                self.logger.error("Can't read schema pack %s: %s", path, e)
+                return False
+            if pack.is_stale():
+                self.logger.warning("Schema pack is stale: %s", path)
+                return False
+            self.logger.info("Schema pack is up to date: %s", path)
+            return True
+
+        locations = []
+        for directory in JobTemplate.get_schema_locations():
+            for postfix in JobTemplate.JOB_PATH_POSTFIX:
+                locations += [join(directory, postfix)]
+
+        # FileOptionReader reads default options only from default location
+        # (the first one), JOB_TEMPLATE_PATH ones provide schemas only:
+        option_locations = get_option_locations(
+            JobTemplate.get_schema_locations()[0], JobTemplate.JOB_PATH_POSTFIX
+        )
+        pack = SchemaPack.build(locations, option_locations)
+        pack.write(path)
+        self.logger.info(
+            "Packed %s schemas into %s (%s)", len(pack.schemas), path, pack.digest
+        )
+        return True
@@ -42,6 +42,8 @@ def setup_cli():
     parser.add_argument('asset', default=None, help='Asset for the project')
     # parser.add_argument('type', nargs='?', default=None, help='Type of the project [optional]')
     parser.add_argument('--root', default='/tmp/test', help='Overrides root directory (for debugging)')
+    parser.add_argument('--no-schema-cache', action='store_true', help='Always read schema files (skip schema snapshot in ~/.job/cache)')
+    parser.add_argument('--profile', nargs='?', const='job-profile.json', default=None, help='Print timings of set phases and save them as json [default: job-profile.json]')
     # parser.add_argument('--no-local-schema', action='store_true', help='Disable saving/loading local copy of schema on "create"')
     # parser.add_argument('--sanitize', action='store_true', help='Convert external names (from Shotgun i.e.)')
     parser.set_defaults(command=lambda args: SetEnvironment(cli_options=vars(args)).run())
@@ -172,14 +174,18 @@ class JobEnvironment(object):
         kwargs["job_current"] = self.job_current
         kwargs["job_asset_type"] = self.job_asset_type
         kwargs["job_asset_name"] = self.job_asset_name
-        kwargs["log_level"] = self.log_level
         if self.root:
             kwargs["root"] = self.root
 
-        job_template = JobTemplate(**kwargs)
+        job_template = JobTemplate(
+            log_level=self.log_level,
+            schema_cache=not self.cli_options.get("no_schema_cache"),
+            **kwargs
+        )
         if not self.cli_options["--no-local-schema"]:
             local_schema_paths = job_template.get_local_schema_path()
             job_template.load_schemas(local_schema_paths)
+            # Only job's settings become template's keys:
             super(JobTemplate, job_template).__init__(
                 job_template.schema, "job", **kwargs
             )
@@ -190,22 +196,31 @@ class JobEnvironment(object):
         """Verb using job template to create user subdir.
         TODO: This should be moved to JobTemplate class.
         """
+        from collections import OrderedDict
         from getpass import getuser
         from os.path import join
+        from job.template import RenderedLocation
 
         if not user:
             user = getuser()
 
-        template = self.job_template.render()
+        locations = self.job_template.render_cached()
 
-        for path in template:
-            if template[path]["user_dirs"]:
+        # User dir takes its location's template and attributes, but isn't a link:
+        targets = OrderedDict()
+        for path, location in locations.items():
+            if location["user_dirs"]:
                 user_dir = join(path, user)
-                target = {user_dir: template[path]}
-                ok = self.job_template.create(targets=target)
-                if not ok:
-                    return
-        return ok
+                targets[user_dir] = RenderedLocation(
+                    user_dir,
+                    template=location.template,
+                    parent_path=path,
+                    permissions=location.permissions,
+                    ownership=location.ownership,
+                )
+        if not targets:
+            return True
+        return self.job_template.create(targets=targets)
 
     def get_history_from_file(self, cli_options):
         """Finds historic cli_options to recreate JobEnvironment based on
@@ -251,6 +266,13 @@ class SetEnvironment(BaseSubCommand):
 
     def run(self):
         """Entry point for sub command."""
+        from job.profile import profiled
+
+        with profiled(self.cli_options.get("profile")):
+            self.set_environment()
+
+    def set_environment(self):
+        """Sets up environment of a job given in cli options (see run())."""
         from os.path import join, isdir, expanduser
         from getpass import getuser
         # from job.logger import LoggerFactory
@@ -0,0 +1,231 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import hashlib
+import logging
+from os.path import expanduser, join, isdir
+
+
+def get_cache_path(*names):
+    """Returns location inside ~/.job/cache, creating it if needed."""
+    path = join(expanduser("~"), ".job", "cache")
+    if not isdir(path):
+        os.makedirs(path)
+    return join(path, *names)
+
+
+def make_key(*items):
+    """Stable hash of json serializable items."""
+    data = json.dumps(items, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def write_atomic(path, data):
+    """Writes bytes to a path so readers never see partial file."""
+    from tempfile import NamedTemporaryFile
+
+    directory = os.path.dirname(path)
+    with NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(data)
+    os.replace(file.name, path)
+
+
+class RenderCache(object):
+    """On-disk cache of rendered templates. Each render is kept
+    in a single file named after its key, so invalidation is implicit:
+    once schemas, job arguments or environment change, so does the key.
+
+    File stores a list of paths with per-path attributes:
+    {"version": 1, "attributes": [names...], "rows": [[path, values...], ...]}
+
+    Stale renders are never read again, so only MAX_FILES recently used
+    files are kept (see prune()).
+    """
+
+    VERSION = 1
+    PREFIX = "render"
+    MAX_FILES = 256
+
+    def __init__(self, path=None, log_level=logging.INFO):
+        self.path = path
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.setLevel(log_level)
+
+    def get_file(self, key):
+        if self.path:
+            return join(self.path, "%s-%s.json" % (self.PREFIX, key))
+        return get_cache_path("%s-%s.json" % (self.PREFIX, key))
+
+    def load(self, key, attributes):
+        """Returns list of (path, {attribute: value}) or None on cache miss."""
+        path = self.get_file(key)
+        try:
+            with open(path, "rb") as file:
+                data = json.loads(file.read().decode("utf-8"))
+        except (IOError, OSError, ValueError):
+            return None
+
+        if data.get("version") != self.VERSION:
+            return None
+        if tuple(data.get("attributes", ())) != tuple(attributes):
+            return None
+
+        try:
+            # Mark as recently used for prune():
+            os.utime(path)
+        except OSError:
+            pass
+        return [(row[0], dict(zip(attributes, row[1:]))) for row in data["rows"]]
+
+    def store(self, key, attributes, items):
+        """Saves (path, {attribute: value}) items. Errors are only logged,
+        as cache is never a reason for a command to fail.
+        """
+        rows = [[path] + [values.get(name) for name in attributes] for path, values in items]
+        data = {"version": self.VERSION, "attributes": list(attributes), "rows": rows}
+        try:
+            data = json.dumps(data, separators=(",", ":"), default=str)
+            write_atomic(self.get_file(key), data.encode("utf-8"))
+        except (IOError, OSError, TypeError) as e:
+            self.logger.warning("Can't save render cache %s: %s", key, e)
+            return False
+        self.prune()
+        return True
+
+    def prune(self, max_files=None):
+        """Removes least recently used render files above max_files
+        (MAX_FILES by default). Returns number of removed files.
+        """
+        from glob import glob
+
+        if max_files is None:
+            max_files = self.MAX_FILES
+        directory = os.path.dirname(self.get_file("*"))
+        files = []
+        for path in glob(join(directory, "%s-*.json" % self.PREFIX)):
+            try:
+                files += [(os.stat(path).st_mtime, path)]
+            except OSError:
+                # Removed by another process meanwhile.
+                pass
+        if len(files) <= max_files:
+            return 0
+
+        files.sort(reverse=True)
+        removed = 0
+        for mtime, path in files[max_files:]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def get_stamp(path):
+    """Returns (mtime, size) of a path or None if it doesn't exist."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+class SchemaSnapshot(object):
+    """Pickled result of loading schemas from a list of locations.
+    Snapshot is valid as long as all recorded stamps (mtime and size of
+    location directories and schema files) match the current ones,
+    so it's validated with a few stat() calls instead of globbing
+    and parsing every file.
+    """
+
+    VERSION = 1
+    PREFIX = "schemas"
+
+    def __init__(self, locations, path=None, log_level=logging.INFO):
+        self.locations = list(locations)
+        self.path = path
+        self.key = make_key(self.VERSION, self.locations)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.setLevel(log_level)
+
+    def get_file(self):
+        if self.path:
+            return join(self.path, "%s-%s.pickle" % (self.PREFIX, self.key))
+        return get_cache_path("%s-%s.pickle" % (self.PREFIX, self.key))
+
+    def load(self):
+        """Returns content saved with store() or None if snapshot is stale."""
+        import pickle
+
+        try:
+            with open(self.get_file(), "rb") as file:
+                data = pickle.load(file)
+        except Exception:
+            # Missing, truncated or made by incompatible code. Doesn't matter.
+            return None
+
+        if data.get("version") != self.VERSION:
+            return None
+        if data.get("locations") != self.locations:
+            return None
+
+        for path, stamp in data["stamps"]:
+            if get_stamp(path) != stamp:
+                self.logger.debug("Schema snapshot is stale: %s", path)
+                return None
+
+        return data["content"]
+
+    def store(self, stamps, content):
+        """Saves content with stamps [(path, stamp), ...] taken
+        before reading them.
+        """
+        import pickle
+
+        data = {
+            "version": self.VERSION,
+            "locations": self.locations,
+            "stamps": list(stamps),
+            "content": content,
+        }
+        try:
+            write_atomic(self.get_file(), pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            # Schema objects might not be picklable.
+            self.logger.warning("Can't save schema snapshot: %s", e)
+            return False
+        return True
@@ -0,0 +1,183 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+
+import logging
+from collections import OrderedDict
+
+
+class SchemaGraphError(Exception):
+    """Raised when schemas reference each other in a cycle."""
+
+
+class SchemaGraph(object):
+    """Dependency graph of loaded schemas built once at load time.
+
+    Every 'sub_dirs' list found in schemas is resolved into a list of
+    (name, definition) pairs ready to create LocationTemplates with:
+    template references are looked up in schemas (missing ones are reported
+    and pruned), inline locations are materialized (see make_inline()).
+    Rendering only walks these lists and doesn't touch schemas.
+
+    Lists are kept by their identity, since templates share them with
+    schemas. Templates with overridden 'sub_dirs' won't be found in graph
+    and are resolved on the fly with resolve().
+    """
+
+    def __init__(self, schema, logger=None):
+        self.schema = schema
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        # id(sub_dirs) -> (sub_dirs, [(name, definition), ...], names of templates)
+        self.nodes = OrderedDict()
+        # [(owner, name), ...] of referenced templates absent in schema.
+        self.missing = []
+
+    @classmethod
+    def build(cls, schema, logger=None):
+        """Creates graph of schema. Raises SchemaGraphError on cycles."""
+        graph = cls(schema, logger)
+        for name, definition in schema.items():
+            graph.add(name, definition)
+        graph.check_cycles()
+        return graph
+
+    @staticmethod
+    def make_inline(entry):
+        """Definition of inline location (sub_dirs entry of type 'location'),
+        which inherits all but overridden 'options' from its parent.
+        """
+        definition = {"sub_dirs": []}
+        definition.update(entry.get("options") or {})
+        definition["names"] = [entry["name"]]
+        return definition
+
+    @classmethod
+    def resolve(cls, schema, sub_dirs, owner=None, missing=None):
+        """Returns [(name, definition), ...] for entries of sub_dirs.
+        Names of absent templates are appended to missing list if provided.
+        """
+        resolved = []
+        for entry in sub_dirs or ():
+            name = entry["name"]
+            if entry["type"] == "location":
+                resolved += [(name, cls.make_inline(entry))]
+            elif name in schema:
+                resolved += [(name, schema[name])]
+            elif missing is not None:
+                missing += [(owner, name)]
+        return resolved
+
+    def add(self, owner, definition):
+        """Resolves sub_dirs of definition and of its inline locations."""
+        pending = [(owner, definition)]
+        while pending:
+            owner, definition = pending.pop()
+            sub_dirs = definition.get("sub_dirs")
+            if not sub_dirs or id(sub_dirs) in self.nodes:
+                continue
+
+            missing = []
+            resolved = self.resolve(self.schema, sub_dirs, owner, missing)
+            for owner_name, name in missing:
+                self.logger.error("Template '%s' used by '%s' doesn't exist.", name, owner_name)
+            self.missing += missing
+            templates = frozenset(
+                entry["name"] for entry in sub_dirs if entry["type"] != "location"
+            )
+            self.nodes[id(sub_dirs)] = (sub_dirs, resolved, templates)
+
+            for (name, child), entry in zip(resolved, sub_dirs):
+                if entry["type"] == "location":
+                    pending += [(name, child)]
+
+    def get(self, sub_dirs, changed=()):
+        """Returns resolved sub_dirs or None, if they aren't part of graph
+        or refer to any of changed templates (see SchemaView.changed).
+        """
+        node = self.nodes.get(id(sub_dirs))
+        if node is None or node[0] is not sub_dirs:
+            return None
+        if changed and not node[2].isdisjoint(changed):
+            return None
+        return node[1]
+
+    def children(self, sub_dirs):
+        resolved = self.get(sub_dirs)
+        if resolved is None:
+            resolved = self.resolve(self.schema, sub_dirs)
+        return resolved
+
+    def check_cycles(self):
+        """Walks graph depth first as rendering would do. Template without
+        its own 'sub_dirs' inherits them from its parent, so we track
+        (definition, effective sub_dirs) pairs instead of bare names.
+        """
+        done = set()
+        for name, definition in self.schema.items():
+            sub_dirs = definition.get("sub_dirs")
+            if not sub_dirs:
+                continue
+
+            # Stack items: (state, name, iterator over children)
+            state = (id(definition), id(sub_dirs))
+            if state in done:
+                continue
+            stack = [(state, name, sub_dirs, iter(self.children(sub_dirs)))]
+            on_stack = set([state])
+            while stack:
+                state, owner, sub_dirs, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    on_stack.discard(state)
+                    done.add(state)
+                    stack.pop()
+                    continue
+
+                child_name, child_definition = child
+                child_sub_dirs = child_definition.get("sub_dirs")
+                if child_sub_dirs is None:
+                    child_sub_dirs = sub_dirs
+                if not child_sub_dirs:
+                    continue
+
+                child_state = (id(child_definition), id(child_sub_dirs))
+                if child_state in done:
+                    continue
+                if child_state in on_stack:
+                    cycle = [item[1] for item in stack] + [child_name]
+                    raise SchemaGraphError("Schema cycle: %s" % " -> ".join(cycle))
+                on_stack.add(child_state)
+                stack += [
+                    (child_state, child_name, child_sub_dirs, iter(self.children(child_sub_dirs)))
+                ]
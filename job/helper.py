@@ -0,0 +1,479 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import socket
+import socketserver
+import stat
+import struct
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from os.path import realpath, normpath
+
+# Environment variables with helper's socket and (for the helper itself)
+# roots it may touch, separated with os.pathsep.
+JOB_HELPER_SOCKET_ENV = "JOB_HELPER_SOCKET"
+JOB_HELPER_ROOTS_ENV = "JOB_HELPER_ROOTS"
+DEFAULT_HELPER_SOCKET = "/var/run/job-helper.sock"
+
+
+class HelperError(Exception):
+    """Raised when helper can't be reached or replies with garbage."""
+
+
+def get_socket_path(path=None):
+    """Returns helper's socket: path, $JOB_HELPER_SOCKET or default one."""
+    return path or os.getenv(JOB_HELPER_SOCKET_ENV) or DEFAULT_HELPER_SOCKET
+
+
+# Credentials of a connected client, see HelperServer.get_client.
+HelperClientCredentials = namedtuple("HelperClientCredentials", ("pid", "uid", "gid", "groups"))
+
+
+class HelperOperations(object):
+    """Device operations performed by a helper on behalf of its clients.
+    Every path has to be below one of allowed roots. Paths are walked from
+    root's descriptor component by component with O_NOFOLLOW, and entries
+    are changed through their own descriptors, so no symbolic link (even
+    swapped in meanwhile) leads an operation outside of roots.
+
+    Modes are limited to permission bits (no setuid, setgid or sticky),
+    owners to configured users and groups, and sources of copies to files
+    a client could read itself. Copies belong to a client.
+
+    Operations are dicts with 'op' and its arguments:
+        {"op": "mkdir", "path": p}                    value: False if existed
+        {"op": "attributes", "path": p, "group_write": b, "others_write": b,
+         "user": name, "group": name}                 see PathAttributes
+        {"op": "chmod", "path": p, "mode": int}
+        {"op": "chown", "path": p, "user": name, "group": name}
+        {"op": "symlink", "target": t, "path": p}
+        {"op": "copy", "source": s, "path": p}
+        {"op": "is_dir", "path": p}
+        {"op": "ping"}
+    Results are {"ok": True, "value": ...} or {"ok": False, "error": message}.
+    """
+
+    PERMISSION_BITS = 0o777
+    # Chunk of a copy:
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, roots, users=(), groups=()):
+        """
+        :param roots: directories operations may change.
+        :param users: user names entries may be given to.
+        :param groups: group names entries may be given to.
+        """
+        self.roots = []
+        for root in roots:
+            # Paths may come with root as configured or as resolved:
+            resolved = realpath(root)
+            self.roots += [(normpath(root), resolved), (resolved, resolved)]
+        if not self.roots:
+            raise ValueError("Helper needs at least one allowed root.")
+        self.user_ids = {}
+        self.group_ids = {}
+        self.users = set(self.get_user_id(user) for user in users)
+        self.groups = set(self.get_group_id(group) for group in groups)
+
+    def split_path(self, path):
+        """Returns resolved root and names of components below it or raises
+        PermissionError if path isn't below one of roots.
+        """
+        if not isinstance(path, str) or not os.path.isabs(path):
+            raise PermissionError("Path has to be absolute: %r" % (path,))
+        path = normpath(path)
+        for root, resolved in self.roots:
+            prefix = root.rstrip(os.sep) + os.sep
+            if path.startswith(prefix):
+                return resolved, path[len(prefix) :].split(os.sep)
+        raise PermissionError("Path is outside of allowed roots: %s" % path)
+
+    @contextmanager
+    def open_parent(self, path, create=False):
+        """Opens directory containing path, walking from its root without
+        following symbolic links. With create, missing directories are made.
+        Yields: (directory's descriptor, last component of path).
+        """
+        flags = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+        root, names = self.split_path(path)
+        descriptors = [os.open(root, os.O_RDONLY | os.O_DIRECTORY)]
+        try:
+            for name in names[:-1]:
+                try:
+                    descriptors += [os.open(name, flags, dir_fd=descriptors[-1])]
+                except FileNotFoundError:
+                    if not create:
+                        raise
+                    try:
+                        os.mkdir(name, dir_fd=descriptors[-1])
+                    except FileExistsError:
+                        pass
+                    descriptors += [os.open(name, flags, dir_fd=descriptors[-1])]
+            yield descriptors[-1], names[-1]
+        finally:
+            for descriptor in reversed(descriptors):
+                os.close(descriptor)
+
+    @contextmanager
+    def open_entry(self, path, flags=os.O_RDONLY):
+        """Opens a directory or a regular file without following links.
+        Yields: (descriptor, stat result).
+        """
+        with self.open_parent(path) as (parent, name):
+            info = os.stat(name, dir_fd=parent, follow_symlinks=False)
+            # Others (links, fifos, devices) aren't opened at all:
+            if not (stat.S_ISDIR(info.st_mode) or stat.S_ISREG(info.st_mode)):
+                raise PermissionError("Not a directory nor a regular file: %s" % path)
+            descriptor = os.open(name, flags | os.O_NOFOLLOW | os.O_NONBLOCK, dir_fd=parent)
+            try:
+                yield descriptor, os.fstat(descriptor)
+            finally:
+                os.close(descriptor)
+
+    def get_user_id(self, user):
+        from pwd import getpwnam
+
+        if user not in self.user_ids:
+            self.user_ids[user] = getpwnam(user).pw_uid
+        return self.user_ids[user]
+
+    def get_group_id(self, group):
+        from grp import getgrnam
+
+        if group not in self.group_ids:
+            self.group_ids[group] = getgrnam(group).gr_gid
+        return self.group_ids[group]
+
+    def get_owner_ids(self, user=None, group=None):
+        """Returns (uid, gid) for fchown or raises PermissionError if entries
+        can't be given to user or group.
+        """
+        uid = self.get_user_id(user) if user else -1
+        gid = self.get_group_id(group) if group else -1
+        if uid != -1 and uid not in self.users:
+            raise PermissionError("Helper doesn't give entries to user %s" % user)
+        if gid != -1 and gid not in self.groups:
+            raise PermissionError("Helper doesn't give entries to group %s" % group)
+        return uid, gid
+
+    @staticmethod
+    def chown(descriptor, uid, gid):
+        if uid != -1 or gid != -1:
+            os.fchown(descriptor, uid, gid)
+
+    @staticmethod
+    def can_read(client, info):
+        """True if client could read an entry by itself."""
+        if client.uid == 0:
+            return True
+        if info.st_uid == client.uid:
+            return bool(info.st_mode & stat.S_IRUSR)
+        if info.st_gid in client.groups:
+            return bool(info.st_mode & stat.S_IRGRP)
+        return bool(info.st_mode & stat.S_IROTH)
+
+    def execute(self, operation, client):
+        """Performs an operation for a client. Return: result dict."""
+        try:
+            return {"ok": True, "value": self.dispatch(operation, client)}
+        except Exception as e:
+            return {"ok": False, "error": "%s: %s" % (e.__class__.__name__, e)}
+
+    def dispatch(self, operation, client):
+        kind = operation.get("op")
+        if kind == "ping":
+            return True
+
+        path = operation.get("path")
+        if kind == "mkdir":
+            with self.open_parent(path, create=True) as (parent, name):
+                try:
+                    os.mkdir(name, dir_fd=parent)
+                except FileExistsError:
+                    return False
+            return True
+
+        if kind == "attributes":
+            uid, gid = self.get_owner_ids(operation.get("user"), operation.get("group"))
+            with self.open_entry(path) as (descriptor, info):
+                current = stat.S_IMODE(info.st_mode)
+                mode = (current & ~0o222) | stat.S_IWUSR
+                if operation.get("group_write", True):
+                    mode |= stat.S_IWGRP
+                if operation.get("others_write", False):
+                    mode |= stat.S_IWOTH
+                if mode != current:
+                    os.fchmod(descriptor, mode)
+                self.chown(descriptor, uid, gid)
+            return mode
+
+        if kind == "chmod":
+            mode = int(operation["mode"])
+            if mode & ~self.PERMISSION_BITS:
+                raise PermissionError("Helper sets permission bits only: %o" % mode)
+            with self.open_entry(path) as (descriptor, info):
+                os.fchmod(descriptor, mode)
+            return True
+
+        if kind == "chown":
+            uid, gid = self.get_owner_ids(operation.get("user"), operation.get("group"))
+            with self.open_entry(path) as (descriptor, info):
+                self.chown(descriptor, uid, gid)
+            return True
+
+        if kind == "symlink":
+            with self.open_parent(path) as (parent, name):
+                os.symlink(operation["target"], name, dir_fd=parent)
+            return True
+
+        if kind == "copy":
+            with self.open_entry(operation["source"]) as (source, info):
+                if not stat.S_ISREG(info.st_mode) or not self.can_read(client, info):
+                    raise PermissionError("Client can't read %s" % operation["source"])
+                with self.open_parent(path) as (parent, name):
+                    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW
+                    target = os.open(name, flags, 0o600, dir_fd=parent)
+                    try:
+                        self.copy(source, target)
+                        os.fchown(target, client.uid, client.gid)
+                        os.fchmod(target, stat.S_IMODE(info.st_mode) & self.PERMISSION_BITS)
+                        os.utime(target, ns=(info.st_atime_ns, info.st_mtime_ns))
+                    finally:
+                        os.close(target)
+            return True
+
+        if kind == "is_dir":
+            try:
+                with self.open_parent(path) as (parent, name):
+                    return stat.S_ISDIR(os.stat(name, dir_fd=parent, follow_symlinks=False).st_mode)
+            except (FileNotFoundError, NotADirectoryError):
+                return False
+
+        raise ValueError("Unknown operation: %r" % (kind,))
+
+    def copy(self, source, target):
+        """Copies contents between descriptors."""
+        while True:
+            data = os.read(source, self.BUFFER_SIZE)
+            if not data:
+                break
+            while data:
+                data = data[os.write(target, data) :]
+
+
+class HelperHandler(socketserver.StreamRequestHandler):
+    """Reads newline delimited json requests {"id": n, "operations": [...]}
+    and replies with {"id": n, "results": [...]} in order. Clients may
+    send many requests before reading replies (pipelining). A client
+    server doesn't authorize gets a single error reply.
+    """
+
+    def handle(self):
+        logger = self.server.logger
+        client = self.server.get_client(self.request)
+        if client is None or not self.server.is_authorized(client):
+            logger.warning("Client refused: %s", client)
+            reply = {"id": None, "error": "Client isn't authorized to use helper"}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            return
+        logger.info("Client connected: %s", client)
+
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode("utf-8"))
+                operations = request["operations"]
+                reply = {
+                    "id": request.get("id"),
+                    "results": [self.server.operations.execute(o, client) for o in operations],
+                }
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.warning("Malformed request: %s", e)
+                reply = {"id": None, "error": "Malformed request: %s" % e}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Helper listening on a Unix domain socket, usually started once
+    per host by a privileged user (see 'job helper start'). Access to it
+    is controlled with socket's mode and group, and every connection is
+    authorized by its peer's credentials: client has to be one of clients
+    or a member of client_groups (by default only helper's own user).
+    Entries may be given only to owners and owner_groups.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path,
+        roots,
+        mode=0o660,
+        group=None,
+        clients=(),
+        client_groups=(),
+        owners=(),
+        owner_groups=(),
+        log_level=logging.INFO,
+    ):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.setLevel(log_level)
+        self.operations = HelperOperations(roots, users=owners, groups=owner_groups)
+        self.client_ids = set(self.operations.get_user_id(user) for user in clients)
+        self.client_group_ids = set(self.operations.get_group_id(group) for group in client_groups)
+        if not self.client_ids and not self.client_group_ids:
+            self.client_ids.add(os.getuid())
+        self.path = path
+        if os.path.exists(path):
+            # Stale socket of a helper which didn't exit cleanly:
+            os.unlink(path)
+        socketserver.UnixStreamServer.__init__(self, path, HelperHandler)
+        os.chmod(path, mode)
+        if group:
+            os.chown(path, -1, self.operations.get_group_id(group))
+
+    @staticmethod
+    def get_client(connection):
+        """Returns HelperClientCredentials of connection's peer or None
+        if system doesn't tell them.
+        """
+        from pwd import getpwuid
+
+        try:
+            credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        except (AttributeError, OSError):
+            return None
+        pid, uid, gid = struct.unpack("3i", credentials)
+        try:
+            groups = frozenset(os.getgrouplist(getpwuid(uid).pw_name, gid))
+        except KeyError:
+            groups = frozenset([gid])
+        return HelperClientCredentials(pid, uid, gid, groups)
+
+    def is_authorized(self, client):
+        return client.uid in self.client_ids or bool(client.groups & self.client_group_ids)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class HelperClient(object):
+    """Connection to a helper. Operations are sent in requests of
+    BATCH_SIZE, all of them written before reading replies.
+    """
+
+    BATCH_SIZE = 512
+
+    def __init__(self, path=None, timeout=None):
+        self.path = get_socket_path(path)
+        self.timeout = timeout
+        self.socket = None
+        self.reader = None
+        self.last_id = 0
+
+    def connect(self):
+        if self.socket is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(self.path)
+            except OSError as e:
+                connection.close()
+                raise HelperError("Can't connect to helper %s: %s" % (self.path, e))
+            self.socket = connection
+            self.reader = connection.makefile("rb")
+        return self.socket
+
+    @staticmethod
+    def write(connection, data):
+        try:
+            connection.sendall(data)
+        except OSError:
+            # Missing replies tell about it.
+            pass
+
+    def run(self, operations):
+        """Sends operations to helper. Return: list of result dicts in order."""
+        from threading import Thread
+
+        if not operations:
+            return []
+        connection = self.connect()
+        requests = []
+        for start in range(0, len(operations), self.BATCH_SIZE):
+            self.last_id += 1
+            requests += [{"id": self.last_id, "operations": operations[start : start + self.BATCH_SIZE]}]
+        data = b"".join(json.dumps(request).encode("utf-8") + b"\n" for request in requests)
+        # Written from a thread, so helper's replies don't fill up the socket meanwhile:
+        writer = Thread(target=self.write, args=(connection, data))
+        writer.daemon = True
+        writer.start()
+
+        results = []
+        try:
+            for request in requests:
+                line = self.reader.readline()
+                if not line:
+                    raise HelperError("Helper closed connection")
+                reply = json.loads(line.decode("utf-8"))
+                if reply.get("id") != request["id"] or "results" not in reply:
+                    raise HelperError(reply.get("error", "Unexpected reply from helper"))
+                results += reply["results"]
+        except (OSError, ValueError) as e:
+            self.close()
+            raise HelperError(str(e))
+        except HelperError:
+            self.close()
+            raise
+        finally:
+            writer.join()
+        return results
+
+    def ping(self):
+        """True if helper is reachable."""
+        try:
+            return self.run([{"op": "ping"}])[0]["ok"]
+        except HelperError:
+            return False
+
+    def close(self):
+        if self.socket is not None:
+            self.reader.close()
+            self.socket.close()
+            self.socket = None
+            self.reader = None
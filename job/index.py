@@ -0,0 +1,179 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+from sys import intern
+
+
+class PathIndex(object):
+    """Trie of paths (i.e. rendered targets) with a value per path.
+    Path components are interned and stored once per trie level, so common
+    prefixes aren't repeated. Parent, children and subtree lookups cost
+    O(depth) instead of a scan over all paths.
+
+    Iteration is depth first, siblings in order of insertion.
+    Only added paths are reported; intermediate components are not.
+    """
+
+    class Node(object):
+        __slots__ = ("children", "value", "indexed")
+
+        def __init__(self):
+            self.children = {}
+            self.value = None
+            self.indexed = False
+
+    def __init__(self, items=()):
+        self.root = self.Node()
+        self.size = 0
+        # id(value) -> (value, first path with that value), see find().
+        # Value is kept to not let its id be reused.
+        self.paths_by_value = {}
+        for path, value in items:
+            self.add(path, value)
+
+    @staticmethod
+    def split(path):
+        """'/a/b' -> ['', 'a', 'b'], so absolute and relative paths don't mix."""
+        path = os.path.normpath(path)
+        if path == os.sep:
+            return [""]
+        return path.split(os.sep)
+
+    def get_node(self, path):
+        node = self.root
+        for name in self.split(path):
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    def add(self, path, value=None):
+        """Adds (or replaces value of) a path."""
+        node = self.root
+        for name in self.split(path):
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[intern(name)] = self.Node()
+            node = child
+
+        if not node.indexed:
+            node.indexed = True
+            self.size += 1
+        node.value = value
+        self.paths_by_value.setdefault(id(value), (value, os.path.normpath(path)))
+
+    def __setitem__(self, path, value):
+        self.add(path, value)
+
+    def __getitem__(self, path):
+        node = self.get_node(path)
+        if node is None or not node.indexed:
+            raise KeyError(path)
+        return node.value
+
+    def get(self, path, default=None):
+        node = self.get_node(path)
+        if node is None or not node.indexed:
+            return default
+        return node.value
+
+    def __contains__(self, path):
+        node = self.get_node(path)
+        return node is not None and node.indexed
+
+    def __len__(self):
+        return self.size
+
+    def find(self, value):
+        """Returns first path added with value (compared by identity)."""
+        return self.paths_by_value.get(id(value), (None, None))[1]
+
+    def parent(self, path):
+        """Returns the nearest indexed ancestor of a path or None."""
+        names = self.split(path)
+        node = self.root
+        parent = None
+        for depth, name in enumerate(names[:-1]):
+            node = node.children.get(name)
+            if node is None:
+                break
+            if node.indexed:
+                parent = depth
+        if parent is None:
+            return None
+        return self.join(names[: parent + 1])
+
+    def children(self, path):
+        """Returns indexed paths one level below a path."""
+        node = self.get_node(path)
+        if node is None:
+            return []
+        prefix = self.split(path)
+        return [
+            self.join(prefix + [name])
+            for name, child in node.children.items()
+            if child.indexed
+        ]
+
+    def subtree(self, path):
+        """Yields (path, value) of a path and all indexed paths below it."""
+        node = self.get_node(path)
+        if node is None:
+            return iter(())
+        return self.walk(node, self.split(path))
+
+    def items(self):
+        """Yields all (path, value) pairs."""
+        return self.walk(self.root, [])
+
+    def __iter__(self):
+        for path, value in self.items():
+            yield path
+
+    def walk(self, node, names):
+        # Explicit stack, deep trees shouldn't hit recursion limit.
+        stack = [(node, names)]
+        while stack:
+            node, names = stack.pop()
+            if node.indexed:
+                yield self.join(names), node.value
+            for name, child in reversed(list(node.children.items())):
+                stack += [(child, names + [name])]
+
+    @staticmethod
+    def join(names):
+        if names == [""]:
+            return os.sep
+        return os.sep.join(names)
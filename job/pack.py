@@ -0,0 +1,234 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import struct
+import hashlib
+from collections import OrderedDict
+from os.path import join, split, splitext
+
+# Environment variable pointing to a pack used in place of schema locations.
+JOB_SCHEMA_PACK_ENV = "JOB_SCHEMA_PACK"
+
+
+def get_option_locations(directory, postfixes):
+    """Returns locations FileOptionReader reads options of a directory from.
+    Postfixes are nested: directory/schema, directory/schema/.job.
+    """
+    locations = []
+    for postfix in postfixes:
+        directory = join(directory, postfix)
+        locations += [directory]
+    return locations
+
+
+class SchemaPackError(Exception):
+    """Raised when pack file is corrupted or made by unknown version."""
+
+
+class SchemaPack(object):
+    """All schemas, options and preferences found in schema locations
+    compiled into a single file, so a job can be loaded with one sequential
+    read (of possibly memory-mapped file) instead of many small opens.
+
+    File layout:
+        header:  magic, format version, sha256 of payload, payload size
+        payload: json document (see as_dict())
+
+    Payload hash protects from truncated/corrupted files, whereas 'digest'
+    (hash of all source files) tells if pack is stale in regard to sources.
+    Stamps of sources and locations let a job check it with stat() calls.
+    """
+
+    MAGIC = b"JOBPACK\0"
+    VERSION = 2
+    HEADER = struct.Struct("<8sI32sQ")
+    SCHEMA_FILE_EXTENSION = "schema"
+    OPTION_FILE_EXTENSIONS = ("options", "preferences")
+
+    def __init__(
+        self,
+        locations=(),
+        schemas=None,
+        options=None,
+        sources=(),
+        variables=(),
+        option_locations=None,
+        stamps=(),
+    ):
+        self.locations = list(locations)
+        # Options and preferences are read only from these (see build()).
+        self.option_locations = list(option_locations or ())
+        # {name: json schema} in order of loading (later overrides former).
+        self.schemas = schemas if schemas is not None else OrderedDict()
+        # {extension: {option: value}}
+        self.options = options if options is not None else {}
+        # [(file, sha1 of its content), ...]
+        self.sources = [tuple(source) for source in sources]
+        self.variables = sorted(variables)
+        # [(location or file, (mtime, size) or None), ...]
+        self.stamps = [(path, tuple(stamp) if stamp else None) for path, stamp in stamps]
+
+    @property
+    def digest(self):
+        """Hash of all source files."""
+        data = json.dumps(self.sources, separators=(",", ":"))
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def build(cls, locations, option_locations=None):
+        """Reads schemas from locations and options from option_locations
+        (see get_option_locations()), both in order. Without option_locations
+        pack has no options, so they are read from files as usual.
+        """
+        from glob import glob
+        from job.cache import get_stamp
+        from job.pathtemplate import VARIABLE_PATTERN
+
+        pack = cls(locations=locations, option_locations=option_locations)
+        if pack.option_locations:
+            pack.options = dict((ext, OrderedDict()) for ext in cls.OPTION_FILE_EXTENSIONS)
+        variables = set()
+
+        files = [(location, cls.SCHEMA_FILE_EXTENSION) for location in pack.locations]
+        files += [
+            (location, extension)
+            for location in pack.option_locations
+            for extension in cls.OPTION_FILE_EXTENSIONS
+        ]
+        stamped = set()
+        for location, extension in files:
+            if location not in stamped:
+                # Directory mtime changes when files are added or removed.
+                pack.stamps += [(location, get_stamp(location))]
+                stamped.add(location)
+            for file in sorted(glob(join(location, "*.%s" % extension))):
+                pack.stamps += [(file, get_stamp(file))]
+                with open(file, "rb") as file_object:
+                    content = file_object.read()
+                document = json.loads(content.decode("utf-8"), object_pairs_hook=OrderedDict)
+                pack.sources += [(file, hashlib.sha1(content).hexdigest())]
+
+                if extension == cls.SCHEMA_FILE_EXTENSION:
+                    variables.update(VARIABLE_PATTERN.findall(content.decode("utf-8")))
+                    name = splitext(split(file)[1])[0]
+                    pack.schemas[name] = document
+                else:
+                    options = pack.options[extension]
+                    for k, v in document.items():
+                        options[k] = v
+
+        pack.variables = sorted(variables)
+        return pack
+
+    def is_stale(self, quick=False):
+        """Rebuilds pack from its source locations and compares digests.
+        Quick check only compares stamps (mtime, size) of sources and
+        locations recorded when pack was built.
+        """
+        from job.cache import get_stamp
+
+        if quick:
+            return any(get_stamp(path) != stamp for path, stamp in self.stamps)
+        return self.build(self.locations, self.option_locations).digest != self.digest
+
+    def as_dict(self):
+        return OrderedDict(
+            [
+                ("version", self.VERSION),
+                ("digest", self.digest),
+                ("locations", self.locations),
+                ("option_locations", self.option_locations),
+                ("sources", self.sources),
+                ("stamps", self.stamps),
+                ("variables", self.variables),
+                ("schemas", self.schemas),
+                ("options", self.options),
+            ]
+        )
+
+    def dumps(self):
+        payload = json.dumps(self.as_dict(), separators=(",", ":")).encode("utf-8")
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, hashlib.sha256(payload).digest(), len(payload)
+        )
+        return header + payload
+
+    def write(self, path):
+        from job.cache import write_atomic
+
+        write_atomic(path, self.dumps())
+
+    @classmethod
+    def loads(cls, data):
+        """Creates pack from bytes-like object (bytes, mmap or memoryview)."""
+        size = cls.HEADER.size
+        if len(data) < size:
+            raise SchemaPackError("Pack is truncated.")
+
+        magic, version, checksum, length = cls.HEADER.unpack(data[:size])
+        if magic != cls.MAGIC:
+            raise SchemaPackError("Not a schema pack.")
+        if version != cls.VERSION:
+            raise SchemaPackError("Unsupported pack version %s." % version)
+
+        payload = data[size : size + length]
+        if len(payload) != length or hashlib.sha256(payload).digest() != checksum:
+            raise SchemaPackError("Pack is corrupted.")
+
+        document = json.loads(bytes(payload).decode("utf-8"), object_pairs_hook=OrderedDict)
+        pack = cls(
+            locations=document["locations"],
+            schemas=document["schemas"],
+            options=document["options"],
+            sources=document["sources"],
+            variables=document["variables"],
+            option_locations=document["option_locations"],
+            stamps=document["stamps"],
+        )
+        if pack.digest != document["digest"]:
+            raise SchemaPackError("Pack digest doesn't match its sources.")
+        return pack
+
+    @classmethod
+    def read(cls, path):
+        """Reads pack file with a single mapping of the file."""
+        import mmap
+
+        with open(path, "rb") as file:
+            if not os.fstat(file.fileno()).st_size:
+                raise SchemaPackError("Pack is empty.")
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return cls.loads(data)
@@ -0,0 +1,305 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import re
+from os.path import join
+from types import MappingProxyType
+
+# $VAR or ${VAR} anywhere in a text (i.e. schema file).
+VARIABLE_PATTERN = re.compile(r"\$\{?([A-Za-z_][A-Za-z0-9_]*)")
+
+# $VAR or ${VAR} as substituted by os.path.expandvars().
+SUBSTITUTION_PATTERN = re.compile(r"\$(\w+|\{[^}]*\})", re.ASCII)
+
+# Token kinds of a compiled path template:
+LITERAL = 0
+KEYWORD = 1
+VARIABLE = 2
+
+
+class CompiledPathTemplate(object):
+    """Path template parsed once into a list of tokens. Templates
+    are either strings ("@root/@job_current/$USER") or lists of elements,
+    where '@keyword' is resolved from a template and '$VAR' from environment.
+
+    Expansion doesn't parse anything, it only looks up pre-resolved values
+    and joins them, so it's safe to call it per rendered path.
+    """
+
+    __slots__ = ("template", "tokens", "keywords", "variables")
+
+    def __init__(self, template):
+        # FIXME: This is temporary until we move on to better path templates!
+        if type(template) in (list, tuple):
+            consists = template
+        elif isinstance(template, str):
+            consists = template.split("/")
+        else:
+            raise EnvironmentError(template)
+
+        self.template = template
+        self.tokens = []
+        keywords = []
+        variables = []
+
+        for element in consists:
+            # all but first character is valid
+            keyword = element[1:]
+            if element.startswith("@"):
+                self.tokens += [(KEYWORD, keyword, element)]
+                if keyword not in keywords:
+                    keywords += [keyword]
+            # We support also env var. which is probably bad idea...
+            elif element.startswith("$"):
+                self.tokens += [(VARIABLE, keyword, element)]
+                if keyword not in variables:
+                    variables += [keyword]
+            else:
+                self.tokens += [(LITERAL, element, element)]
+
+        self.tokens = tuple(self.tokens)
+        self.keywords = tuple(keywords)
+        self.variables = tuple(variables)
+
+    def expand(self, keywords, environ=None, used=None):
+        """Expand template with resolved keywords.
+
+        Params:
+            keywords: dict with values for every name in self.keywords.
+            environ:  mapping used for $VAR elements (os.environ by default).
+            used:     optional dict to record values of variables we've used.
+        Return: expanded path.
+        Raises: EnvironmentError with unresolved element as its argument.
+        """
+        if environ is None:
+            environ = os.environ
+
+        expanded_directores = []
+        for kind, value, element in self.tokens:
+            if kind == KEYWORD:
+                value = keywords.get(value)
+            elif kind == VARIABLE:
+                name, value = value, environ.get(value)
+                if value and used is not None:
+                    used[name] = value
+            if not value:
+                raise EnvironmentError(element)
+            expanded_directores += [value]
+
+        return join(*expanded_directores)
+
+    def expand_many(self, rows, columns=None, keywords=None, environ=None, used=None):
+        """Expand template for many rows of keywords at once. Literals,
+        variables and keywords absent in rows are resolved only once.
+
+        Params:
+            rows:     iterable of tuples named by columns, or (if columns
+                      is None) of dicts with keywords.
+            columns:  names of tuples' items.
+            keywords: values of keywords absent in rows.
+            environ:  mapping used for $VAR elements (os.environ by default).
+            used:     optional dict to record values of variables we've used.
+        Return: list of expanded paths in order of rows.
+        Raises: EnvironmentError with unresolved element as its argument.
+        """
+        if environ is None:
+            environ = os.environ
+        if keywords is None:
+            keywords = {}
+
+        # Parts resolved once, with per row keywords to be filled in:
+        static = []
+        dynamic = []
+        for position, (kind, value, element) in enumerate(self.tokens):
+            if kind == KEYWORD:
+                if columns is None:
+                    dynamic += [(position, value, element)]
+                elif value in columns:
+                    dynamic += [(position, columns.index(value), element)]
+                    value = element
+                else:
+                    value = keywords.get(value)
+            elif kind == VARIABLE:
+                name, value = value, environ.get(value)
+                if value and used is not None:
+                    used[name] = value
+            if not value and (kind != KEYWORD or columns is not None):
+                raise EnvironmentError(element)
+            static += [value]
+
+        paths = []
+        for row in rows:
+            parts = list(static)
+            for position, key, element in dynamic:
+                if columns is None:
+                    value = row.get(key) or keywords.get(key)
+                else:
+                    value = row[key]
+                if not value:
+                    raise EnvironmentError(element)
+                parts[position] = value
+            paths += [join(*parts)]
+        return paths
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.template)
+
+
+# Compiled templates are immutable, so we share them process wide.
+_compiled_templates = {}
+
+
+def compile_path_template(template):
+    """Return cached CompiledPathTemplate for a template string or list."""
+    key = tuple(template) if isinstance(template, list) else template
+    try:
+        return _compiled_templates[key]
+    except KeyError:
+        pass
+    except TypeError:
+        raise EnvironmentError(template)
+
+    compiled = CompiledPathTemplate(template)
+    _compiled_templates[key] = compiled
+    return compiled
+
+
+def snapshot_environment(environ=None):
+    """Returns read-only copy of environment (os.environ by default)."""
+    if environ is None:
+        environ = os.environ
+    return MappingProxyType(dict(environ))
+
+
+class CompiledSubstitution(object):
+    """Text with $VAR / ${VAR} variables (like os.path.expandvars() does)
+    split once into literals and variable names, so substitution is a
+    plain lookup per variable. Texts without variables are returned as is.
+    """
+
+    __slots__ = ("text", "parts", "variables")
+
+    def __init__(self, text):
+        self.text = text
+        parts = []
+        variables = []
+        position = 0
+        for match in SUBSTITUTION_PATTERN.finditer(text):
+            name = match.group(1)
+            if name.startswith("{"):
+                name = name[1:-1]
+            parts += [text[position : match.start()], (name, match.group(0))]
+            if name not in variables:
+                variables += [name]
+            position = match.end()
+        parts += [text[position:]]
+
+        self.parts = tuple(parts)
+        self.variables = tuple(variables)
+
+    def substitute(self, environ, used=None):
+        """Substitute variables from environ. Unresolved ones are left
+        untouched (as expandvars() does) and reported.
+
+        Params:
+            environ: mapping with variables (i.e. snapshot_environment()).
+            used:    optional dict to record values of variables we've used.
+        Return: (text, tuple of unresolved variable names)
+        """
+        if not self.variables:
+            return self.text, ()
+
+        substituted = []
+        unresolved = []
+        for part in self.parts:
+            if type(part) is tuple:
+                name, part = part
+                value = environ.get(name)
+                if value is None:
+                    unresolved += [name]
+                else:
+                    part = value
+                    if used is not None:
+                        used[name] = value
+            substituted += [part]
+        return "".join(substituted), tuple(unresolved)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.text)
+
+
+_compiled_substitutions = {}
+
+
+def compile_substitution(text):
+    """Return cached CompiledSubstitution for a text."""
+    try:
+        return _compiled_substitutions[text]
+    except KeyError:
+        compiled = CompiledSubstitution(text)
+        _compiled_substitutions[text] = compiled
+        return compiled
+
+
+class PathSkeleton(object):
+    """Paths rendered once for a single asset, precompiled into parts
+    around asset's name. Other assets of the same shape are then made by
+    joining the parts with their names instead of rendering them again.
+
+        skeleton = PathSkeleton(["/job/shot0010", "/job/shot0010/work"], "shot0010")
+        skeleton.expand("shot0020") -> ["/job/shot0020", "/job/shot0020/work"]
+    """
+
+    __slots__ = ("token", "parts")
+
+    def __init__(self, paths, token):
+        if not token:
+            raise ValueError("Empty token can't be substituted.")
+        self.token = token
+        self.parts = tuple(tuple(path.split(token)) for path in paths)
+
+    def expand(self, name):
+        """Returns paths with token replaced by name."""
+        return [name.join(parts) for parts in self.parts]
+
+    def verify(self, name, paths):
+        """True if paths expanded for name split back into skeleton's parts,
+        i.e. name doesn't appear elsewhere in them, where it couldn't be
+        told apart from substituted one.
+        """
+        return tuple(tuple(path.split(name)) for path in paths) == self.parts
+
+    def __len__(self):
+        return len(self.parts)
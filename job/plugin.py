@@ -34,6 +34,8 @@
 
 from jobcli.job.utils import ReadOnlyCacheAttrib, CachedMethod
 import logging
+import threading
+from collections import namedtuple
 from os import mkdir
 # In time we would probably make from it own big module, but for now it's
 # OK to leave it here, as I suppose. PluginType is just enumerator, then we should have
@@ -68,13 +70,99 @@ class PluginType(object):
         pass
 
 
+# Attributes of a path made by DeviceDriver.make_dirs(). Write permission
+# of a user is always kept, user and group None mean no ownership change.
+PathAttributes = namedtuple("PathAttributes", ("group_write", "others_write", "user", "group"))
+PathAttributes.__new__.__defaults__ = (True, False, None, None)
+
+
+def get_path_attributes(permissions=None, ownership=None):
+    """Returns PathAttributes of location's 'permissions' and 'ownership':
+
+        permissions: {"group": "write", "others": "read"} (True and False
+                     work as well), missing classes keep their defaults.
+        ownership:   {"user": name, "group": name}.
+    """
+    defaults = PathAttributes()
+    permissions = permissions or {}
+    ownership = ownership or {}
+
+    def writable(name, default):
+        value = permissions.get(name, default)
+        return value is True or value == "write"
+
+    return PathAttributes(
+        group_write=writable("group", defaults.group_write),
+        others_write=writable("others", defaults.others_write),
+        user=ownership.get("user"),
+        group=ownership.get("group"),
+    )
+
+# DeviceDriver operations over many paths at once. Drivers may implement
+# them natively, otherwise DeviceDriver falls back to per path calls.
+BATCH_OPERATIONS = ("make_dirs", "apply_attributes_many")
+
+
 class DeviceDriver:
     """Abstract class defining an interface to production storage.
     Basic implementation does simply local storage manipulation via
     shell or Python interface. More interesting implementations
     include remote execution or fuse virtual file systems.
+
+    Batch operations (make_dirs(), apply_attributes_many()) take ordered
+    lists of (path, PathAttributes). Their default implementation here
+    loops over single path operations, drivers should override them
+    whenever they can do better (see PluginManager.get_native_operations()).
     """
 
+    @staticmethod
+    def get_entries(entries):
+        """Returns [(path, PathAttributes), ...] for entries being paths
+        or (path, attributes or None) pairs.
+        """
+        result = []
+        for entry in entries:
+            if isinstance(entry, str):
+                path, attributes = entry, None
+            else:
+                path, attributes = entry
+            result += [(path, attributes or PathAttributes())]
+        return result
+
+    def make_dirs(self, entries):
+        """Makes directories in order of entries and applies their attributes
+        (also to already existing ones).
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        Return: List of booleans, True for directories made.
+        """
+        entries = self.get_entries(entries)
+        made = [self.make_dir(path) for path, attributes in entries]
+        self.apply_attributes_many(entries)
+        return made
+
+    def apply_attributes_many(self, entries):
+        """Sets permissions and ownership of paths as given in entries.
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        """
+        for path, attributes in self.get_entries(entries):
+            self.apply_attributes(path, attributes)
+
+    def apply_attributes(self, path, attributes):
+        """Sets permissions and ownership of a path (see PathAttributes)."""
+        if hasattr(self, "remove_write_permissions") and hasattr(self, "add_write_permissions"):
+            self.remove_write_permissions(path)
+            self.add_write_permissions(
+                path, group=attributes.group_write, others=attributes.others_write
+            )
+        else:
+            self.set_permissions(
+                path, user=True, group=attributes.group_write, others=attributes.others_write
+            )
+        if attributes.user or attributes.group:
+            self.set_ownership(path, user=attributes.user, group=attributes.group)
+
     # __metaclass__ conflicts with current plugin architecture.
     # TODO: Reconsider changing one of it (plugins arch)
     # __metaclass__ = abc.ABCMeta
@@ -138,18 +226,339 @@ class DatabaseDriver:
         raise NotImplementedError("You must implement this method yourself.")
 
 
+class PluginManifest(object):
+    """Names, types and modules of plugins in a package, found by parsing
+    (not importing) its sources. Manifest is cached in ~/.job/cache and is
+    valid as long as stamps of package directories and sources match,
+    so finding a module providing a plugin costs a few stat() calls and
+    only modules of requested plugins are ever imported.
+
+    Plugin classes are the ones deriving (directly or via other plugin
+    classes) from PluginManager. When their name or type isn't a literal
+    in a class body, it's recorded as None and a module is imported
+    on any lookup, as it might provide anything.
+    """
+
+    VERSION = 1
+    PREFIX = "plugins"
+    BASES = ("PluginManager",)
+
+    def __init__(self, package="plugins", path=None, log_level=logging.INFO):
+        self.package = package
+        self.path = path
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.setLevel(log_level)
+
+    @ReadOnlyCacheAttrib
+    def root(self):
+        """Directory of the package, found without importing it."""
+        from importlib.util import find_spec
+
+        try:
+            spec = find_spec(self.package)
+        except (ImportError, ValueError):
+            spec = None
+        if spec is None or not spec.submodule_search_locations:
+            return None
+        return list(spec.submodule_search_locations)[0]
+
+    def get_file(self):
+        from jobcli.job.cache import get_cache_path, make_key
+        from os.path import join
+
+        name = "%s-%s.json" % (self.PREFIX, make_key(self.VERSION, self.package, self.root))
+        if self.path:
+            return join(self.path, name)
+        return get_cache_path(name)
+
+    def get_sources(self):
+        """Returns (directories, [(module, file), ...]) of the package."""
+        import os
+        from os.path import join, isfile, relpath
+
+        directories = []
+        sources = []
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = sorted(
+                name for name in subdirs if isfile(join(directory, name, "__init__.py"))
+            )
+            directories += [directory]
+            relative = relpath(directory, self.root)
+            prefix = self.package
+            if relative != os.curdir:
+                prefix += "." + relative.replace(os.sep, ".")
+            for name in sorted(files):
+                if not name.endswith(".py"):
+                    continue
+                module = name[:-3]
+                module = prefix if module == "__init__" else prefix + "." + module
+                sources += [(module, join(directory, name))]
+        return directories, sources
+
+    @staticmethod
+    def get_literal(node, attribute):
+        """Returns value of 'attribute = "name"' or 'attribute = PluginType.Name'
+        assigned in a class body, None if it's not there or not a literal.
+        """
+        import ast
+
+        for statement in node.body:
+            if not isinstance(statement, ast.Assign):
+                continue
+            if not any(isinstance(target, ast.Name) and target.id == attribute
+                       for target in statement.targets):
+                continue
+            value = statement.value
+            if isinstance(value, ast.Constant) and isinstance(value.value, str):
+                return value.value
+            if isinstance(value, ast.Attribute):
+                return value.attr
+            return None
+        return None
+
+    def scan(self):
+        """Parses package sources. Returns (stamps, entries)."""
+        import ast
+        from jobcli.job.cache import get_stamp
+
+        directories, sources = self.get_sources()
+        # Taken before reading, so changes made meanwhile invalidate the manifest:
+        stamps = [(path, get_stamp(path)) for path in directories]
+        stamps += [(path, get_stamp(path)) for module, path in sources]
+
+        classes = []
+        unparsed = []
+        for module, path in sources:
+            try:
+                with open(path, "rb") as file:
+                    tree = ast.parse(file.read(), path)
+            except (OSError, SyntaxError, ValueError) as e:
+                # Importing it will tell what's wrong, if it's ever needed.
+                self.logger.warning("Can't scan plugins in %s: %s", path, e)
+                unparsed += [module]
+                continue
+            for node in tree.body:
+                if isinstance(node, ast.ClassDef):
+                    bases = [
+                        base.id if isinstance(base, ast.Name) else getattr(base, "attr", None)
+                        for base in node.bases
+                    ]
+                    classes += [(module, node, bases)]
+
+        # Plugins might derive from other plugins, also ones in other modules:
+        plugin_classes = set(self.BASES)
+        found = []
+        while True:
+            new = [
+                (module, node) for module, node, bases in classes
+                if node.name not in plugin_classes and plugin_classes.intersection(bases)
+            ]
+            if not new:
+                break
+            plugin_classes.update(node.name for module, node in new)
+            found += new
+
+        order = dict((module, position) for position, (module, path) in enumerate(sources))
+        found.sort(key=lambda item: (order[item[0]], item[1].lineno))
+        entries = [
+            {
+                "name": self.get_literal(node, "name"),
+                "type": self.get_literal(node, "type"),
+                "module": module,
+                "class": node.name,
+            }
+            for module, node in found
+        ]
+        entries += [
+            {"name": None, "type": None, "module": module, "class": None}
+            for module in unparsed
+        ]
+        return [(path, list(stamp) if stamp else None) for path, stamp in stamps], entries
+
+    def load_cached(self):
+        """Returns entries saved by store() or None if they are stale."""
+        from jobcli.job.cache import get_stamp
+        import json
+
+        try:
+            with open(self.get_file(), "rb") as file:
+                data = json.loads(file.read().decode("utf-8"))
+        except Exception:
+            return None
+
+        if data.get("version") != self.VERSION or data.get("package") != self.package:
+            return None
+        for path, stamp in data["stamps"]:
+            current = get_stamp(path)
+            if (list(current) if current else None) != stamp:
+                self.logger.debug("Plugin manifest is stale: %s", path)
+                return None
+        return data["entries"]
+
+    def store(self, stamps, entries):
+        from jobcli.job.cache import write_atomic
+        import json
+
+        data = {
+            "version": self.VERSION,
+            "package": self.package,
+            "stamps": stamps,
+            "entries": entries,
+        }
+        try:
+            write_atomic(self.get_file(), json.dumps(data, indent=1).encode("utf-8"))
+        except Exception as e:
+            self.logger.warning("Can't save plugin manifest: %s", e)
+            return False
+        return True
+
+    @ReadOnlyCacheAttrib
+    def entries(self):
+        """List of {'name', 'type', 'module', 'class'} in order of sources."""
+        if self.root is None:
+            return []
+        entries = self.load_cached()
+        if entries is None:
+            stamps, entries = self.scan()
+            self.store(stamps, entries)
+        return entries
+
+    def find_modules(self, name=None, type=None):
+        """Returns modules which may provide plugins of a name and/or type.
+
+        Params: name -> plugin name, type -> name of PluginType's class.
+        Return: List of module names, all of them without arguments.
+        """
+        modules = []
+        for entry in self.entries:
+            if name is not None and entry["name"] not in (name, None):
+                continue
+            if type is not None and entry["type"] not in (type, None):
+                continue
+            if entry["module"] not in modules:
+                modules += [entry["module"]]
+        return modules
+
+    def find_class(self, class_name):
+        """Returns module defining a plugin class or None."""
+        for entry in self.entries:
+            if entry["class"] == class_name:
+                return entry["module"]
+        return None
+
+
 class PluginRegister(type):
     def __init__(cls, name, bases, attrs):
         # Missing call to __init__ of superclass
         if not hasattr(cls, "_plugins_store"):
+            # Registered plugin classes. Instances are made on first use, see create().
             cls._plugins_store = []
+            # Indexes over _plugins_store: {name: [plugins]}, {type: [plugins]}
+            cls._plugins_by_name = {}
+            cls._plugins_by_type = {}
+            # {(plugin, frozen config): instance or None if plugin refused to register}
+            cls._plugins_pool = {}
+            cls._plugins_lock = threading.RLock()
+            # Packages with plugins imported on demand, see import_plugins():
+            cls._plugins_manifests = [PluginManifest("plugins")]
         else:
             cls.register_plugin(cls)
 
+    def add_plugins_package(cls, package, path=None):
+        """Makes plugins of another package available to lookups.
+
+        Params: package -> importable package name,
+                path -> directory for its manifest (~/.job/cache by default).
+        """
+        manifest = PluginManifest(package, path)
+        cls._plugins_manifests.append(manifest)
+        cls.invalidate_caches()
+        return manifest
+
+    def import_plugins(cls, name=None, type=None):
+        """Imports not yet imported modules which may provide plugins
+        of a name and/or type (every plugin module without arguments).
+        Plugins register themselves while their modules are imported.
+
+        Params: name -> plugin name, type -> class present in PluginType.
+        """
+        import importlib
+        import sys
+
+        type_name = getattr(type, "__name__", type)
+        for manifest in list(cls._plugins_manifests):
+            for module in manifest.find_modules(name, type_name):
+                if module not in sys.modules:
+                    importlib.import_module(module)
+
     def register_plugin(cls, plugin):
-        instance = plugin()
-        if instance.register_signals():
-            cls._plugins_store.append(instance)
+        cls._plugins_store.append(plugin)
+        cls._plugins_by_name.setdefault(plugin.name, []).append(plugin)
+        cls._plugins_by_type.setdefault(plugin.type, []).append(plugin)
+        cls.invalidate_caches()
+
+    def create(cls, plugin, **config):
+        """Returns an instance of a plugin made with config. Instances are
+        pooled, so every request with the same config shares one of them
+        until close_plugins(). Config which can't be frozen into a key
+        (see CachedMethod.freeze) makes a new, not pooled instance.
+
+        Params: plugin -> plugin class or name,
+                config -> keyword arguments of plugin's __init__.
+        Return: Plugin instance or None if there is no such plugin
+                or it refused to register (see register_signals()).
+        """
+        if isinstance(plugin, str):
+            if plugin not in cls._plugins_by_name:
+                cls.import_plugins(name=plugin)
+            for klass in list(cls._plugins_by_name.get(plugin, ())):
+                instance = cls.create(klass, **config)
+                if instance is not None:
+                    return instance
+            return None
+
+        try:
+            key = (plugin, CachedMethod.freeze(config))
+            hash(key)
+        except TypeError:
+            instance = plugin(**config)
+            return instance if instance.register_signals() else None
+
+        with cls._plugins_lock:
+            if key not in cls._plugins_pool:
+                instance = plugin(**config)
+                if not instance.register_signals():
+                    instance.close()
+                    instance = None
+                cls._plugins_pool[key] = instance
+            return cls._plugins_pool[key]
+
+    @CachedMethod.bounded(64)
+    def find_first_maching_plugin(cls, prefered_plugin_names):
+        """Returns first plugin (see create()) of a list of names or None."""
+        for plugin_name in prefered_plugin_names:
+            plugin_instance = cls.create(plugin_name)
+            if plugin_instance is not None:
+                return plugin_instance
+        return None
+
+    def close_plugins(cls):
+        """Closes all pooled plugin instances (see PluginManager.close()).
+        Next requests make new ones.
+        """
+        with cls._plugins_lock:
+            instances = [i for i in cls._plugins_pool.values() if i is not None]
+            cls._plugins_pool.clear()
+            cls.invalidate_caches()
+        for instance in instances:
+            instance.close()
+
+    def invalidate_caches(cls):
+        """Drops cached lookups (see CachedMethod) after plugins changed."""
+        for klass in cls.__mro__ + type(cls).__mro__:
+            for attribute in vars(klass).values():
+                if isinstance(attribute, CachedMethod):
+                    attribute.invalidate()
 
 
 class PluginManager(object, metaclass=PluginRegister):
@@ -208,31 +617,27 @@ class PluginManager(object, metaclass=PluginRegister):
 
     @property
     def plugins(self):
-        return self._plugins_store
+        """Instances of all available plugins."""
+        self.__class__.import_plugins()
+        instances = [self.__class__.create(plugin) for plugin in list(self._plugins_store)]
+        return [instance for instance in instances if instance is not None]
 
     @property
     def error(self):
         return self.last_error
 
-    # @CachedMethod
     def get_plugin_by_type(self, type):
         """Getter for plugins of type.
 
         Params: type -> class(type) present in job.plugin.PluginType.
         Return: List of matchnig plugins
                 (classes derived from job.plugin.PluginManager)"""
-        from job.logger import LoggerFactory
-
-        plg = []
-        for plugin in self.plugins:
-            if plugin.type == type:
-                # plugin.logger = LoggerFactory().get_logger(
-                #     plugin.name, level=self.log_level
-                # )
-                plg += [plugin]
-        return plg
-
-    # @CachedMethod
+        self.__class__.import_plugins(type=type)
+        instances = [
+            self.__class__.create(plugin) for plugin in list(self._plugins_by_type.get(type, ()))
+        ]
+        return [instance for instance in instances if instance is not None]
+
     def get_plugin_by_name(self, name):
         """Getter for plugin by name. Currently first matching name
          is returned, which might not be the best policy ever...
@@ -240,35 +645,55 @@ class PluginManager(object, metaclass=PluginRegister):
         Params: string prepresenting plugin class.
         Return: First matching plugin.
         """
-        from job.logger import LoggerFactory
-
-        for plugin in self.plugins:
-            if plugin.name == name:
-                # print(plugin.name)
-                # FIXME: this is workaround...
-                # plugin.logger = LoggerFactory().get_logger(name, level=self.log_level)
-                return plugin
-        # self.logger.exception("Can't find plugin %s", name)
-        raise OSError
-
-    # @CachedMethod
+        plugin_instance = self.__class__.create(name)
+        if plugin_instance is None:
+            # self.logger.exception("Can't find plugin %s", name)
+            raise OSError
+        return plugin_instance
+
     def get_first_maching_plugin(self, prefered_plugin_names):
         """Select first matching plugin from provided list of names.
+        Lookups are cached per class, not per manager
+        (see PluginRegister.find_first_maching_plugin).
 
         Params: List with prefered plugins names.
         Return: First matching plugin.
         """
         from collections.abc import Iterable
-        from job.logger import LoggerFactory
-      
+
         assert isinstance(prefered_plugin_names, Iterable)
-        installed_plg_names = [plugin.name for plugin in self.plugins]
+        return self.__class__.find_first_maching_plugin(prefered_plugin_names)
+
+    def get_first_configured_plugin(self, prefered_plugin_names, **config):
+        """Like get_first_maching_plugin(), but plugins are made (and pooled)
+        with config, i.e. device drivers with a number of jobs.
+
+        Params: List with prefered plugins names, plugin's __init__ kwargs.
+        Return: First matching plugin.
+        """
         for plugin_name in prefered_plugin_names:
-            if plugin_name in installed_plg_names:
-                plugin_instance = self.get_plugin_by_name(plugin_name)
-                # FIXME: this is workaround...
-                # plugin_instance.logger = LoggerFactory().get_logger(
-                #     plugin_name, level=self.log_level
-                # )
+            plugin_instance = self.__class__.create(plugin_name, **config)
+            if plugin_instance is not None:
                 return plugin_instance
         return None
+
+    @staticmethod
+    def get_native_operations(plugin, operations=BATCH_OPERATIONS, interface=DeviceDriver):
+        """Returns operations a plugin implements itself instead of
+        inheriting fallbacks of its interface (or lacking them at all).
+
+        Params: plugin -> plugin instance or class,
+                operations -> names of methods to check.
+        Return: List of natively implemented operations.
+        """
+        klass = plugin if isinstance(plugin, type) else type(plugin)
+        return [
+            name for name in operations
+            if getattr(klass, name, None) not in (None, getattr(interface, name, None))
+        ]
+
+    def close(self):
+        """Releases resources held by a plugin (files, sessions, connections).
+        Pooled instances are closed by close_plugins().
+        """
+        pass
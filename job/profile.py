@@ -0,0 +1,243 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+# DeviceDriver methods timed by instrumented drivers (see Profiler.instrument()).
+DEVICE_OPERATIONS = (
+    "is_dir",
+    "make_dir",
+    "make_link",
+    "copy_file",
+    "remove_write_permissions",
+    "add_write_permissions",
+    "set_ownership",
+    "set_permissions",
+    "make_dirs",
+    "apply_attributes_many",
+)
+
+class Profiler(object):
+    """Collects wall time of named phases (schema loading, option reading,
+    rendering, device operations...), counters and per template render
+    statistics. Profiler is disabled by default (see get_profiler()), and
+    instrumented code checks 'enabled' before measuring anything.
+
+        with get_profiler().phase("schemas.load"):
+            ...
+    """
+
+    VERSION = 1
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.start = time.time()
+        # name -> [calls, seconds]
+        self.phases = OrderedDict()
+        # name -> value
+        self.counters = OrderedDict()
+        # template name -> [calls, seconds, nodes, max. depth]
+        self.templates = OrderedDict()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Measures time spent inside a with block."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds, calls=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            phase = self.phases.setdefault(name, [0, 0.0])
+            phase[0] += calls
+            phase[1] += seconds
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_template(self, name, seconds, nodes, depth):
+        """Records a single render of a template (nodes = rendered paths)."""
+        if not self.enabled:
+            return
+        with self.lock:
+            template = self.templates.setdefault(name, [0, 0.0, 0, 0])
+            template[0] += 1
+            template[1] += seconds
+            template[2] += nodes
+            template[3] = max(template[3], depth)
+
+    def instrument(self, obj, methods, prefix=""):
+        """Returns obj with methods timed as 'prefix + method' phases,
+        or obj itself if profiler is disabled.
+        """
+        if not self.enabled:
+            return obj
+        return InstrumentedObject(self, obj, methods, prefix)
+
+    def as_dict(self):
+        def phases(items):
+            return OrderedDict(
+                (name, OrderedDict([("calls", calls), ("seconds", seconds)]))
+                for name, (calls, seconds) in items.items()
+            )
+
+        templates = OrderedDict()
+        for name, (calls, seconds, nodes, depth) in self.templates.items():
+            templates[name] = OrderedDict(
+                [("calls", calls), ("seconds", seconds), ("nodes", nodes), ("depth", depth)]
+            )
+        return OrderedDict(
+            [
+                ("version", self.VERSION),
+                ("start", self.start),
+                ("phases", phases(self.phases)),
+                ("counters", self.counters),
+                ("templates", templates),
+            ]
+        )
+
+    def dump(self, path):
+        """Saves json report to a path."""
+        from job.cache import write_atomic
+
+        data = json.dumps(self.as_dict(), indent=4)
+        write_atomic(path, data.encode("utf-8"))
+
+    def report(self):
+        """Returns summary tables as a string."""
+        lines = ["%-40s %8s %12s %12s" % ("Phase", "Calls", "Total ms", "Mean ms")]
+        for name, (calls, seconds) in self.phases.items():
+            lines += [
+                "%-40s %8d %12.2f %12.3f"
+                % (name, calls, seconds * 1e3, seconds * 1e3 / max(calls, 1))
+            ]
+
+        if self.templates:
+            lines += ["", "%-40s %8s %12s %8s %6s" % ("Template", "Calls", "Total ms", "Nodes", "Depth")]
+            for name, (calls, seconds, nodes, depth) in self.templates.items():
+                lines += ["%-40s %8d %12.2f %8d %6d" % (name, calls, seconds * 1e3, nodes, depth)]
+
+        if self.counters:
+            lines += ["", "%-40s %8s" % ("Counter", "Value")]
+            for name, value in self.counters.items():
+                lines += ["%-40s %8s" % (name, value)]
+        return "\n".join(lines)
+
+
+class InstrumentedObject(object):
+    """Proxy timing calls of selected methods (see Profiler.instrument())."""
+
+    def __init__(self, profiler, obj, methods, prefix=""):
+        self.__dict__["_profiler"] = profiler
+        self.__dict__["_object"] = obj
+        self.__dict__["_methods"] = frozenset(methods)
+        self.__dict__["_prefix"] = prefix
+
+    def __getattr__(self, name):
+        attribute = getattr(self._object, name)
+        if name not in self._methods:
+            return attribute
+
+        profiler, phase = self._profiler, self._prefix + name
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                profiler.add_time(phase, time.perf_counter() - start)
+
+        return timed
+
+    def __setattr__(self, name, value):
+        setattr(self._object, name, value)
+
+    def __repr__(self):
+        return repr(self._object)
+
+
+_profiler = Profiler(enabled=False)
+
+
+def get_profiler():
+    """Returns current (process wide) profiler."""
+    return _profiler
+
+
+def enable_profiler():
+    """Installs and returns a new enabled profiler."""
+    global _profiler
+    _profiler = Profiler(enabled=True)
+    return _profiler
+
+
+def disable_profiler():
+    global _profiler
+    _profiler = Profiler(enabled=False)
+
+
+@contextmanager
+def profiled(path=None):
+    """Profiles a with block, if path is given, then prints the summary
+    and saves json report into path. Used by --profile switch of commands.
+    """
+    if not path:
+        yield get_profiler()
+        return
+
+    profiler = enable_profiler()
+    try:
+        yield profiler
+    finally:
+        disable_profiler()
+        print(profiler.report())
+        profiler.dump(path)
+        print("Profile saved to %s" % path)
@@ -0,0 +1,134 @@
+##########################################################################
+#
+#  Copyright (c) 2017, Human Ark Animation Studio. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#
+#     * Neither the name of Human Ark Animation Studio nor the names of any
+#       other contributors to this software may be used to endorse or
+#       promote products derived from this software without specific prior
+#       written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+
+from types import MappingProxyType
+from collections import OrderedDict
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+class SchemaView(MutableMapping):
+    """Copy-on-write view of a read-only base schema. Base is shared by
+    all jobs loaded from the same sources, whereas changes (new, replaced or
+    removed templates) are kept in view's own overlay, so jobs don't see
+    each other's changes and can be rendered from many threads.
+
+    Note: Definitions themselves are shared too. Replace them with a copy
+    instead of modifying (see JobTemplate.dump_local_templates()).
+    """
+
+    def __init__(self, base=None):
+        if base is None:
+            base = MappingProxyType({})
+        elif not isinstance(base, MappingProxyType):
+            base = MappingProxyType(OrderedDict(base))
+        self.base = base
+        self.overlay = OrderedDict()
+        self.removed = set()
+        # Names which differ from base (in overlay or removed).
+        self.changed = set()
+
+    def __getitem__(self, key):
+        if key in self.overlay:
+            return self.overlay[key]
+        if key in self.removed:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __setitem__(self, key, value):
+        self.overlay[key] = value
+        self.removed.discard(key)
+        self.changed.add(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.overlay.pop(key, None)
+        if key in self.base:
+            self.removed.add(key)
+            self.changed.add(key)
+        else:
+            self.changed.discard(key)
+
+    def __contains__(self, key):
+        if key in self.overlay:
+            return True
+        return key in self.base and key not in self.removed
+
+    def __iter__(self):
+        # Base order first (with replaced items in place), then new ones.
+        for key in self.base:
+            if key in self.overlay or key not in self.removed:
+                yield key
+        for key in self.overlay:
+            if key not in self.base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __getstate__(self):
+        """Read-only base can't be pickled as is."""
+        state = self.__dict__.copy()
+        state["base"] = OrderedDict(self.base)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.base = MappingProxyType(self.base)
+
+    def copy(self):
+        """Returns new view sharing base and a copy of overlay."""
+        view = self.__class__(self.base)
+        view.overlay = self.overlay.copy()
+        view.removed = set(self.removed)
+        view.changed = set(self.changed)
+        return view
+
+    def freeze(self):
+        """Returns read-only mapping with current content."""
+        if not self.overlay and not self.removed:
+            return self.base
+        return MappingProxyType(OrderedDict(self.items()))
+
+    def __repr__(self):
+        return "%s(%d templates, %d changed)" % (
+            self.__class__.__name__,
+            len(self),
+            len(self.changed),
+        )
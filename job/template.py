@@ -2,12 +2,19 @@ import os
 import stat
 import json
 import abc
+import hashlib
+import weakref
+import threading
+from time import perf_counter
 import logging
 import logging
 from logging.handlers import RotatingFileHandler
-from os.path import expanduser, join, isdir
+from os.path import expanduser, join, isdir, abspath
 from os import mkdir
+from types import MappingProxyType
 from project import ProjectManager
+from job.utils import ReadOnlyCacheAttrib
+from job.profile import get_profiler, DEVICE_OPERATIONS
 # This will actually install optional plugins
 # ... and crash on any error. We may hide it inside a class
 # and catch exception, log etc. This should not hurt us,
@@ -58,10 +65,19 @@ class LocationTemplate(dict):
     selected template.
     """
 
-    schema = {}
+    # Read-only by default, jobs have their own views (see job.schemaview).
+    schema = MappingProxyType({})
     parent_template = None
     schema_type_name = None
-    child_templates = []
+    child_templates = ()
+    # Prepared sub_dirs of schemas (see job.graph.SchemaGraph), set by JobTemplate.
+    schema_graph = None
+    # Environment snapshot, used variables and already reported unresolved
+    # ones. Set by JobTemplate and shared by all its sub templates.
+    environ = None
+    used_variables = None
+    reported_variables = None
+    _resolved = None
     # TODO: use config for this?
     JOB_TEMPLATE_PATH_ENV = "JOB_TEMPLATE_PATH"
     SCHEMA_FILE_EXTENSION = "schema"
@@ -74,8 +90,17 @@ class LocationTemplate(dict):
         if schema and schema_type_name and schema_type_name in schema:
             super(LocationTemplate, self).__init__(schema[schema_type_name])
 
+        # Resolved view (self + inherited keys) is created on first access
+        # and dropped whenever self or any of its parents changes.
+        if "_dependants" not in self.__dict__:
+            self._dependants = {}
+        self._invalidate_resolved()
+
         self.parent_template = parent
         self.schema_type_name = schema_type_name
+        self.child_templates = []
+        if parent is not None:
+            parent._dependants[id(self)] = weakref.ref(self)
 
         # FIXME: This polutes schema as we save copies of self down the stream
         # This we should sanitaze kwargs here, so keys not present in schema
@@ -87,23 +112,112 @@ class LocationTemplate(dict):
     def __getitem__(self, key):
         """LocationTemplates are nested inside each othter. This custom getter
         looks for a key locally, and if not succeed, looks up the parents
-        recursively.
+        recursively. Lookups are served from resolved view (see _resolve()).
 
         NOTE: 'None' value is treated as if a key wasn't present,
         whereas anything else evaluated by Python to 'False'
         is interpreted as correct value and returned.
         """
-        if key in self.keys():
-            value = super(LocationTemplate, self).__getitem__(key)
-            # See note above:
-            if value == None and self.parent_template:
-                return self.parent_template[key]
-            return value
-        else:
+        resolved = self._resolved
+        if resolved is None:
+            resolved = self._resolve()
+        try:
+            return resolved[key]
+        except KeyError:
             # We are at a root level, and still no value...
-            if self.parent_template == None:
-                raise f"{KeyError}, No key found in self or parents: %s"
-            return self.parent_template[key]
+            raise KeyError("No key found in self or parents: %s" % key)
+
+    def get_inherited(self, key, default=None):
+        """Same as __getitem__, but returns default for missing keys.
+        (get() is dict's one and sees only keys set on self.)
+        """
+        resolved = self._resolved
+        if resolved is None:
+            resolved = self._resolve()
+        return resolved.get(key, default)
+
+    def _resolve(self):
+        """Flattens inherited keys into a single dictionary following
+        __getitem__ rules (see note there). It's cached until invalidated.
+        """
+        parent = self.parent_template
+        resolved = {}
+        if parent is not None:
+            resolved.update(parent._resolved or parent._resolve())
+
+        for key, value in dict.items(self):
+            # None means 'inherit', so leave parent's value (or lack of it).
+            if value is None and parent:
+                continue
+            resolved[key] = value
+
+        self._resolved = resolved
+        return resolved
+
+    def _invalidate_resolved(self):
+        """Drops resolved view of self and all templates inheriting from it."""
+        self._resolved = None
+        dependants = self.__dict__.get("_dependants", {})
+        for key, reference in list(dependants.items()):
+            dependant = reference()
+            if dependant is None:
+                del dependants[key]
+            elif dependant._resolved is not None:
+                dependant._invalidate_resolved()
+
+    def __getstate__(self):
+        """Weak references to dependants (and cache) and read-only
+        environment snapshot can't be pickled. Dependants register
+        themselves again on unpickling (see __setstate__()).
+        """
+        state = self.__dict__.copy()
+        state.pop("_dependants", None)
+        state["_resolved"] = None
+        # Graph refers to schemas by identity, which won't survive anyway.
+        state.pop("schema_graph", None)
+        if state.get("environ") is not None:
+            state["environ"] = dict(state["environ"])
+        return state
+
+    def __setstate__(self, state):
+        from job.pathtemplate import snapshot_environment
+
+        # Children might have been unpickled (and registered) before us:
+        dependants = self.__dict__.get("_dependants", {})
+        self.__dict__.update(state)
+        self._dependants = dependants
+        if state.get("environ") is not None:
+            self.environ = snapshot_environment(state["environ"])
+
+        parent = self.parent_template
+        if parent is not None:
+            parent.__dict__.setdefault("_dependants", {})[id(self)] = weakref.ref(self)
+
+    def __setitem__(self, key, value):
+        super(LocationTemplate, self).__setitem__(key, value)
+        self._invalidate_resolved()
+
+    def __delitem__(self, key):
+        super(LocationTemplate, self).__delitem__(key)
+        self._invalidate_resolved()
+
+    def update(self, *args, **kwargs):
+        super(LocationTemplate, self).update(*args, **kwargs)
+        self._invalidate_resolved()
+
+    def setdefault(self, key, default=None):
+        value = super(LocationTemplate, self).setdefault(key, default)
+        self._invalidate_resolved()
+        return value
+
+    def pop(self, *args):
+        value = super(LocationTemplate, self).pop(*args)
+        self._invalidate_resolved()
+        return value
+
+    def clear(self):
+        super(LocationTemplate, self).clear()
+        self._invalidate_resolved()
 
     def get_root_template(self):
         """Return Job template which is a root parent."""
@@ -111,189 +225,345 @@ class LocationTemplate(dict):
             return self.parent_template.get_root_template()
         return self
 
-    def expand_path_template(self, template=None):
-        """This should be replaced with more elaboreted and safe template renderer."""
-        from os.path import join
+    def get_environ(self):
+        """Returns environment snapshot taken by a job (or os.environ
+        for templates without one).
+        """
+        environ = self.get_root_template().environ
+        if environ is None:
+            return os.environ
+        return environ
+
+    def expand_path_template(self, template=None, environ=None):
+        """Expands path template using its compiled (and cached) version.
+        '@keyword' elements are resolved once per call from self,
+        '$VAR' elements from environment snapshot (see get_environ()).
+        Unresolved elements are reported once per template.
+        """
+        from job.pathtemplate import compile_path_template
 
         if not template:
             # This will raise an exception if
             # no path_template has been found here or up.
             template = self["path_template"]
 
-        # FIXME: This is temporary until we move on to better path templates!
-        if type(template) in (list, tuple):
-            consists = template
-        elif isinstance(template, str):
-            consists = template.split("/")
-        else:
-            raise EnvironmentError
-
-        expanded_directores = []
-
-        for element in consists:
-            # all but first character is valid
-            keyword = element[1:]
-            if element.startswith("@"):
-                value = self[keyword]
-            # We support also env var. which is probably bad idea...
-            elif element.startswith("$"):
-                value = os.getenv(keyword, None)
-            else:
-                value = element
-
-            if not value:
-                self.logger.exception(
-                    "Couldn't resolve '%s' inside template: '%s'", element, template
+        compiled = compile_path_template(template)
+        keywords = {}
+        for keyword in compiled.keywords:
+            keywords[keyword] = self[keyword]
+
+        root_template = self.get_root_template()
+        if environ is None:
+            environ = self.get_environ()
+
+        try:
+            return compiled.expand(keywords, environ, root_template.used_variables)
+        except EnvironmentError as e:
+            reported = root_template.reported_variables
+            report = (self.schema_type_name, e.args[0])
+            if reported is None or report not in reported:
+                root_template.logger.error(
+                    "Couldn't resolve '%s' inside template: '%s'", e.args[0], template
                 )
-                raise EnvironmentError
-
-            expanded_directores += [value]
-
-        path = join(*expanded_directores)
-        return path
-
-    def extend_schema_with_adhoc_definition(self, schema_dict):
-        """LocationTemplate could be provided as simple sub_dirs
-        inline. This should be used only for basic templates.
-        By default all setting will be inherited from parent
-        template. User can override it with "options" field
-        inside inline template dictionary.
-
-        Params: schema dictonary with three keys:
-        { "name"   : location name
-          "type"   : "location" for inline temp. or "template" for file based.
-          "options": {} dict with overritten settings.
-        }
+                if reported is not None:
+                    reported.add(report)
+            raise
+
+    @classmethod
+    def from_definition(cls, schema, schema_type_name, definition, parent=None):
+        """Creates template from a definition which doesn't have to be
+        a part of schema (i.e. inline location), but sees all schema.
         """
+        template = cls(
+            schema={schema_type_name: definition},
+            schema_type_name=schema_type_name,
+            parent=parent,
+        )
+        template.schema = schema
+        return template
 
-        schema = LocationTemplate(schema={}, schema_type_name=None, parent=self)
-        schema["sub_dirs"] = []
-        if schema_dict["options"]:
-            for k, v in schema_dict["options"].items():
-                schema[k] = v
-        schema["names"] = [schema_dict["name"]]
-        self.schema[schema_dict["name"]] = schema
-
-        return True
-
-    def render(self, _root=None, recursive=True, parent=None, clear_storage=True):
-        """Creates recursively LocationTemplate objects, resolving
-        overrides and expanding variables.
-
-        Returns: Dictonary with all paths as a keys, and coresponding
-        templetes as values to use this information down the stream.
-        {'/some/path': LocationTemplate(), ...}
+    def get_sub_locations(self):
+        """Returns [(name, definition), ...] of this template's sub_dirs,
+        prepared by schema graph or resolved now for overridden ones.
+        Absent templates are skipped.
         """
-
-        def valid_variables_expantion(path):
-            """We need to make sure all var. were expanded, and raise
-            an exception if not.
-            """
-            try:
-                if "$" in path:
-                    raise EnvironmentError(path)
-            except EnvironmentError as e:
-                self.get_root_template().logger.exception("Wrong expansion %s", e)
-                return False
-            return True
-
-        from os.path import join, expandvars
+        from job.graph import SchemaGraph
+
+        sub_dirs = self["sub_dirs"]
+        graph = self.get_root_template().schema_graph
+        # Graph is valid only for base schema and templates not changed since.
+        if graph is not None and graph.schema is getattr(self.schema, "base", None):
+            resolved = graph.get(sub_dirs, self.schema.changed)
+            if resolved is not None:
+                return resolved
+        return SchemaGraph.resolve(self.schema, sub_dirs)
+
+    def render_names(self, _root=None, environ=None):
+        """Expands all paths of this template (one per name), resolving
+        root and env variables (from job's environment snapshot, see
+        get_environ()). Quits on wrong expansion, after reporting all
+        unresolved variables of the template at once.
+
+        Returns: list of paths.
+        """
+        from os.path import join
         from sys import exit
+        from job.pathtemplate import compile_substitution
 
-        targets = OrderedDict()
-
-        if clear_storage:
-            self.child_templates = []
+        root_template = self.get_root_template()
+        if environ is None:
+            environ = self.get_environ()
+        used = root_template.used_variables
 
         # If root wasn't provided take it from self or
         # regenerate it with path_template if avaible.
         if not _root or self["is_link"]:
             template = self["path_template"]
-            root = self.expand_path_template(template)
+            root = self.expand_path_template(template, environ)
         else:
             root = _root
 
-        # print self.expand_path_template(self['link_target'])
-        # Add paths to targets dictionary
-        # We expand possible env variables and raise on error.
+        # We expand possible env variables (compiled once per text)
+        # and quit on error.
+        unresolved = ()
+        if "$" in root:
+            root, unresolved = compile_substitution(root).substitute(environ, used)
+
+        paths = []
         for name in self["names"]:
-            path = join(root, name)
-            path = expandvars(path)
-            if not valid_variables_expantion(path):
+            if "$" in name:
+                name, missing = compile_substitution(name).substitute(environ, used)
+                unresolved += missing
+            paths += [join(root, name)]
+
+        wrong = [path for path in paths if "$" in path]
+        if wrong:
+            root_template.logger.error(
+                "Wrong expansion of template '%s', unresolved: %s",
+                self.schema_type_name,
+                ", ".join(sorted(set(unresolved))) or ", ".join(wrong),
+            )
+            root_template.logger.info("Job has to quit due to errors...")
+            exit()
+        return paths
+
+    def iter_render(self, _root=None, recursive=True, clear_storage=True):
+        """Creates LocationTemplate objects, resolving overrides and
+        expanding variables. Walks sub templates depth first with explicit
+        stack (no recursion) and yields paths as soon as they are rendered.
 
-                self.get_root_template().logger.info("Job has to quit due to errors...")
-                exit()
-            targets[path] = self
+        Sub templates are rendered inside the last path of their parent.
+        If a path was rendered already, the first template wins. Schemas
+        aren't modified, inline locations come from get_sub_locations().
+
+        Yields: (path, template) tuples in render order.
+        """
+        rendered = set()
+        environ = self.get_environ()
+
+        if clear_storage:
+            self.child_templates = []
+
+        # Per template timings, see job.profile.
+        profiler = get_profiler()
+        if profiler.enabled:
+            start = perf_counter()
+        paths = self.render_names(_root, environ)
+        if profiler.enabled:
+            profiler.add_template(self.schema_type_name, perf_counter() - start, len(paths), 0)
+
+        for path in paths:
+            if path not in rendered:
+                rendered.add(path)
+                yield path, self
 
         if not recursive:
             return
 
-        for sub_template in self["sub_dirs"]:
-            # Although the template was specified in a sub_dir
-            # its definition can't be found, so we omitt it..
-            if (
-                not sub_template["name"] in self.schema.keys()
-                and sub_template["type"] == "template"
-            ):
-                # print "Omitting absent template."
-                continue
+        # Stack items: (template, its last path, iterator over its sub locations)
+        stack = [(self, paths[-1] if paths else None, iter(self.get_sub_locations()))]
 
-            # Expand schema shop (self.schema) inplace specification.
-            if sub_template["type"] == "location":
-                self.extend_schema_with_adhoc_definition(sub_template)
-                # print "Expanding schema with %s" % sub_template
+        while stack:
+            template, root, sub_locations = stack[-1]
+            sub_location = next(sub_locations, None)
+            if sub_location is None:
+                stack.pop()
+                continue
 
             # Create subtemplate and process...
-            location = LocationTemplate(
-                schema=self.schema, schema_type_name=sub_template["name"], parent=self
+            if profiler.enabled:
+                start = perf_counter()
+            name, definition = sub_location
+            location = LocationTemplate.from_definition(
+                template.schema, name, definition, parent=template
             )
+            location.child_templates = []
+            template.child_templates += [location]
 
-            self.child_templates += [location]
-            subtargets = location.render(path, parent=self)
+            paths = location.render_names(root, environ)
+            if profiler.enabled:
+                profiler.add_template(name, perf_counter() - start, len(paths), len(stack))
+            for path in paths:
+                if path not in rendered:
+                    rendered.add(path)
+                    yield path, location
 
-            # FIXME: This shouldn't happen at all
-            for tgk in subtargets:
-                if tgk not in targets.keys():
-                    targets[tgk] = subtargets[tgk]
+            stack += [(location, paths[-1] if paths else None, iter(location.get_sub_locations()))]
 
+    def render(self, _root=None, recursive=True, parent=None, clear_storage=True):
+        """Creates recursively LocationTemplate objects, resolving
+        overrides and expanding variables. See iter_render().
+
+        Returns: Dictonary with all paths as a keys, and coresponding
+        templetes as values to use this information down the stream.
+        {'/some/path': LocationTemplate(), ...}
+        """
+        targets = OrderedDict()
+        with get_profiler().phase("render"):
+            for path, template in self.iter_render(_root, recursive, clear_storage):
+                targets[path] = template
         return targets
 
     def __repr__(self):
         """Pretty-like print with json rastezier."""
         return json.dumps(self, indent=4, check_circular=False)
 
-    def load_schemas(self, path, schema_shop={}):
-        """Load json schemas (*.schema) files defining LocationTemplate."""
+    @classmethod
+    def read_schema_files(cls, path):
+        """Finds and parses json schemas (*.schema) in a location. It doesn't
+        touch any template, so locations can be read in parallel.
+
+        Returns: [(file, stamp, content, candidate), ...]
+        """
         from glob import glob
+        from job.cache import get_stamp
+
+        schema_location = os.path.join(path, "*.%s" % cls.SCHEMA_FILE_EXTENSION)
+        schema_files = []
+        for file in glob(schema_location):
+            stamp = get_stamp(file)
+            with open(file, "rb") as file_object:
+                content = file_object.read()
+            candidate = json.loads(content.decode("utf-8"))
+            schema_files += [(file, stamp, content, candidate)]
+        return schema_files
+
+    def load_schemas(self, path, schema_shop=None, schema_files=None):
+        """Load json schemas (*.schema) files defining LocationTemplate.
+        schema_files is a result of read_schema_files(path), if it was read already.
+        """
+        from job.pathtemplate import VARIABLE_PATTERN
+
+        if schema_shop is None:
+            schema_shop = {}
+        if schema_files is None:
+            schema_files = self.read_schema_files(path)
+        get_profiler().count("schemas.files", len(schema_files))
+        self.logger.debug("Schema files found: %s", [item[0] for item in schema_files])
+
+        for file, stamp, content, candidate in schema_files:
+            # Keep track of what we've loaded, so renders can be cached.
+            if hasattr(self, "schema_sources"):
+                self.schema_stamps += [(file, stamp)]
+                self.schema_sources += [(file, hashlib.sha1(content).hexdigest())]
+                self.schema_variables.update(
+                    VARIABLE_PATTERN.findall(content.decode("utf-8"))
+                )
+
+            name = os.path.split(file)[1]
+            name = os.path.splitext(name)[0]
+            schema_shop[name] = self.make_schema_object(candidate, file)
+        return schema_shop
+
+    def make_schema_object(self, candidate, file):
+        """Finds parser for a version of json schema and creates schema object."""
         import job.schemas
 
-        schema_location = os.path.join(path, "*.%s" % self.SCHEMA_FILE_EXTENSION)
-        schema_files = glob(schema_location)
-        self.logger.debug("Schema files found: %s", schema_files)
+        if not "version" in candidate:
+            raise KeyError(file)
 
-        for file in schema_files:
-            with open(file) as file_object:
-                candidate = json.load(file_object)
+        schema_version = candidate["version"]
+        schema_object = job.schemas.Factory(log_level=self.logger.level).find(
+            candidate, schema_version
+        )
 
-                if not "version" in candidate:
-                    raise KeyError(file)
+        if not schema_object:
+            self.logger.warning(
+                "Can't find parser for current schema: %s, %s",
+                file,
+                schema_version,
+            )
+        return schema_object  # candidate #change make
 
-                schema_version = candidate["version"]
-                schema_object = job.schemas.Factory(log_level=self.logger.level).find(
-                    candidate, schema_version
-                )
 
-                if not schema_object:
-                    self.logger.warning(
-                        "Can't find parser for current schema: %s, %s",
-                        file,
-                        schema_version,
-                    )
+class RenderedLocation(object):
+    """Lightweight record of a rendered path holding only what device
+    operations need. Template which rendered it can be found in
+    JobTemplate.rendered_templates[template_id], unless templates were
+    released (see JobTemplate.render_locations()).
 
-                name = os.path.split(file)[1]
-                name = os.path.splitext(name)[0]
-                schema_shop[name] = schema_object  # candidate #change make
-        return schema_shop
+    Item access is supported for compatibility with code expecting
+    templates: location["user_dirs"].
+    """
+
+    __slots__ = (
+        "path",
+        "template",
+        "parent_path",
+        "permissions",
+        "ownership",
+        "is_link",
+        "link_target",
+        "user_dirs",
+        "template_id",
+    )
+    ATTRIBUTES = ("permissions", "ownership", "is_link", "link_target", "user_dirs")
+
+    def __init__(self, path, template_id=None, template=None, parent_path=None, **attributes):
+        """
+        Params:
+            template:    name of template which rendered the path.
+            parent_path: first path of its parent template (see create_link
+                         in JobTemplate.create()).
+        """
+        self.path = path
+        self.template_id = template_id
+        self.template = template
+        self.parent_path = parent_path
+        for name in self.ATTRIBUTES:
+            setattr(self, name, attributes.get(name))
+
+    @classmethod
+    def from_template(cls, path, template, template_id=None, parent_path=None):
+        """Copies attributes resolved by LocationTemplate."""
+        location = cls(path, template_id, template.schema_type_name, parent_path)
+        for name in cls.ATTRIBUTES:
+            setattr(location, name, template.get_inherited(name))
+        return location
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __repr__(self):
+        return "%s(%r, template_id=%r)" % (self.__class__.__name__, self.path, self.template_id)
+
+
+# Read-only schemas (with their graphs) shared by jobs loaded
+# from the same sources: {sources: (schema, graph)}. Only
+# MAX_SHARED_SCHEMAS recently used are kept (jobs made from
+# the dropped ones keep their own references).
+MAX_SHARED_SCHEMAS = 16
+_shared_schemas = OrderedDict()
+_shared_schemas_lock = threading.Lock()
+
+
+def clear_shared_schemas():
+    """Forgets all shared schemas, so next jobs build their own."""
+    with _shared_schemas_lock:
+        _shared_schemas.clear()
 
 
 class JobTemplate(LocationTemplate):
@@ -306,104 +576,363 @@ class JobTemplate(LocationTemplate):
     """
 
     logger = None
-
-    def __init__(self, log_level=logging.INFO, **kwargs):
+    schema_cache = True
+    schema_pack = None
+    rendered_templates = ()
+    # Max. number of schema locations read at once (see load_schemas()).
+    SCHEMA_LOAD_WORKERS = 8
+    # Per path attributes kept in render cache (see render_cached()):
+    RENDER_ATTRIBUTES = RenderedLocation.ATTRIBUTES
+
+    def __init__(self, log_level=logging.INFO, schema_cache=None, schema_pack=None, **kwargs):
         """Initialize job by looking through JOBB_PATH locations and loading
         schema files from there. The later path in JOBB_PATH will override
-        the former schames.
+        the former schames. With schema_cache=False schemas are always
+        read from files (no snapshot), None means class' default (see
+        --no-schema-cache of set). schema_pack (or JOB_SCHEMA_PACK env.)
+        points to a pack file used instead of schema locations.
 
         Note: Sub templates are created lazy on path rendering.
         job = Job() (no child templates created)
         job.render() (children created recursively)
         """
-        from os.path import join, split, realpath, dirname
         from job.logger import LoggerFactory
+        from job.pack import JOB_SCHEMA_PACK_ENV
+        from job.pathtemplate import snapshot_environment
+        from job.schemaview import SchemaView
         name = self.__class__.__name__
         # self.logger = LoggerFactory().get_logger(name, level=log_level)
         self.logger = logging.getLogger(self.__class__.__name__)
         self.set_logger(level=log_level, filename=str(log_level) + ".log")
-        schema_locations = [dirname(realpath(__file__))]
+        schema_locations = self.get_schema_locations()
 
-        # JOB_TEMPLATE_PATH_ENV may store store additional locations of schema folders.
-        if os.getenv(self.JOB_TEMPLATE_PATH_ENV, None):
-            schema_locations += os.getenv(self.JOB_TEMPLATE_PATH_ENV).split(":")
+        # All renders of this job see environment as it was at this point.
+        self.environ = snapshot_environment()
+        self.used_variables = {}
+        self.reported_variables = set()
 
         self.logger.debug("schema_locations: %s", schema_locations)
-        self.load_schemas(schema_locations)
+        self.schema = SchemaView()
+        if schema_cache is not None:
+            self.schema_cache = schema_cache
+        self.schema_sources = []
+        self.schema_stamps = []
+        self.schema_variables = set()
+
+        # Pack (see 'job schema pack') replaces scanning schema locations.
+        if not schema_pack:
+            schema_pack = os.getenv(JOB_SCHEMA_PACK_ENV, None)
+        with get_profiler().phase("schemas.load"):
+            if not schema_pack or not self.load_schema_pack(schema_pack):
+                self.load_schemas(schema_locations)
         super(JobTemplate, self).__init__(self.schema, "job", **kwargs)
 
-        # We make it pluggable since prefs/options might be
-        # imported from database
-        from job.plugin import PluginManager
+        # Project manager, plugins and options are created on first access
+        # (see below), so looking up a template doesn't pay for them.
+        self.log_level = log_level
+        self.project_settings = kwargs
+
+    @ReadOnlyCacheAttrib
+    def manager(self):
+        """ProjectManager (dry loaded) of the job's project."""
         ################# DEMETER HERE
         # self.manager = ProjectManager({'project': 'sandbox', 'episode': '$EP', 'group': 'user', 'asset': 'symek'})
-        print(f"Kwargs: {kwargs}")
-        self.manager = ProjectManager(kwargs)
-        self.manager.dry_load(str(self.manager.project))
-        #################
-        self.plg_manager = PluginManager(log_level=log_level)
-        # print(f"Plugin Manager: {self.plg_manager.plugins}")
-        self.job_options_reader = self.plg_manager.get_plugin_by_name(
-            "FileOptionReader"
-        )
-        # print(f"Job options reader: {self.job_options_reader}")
+        self.logger.debug("Project settings: %s", self.project_settings)
+        with get_profiler().phase("manager.dry_load"):
+            manager = ProjectManager(self.project_settings)
+            manager.dry_load(str(manager.project))
+        return manager
+
+    @ReadOnlyCacheAttrib
+    def plg_manager(self):
+        """We make it pluggable since prefs/options might be
+        imported from database.
+        """
+        from job.plugin import PluginManager
+
+        return PluginManager(log_level=self.log_level)
+
+    @ReadOnlyCacheAttrib
+    def preferences(self):
+        """Preferences are always read with FileOptionReader."""
         # We have recursion here: we use file option reader plugin to read options,
         # just to possibly find out that we should use different plugin to
         # read options with... e...
         # FIXME: This is misleading as option reader reads both options and prefs
-        self.__preferences = self.job_options_reader(self, "preferences")
-        self.logger.debug("Reading preferences: %s", self.__preferences)
+        reader = self.plg_manager.get_plugin_by_name("FileOptionReader")
+        with get_profiler().phase("options.read"):
+            preferences = reader(self, "preferences")
+        self.logger.debug("Reading preferences: %s", preferences)
+        return preferences
+
+    @ReadOnlyCacheAttrib
+    def job_options_reader(self):
+        """Option reader plugin preferred by project manager."""
+        reader = self.plg_manager.get_plugin_by_name("FileOptionReader")
 
         # _preferences['plugin'][type] returns us a list of preferenced plugins in order.
         # We use first which works (what is hopefully established by manager on init.)
         prefered_readers = self.manager.eval_element('development_variables/OptionReader') 
-        # prefered_readers = self.__preferences["plugin"]["OptionReader"]
+        # prefered_readers = self.preferences["plugin"]["OptionReader"]
         if "FileOptionReader" not in prefered_readers:
             self.logger.debug("Choosing other reader from: %s", prefered_readers)
-            self.job_options_reader = self.plg_manager.get_first_maching_plugin(
-                prefered_readers
-            )
+            reader = self.plg_manager.get_first_maching_plugin(prefered_readers)
 
-        self.logger.debug("Choosing option reader: %s", self.job_options_reader)
+        self.logger.debug("Choosing option reader: %s", reader)
+        return reader
 
-        # We oddly add options attrib to self here.
+    @ReadOnlyCacheAttrib
+    def job_options(self):
+        """Options of a job read with job_options_reader."""
         # TOD): Consider moving it to JobEnvironment class once we will move it
         # to cli from set.py
-        # print(f"Job options reader: {self.job_options_reader}")
-        self.job_options = self.job_options_reader(self)
-        if not self.job_options:
+        reader = self.job_options_reader
+        with get_profiler().phase("options.read"):
+            job_options = reader(self)
+        if not job_options:
             self.logger.debug(
                 "Can't get options for a job! %s", self.job_options_reader.error
             )
+        return job_options
+
+    @classmethod
+    def get_schema_locations(cls):
+        """Returns default schema location followed by JOB_TEMPLATE_PATH ones."""
+        from os.path import realpath, dirname
+
+        schema_locations = [dirname(realpath(__file__))]
+
+        # JOB_TEMPLATE_PATH_ENV may store store additional locations of schema folders.
+        if os.getenv(cls.JOB_TEMPLATE_PATH_ENV, None):
+            schema_locations += os.getenv(cls.JOB_TEMPLATE_PATH_ENV).split(":")
+        return schema_locations
+
+    def load_schema_pack(self, path):
+        """Loads schemas (and options, see FileOptionReader) from a pack
+        file made by 'job schema pack'. Returns False if pack can't be used.
+        """
+        from job.pack import SchemaPack, SchemaPackError
+
+        try:
+            pack = SchemaPack.read(path)
+        except (IOError, OSError, SchemaPackError) as e:
+            self.logger.warning("Can't use schema pack %s: %s", path, e)
+            return False
+        if pack.is_stale(quick=True):
+            self.logger.warning("Schema pack is stale, reading schema files: %s", path)
+            return False
+
+        self.logger.debug("Loading schemas from pack: %s", path)
+        for name, candidate in pack.schemas.items():
+            self.schema[name] = self.make_schema_object(candidate, name)
+        self.schema_sources += pack.sources
+        self.schema_variables.update(pack.variables)
+        self.schema_pack = pack
+        self.share_schema()
+        return True
+
+    def share_schema(self):
+        """Makes loaded schemas a read-only base shared by all jobs loaded
+        from the same sources and gives this job its own copy-on-write view
+        of it (see job.schemaview). Base comes with its dependency graph
+        (see job.graph), where missing templates are logged and pruned,
+        and cycles raise SchemaGraphError.
+        """
+        from job.graph import SchemaGraph
+        from job.schemaview import SchemaView
+
+        key = tuple(tuple(source) for source in self.schema_sources)
+        with _shared_schemas_lock:
+            shared = _shared_schemas.get(key)
+            if shared is None:
+                base = SchemaView(self.schema).freeze()
+                shared = (base, SchemaGraph.build(base, self.logger))
+                _shared_schemas[key] = shared
+                while len(_shared_schemas) > MAX_SHARED_SCHEMAS:
+                    _shared_schemas.popitem(last=False)
+            else:
+                _shared_schemas.move_to_end(key)
+
+        self.schema = SchemaView(shared[0])
+        self.schema_graph = shared[1]
+        return self.schema_graph
 
     def set_logger(self, level="DEBUG", filename="app.log"):
-        """Set up basic logging configuration."""
-        
-        
+        """Set up basic logging configuration. Handlers are added once per
+        logger (next jobs only update their levels, and the file handler is
+        replaced if they log into other file), and log file isn't opened
+        until something is logged into it.
+        """
         self.logger.setLevel(level)
         self.logger.propagate = False
-        # Create a console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(level)
 
         home = expanduser("~")
         path = join(home, ".job")
         if not isdir(path) and isdir(home):
             mkdir(path)
-
         path = join(path, filename)
-        # Create a file handler
-        file_handler = RotatingFileHandler(path)
-        file_handler.setLevel(level)
 
-        # Create a formatter and add it to the handlers
+        # Create a formatter for new handlers
         formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
 
-        # Add the handlers to the logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        handlers = [h for h in self.logger.handlers if getattr(h, "job_handler", False)]
+        file_handlers = [h for h in handlers if isinstance(h, RotatingFileHandler)]
+        for handler in handlers:
+            handler.setLevel(level)
+
+        if len(handlers) == len(file_handlers):
+            # Create a console handler
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(level)
+            console_handler.setFormatter(formatter)
+            console_handler.job_handler = True
+            self.logger.addHandler(console_handler)
+
+        # Each level logs into its own file (see __init__), so other file
+        # replaces the handler of previous job.
+        for handler in list(file_handlers):
+            if handler.baseFilename != abspath(path):
+                self.logger.removeHandler(handler)
+                handler.close()
+                file_handlers.remove(handler)
+
+        if not file_handlers:
+            # Create a file handler
+            file_handler = RotatingFileHandler(path, delay=True)
+            file_handler.setLevel(level)
+            file_handler.setFormatter(formatter)
+            file_handler.job_handler = True
+            self.logger.addHandler(file_handler)
+
+    def expand_many(self, template=None, rows=(), columns=None):
+        """Expands one path template for many sets of keywords (i.e.
+        job_current, job_asset_type, job_asset_name) without a new job per set.
+        Template is compiled once and keywords absent in rows are resolved
+        once from self.
+
+            job.expand_many("@root/@job_current/@job_asset_name/work",
+                            {"job_asset_name": ["sh0010", "sh0020"]})
+
+        Params:
+            template: path template (self['path_template'] by default).
+            rows:     iterable of dicts with keywords, iterable of tuples
+                      named by columns or dict of columns {keyword: values}.
+            columns:  names of tuples' items.
+        Returns: list of paths in order of rows.
+        """
+        from job.pathtemplate import compile_path_template
+
+        if not template:
+            template = self["path_template"]
+        compiled = compile_path_template(template)
+
+        if isinstance(rows, dict):
+            columns = list(rows.keys())
+            rows = zip(*rows.values())
+        if columns is not None:
+            columns = tuple(columns)
+
+        keywords = {}
+        for keyword in compiled.keywords:
+            if columns is None or keyword not in columns:
+                keywords[keyword] = self.get_inherited(keyword)
+
+        try:
+            return compiled.expand_many(
+                rows, columns, keywords, self.get_environ(), self.used_variables
+            )
+        except EnvironmentError as e:
+            self.logger.error(
+                "Couldn't resolve '%s' inside template: '%s'", e.args[0], template
+            )
+            raise
+
+    def render_locations(self, release=False):
+        """Renders templates into a list of RenderedLocation records.
+        Templates themselves are kept once (not per path) in a side table
+        self.rendered_templates, indexed by records' template_id.
+
+        Params:
+            release: keep no templates after rendering: side table stays
+                     empty and child_templates are dropped, so rendered
+                     templates are freed (records don't refer to them).
+        Returns: [RenderedLocation, ...] in render order.
+        """
+        self.rendered_templates = []
+        template_ids = {}
+        # First path of each template, so records know their parent's one:
+        first_paths = {}
+        locations = []
+
+        for path, template in self.iter_render():
+            first_paths.setdefault(id(template), path)
+            parent_path = first_paths.get(id(template.parent_template))
+            template_id = template_ids.get(id(template))
+            if template_id is None and not release:
+                template_id = len(self.rendered_templates)
+                template_ids[id(template)] = template_id
+                self.rendered_templates += [template]
+            locations += [RenderedLocation.from_template(path, template, template_id, parent_path)]
+
+        if release:
+            self.release_child_templates()
+        return locations
+
+    def release_child_templates(self):
+        """Drops child_templates lists in the whole rendered tree."""
+        stack = [self]
+        while stack:
+            template = stack.pop()
+            stack += template.child_templates
+            template.child_templates = []
+
+    def get_render_key(self):
+        """Returns a key identifing current render. It's a hash of loaded
+        schema files, job's own settings (including kwargs like job_current,
+        job_asset_type, job_asset_name and root) and values (taken from
+        environment snapshot) of variables refered by schemas or settings.
+        """
+        from job.cache import make_key
+        from job.pathtemplate import VARIABLE_PATTERN
+
+        settings = dict(self)
+        variables = set(self.schema_variables)
+        variables.update(VARIABLE_PATTERN.findall(json.dumps(settings, default=str)))
+        variables.add(self.JOB_TEMPLATE_PATH_ENV)
+
+        environ = self.get_environ()
+        environ = [(name, environ.get(name)) for name in sorted(variables)]
+        return make_key(self.schema_sources, settings, environ)
+
+    def render_cached(self, cache=True):
+        """Renders templates like render() does, but returns RenderedLocation
+        records (see render_locations()) and stores them in ~/.job/cache.
+        Repeated render of unchanged job reads a single file.
+
+        Returns: {'/some/path': RenderedLocation, ...}
+        """
+        from job.cache import RenderCache
+
+        attributes = ("template", "parent_path") + self.RENDER_ATTRIBUTES
+        render_cache = RenderCache(log_level=self.logger.level)
+        key = self.get_render_key()
+
+        if cache:
+            items = render_cache.load(key, attributes)
+            if items is not None:
+                self.logger.debug("Render cache hit: %s", key)
+                return OrderedDict((path, RenderedLocation(path, **values)) for path, values in items)
+
+        with get_profiler().phase("render"):
+            locations = self.render_locations(release=True)
+
+        if cache:
+            items = [
+                (location.path, dict((name, location[name]) for name in attributes))
+                for location in locations
+            ]
+            render_cache.store(key, attributes, items)
+        return OrderedDict((location.path, location) for location in locations)
 
     def get_local_schema_path(self, template=""):
         """Once we know where to look for we may want to refer to
@@ -430,16 +959,67 @@ class JobTemplate(LocationTemplate):
 
     def load_schemas(self, schema_locations):
         """Loads schemas from files found in number of schema_locations/postix[s]
-        as defined in JOB_PATH_POSTFIX global."""
+        as defined in JOB_PATH_POSTFIX global.
+
+        Unless disabled with schema_cache=False, result is saved as a snapshot
+        (see job.cache.SchemaSnapshot), so next time we only stat() locations and
+        files instead of globbing and parsing them.
+
+        Locations are read and parsed in threads (they are independent and
+        often on a network storage), then merged in order, so the later
+        location still overrides the former.
+        """
         from os.path import join
+        from concurrent.futures import ThreadPoolExecutor
+        from job.cache import SchemaSnapshot, get_stamp
 
+        locations = []
         for directory in schema_locations:
             for postfix in self.JOB_PATH_POSTFIX:
-                schemas = super(JobTemplate, self).load_schemas(
-                    join(directory, postfix)
-                )
+                locations += [join(directory, postfix)]
+
+        snapshot = None
+        if self.schema_cache:
+            snapshot = SchemaSnapshot(locations, log_level=self.logger.level)
+            content = snapshot.load()
+            if content is not None:
+                self.logger.debug("Loading schemas from snapshot: %s", snapshot.key)
+                get_profiler().count("schemas.snapshot_hits")
+                schemas, sources, variables = content
                 for k, v in schemas.items():
                     self.schema[k] = v
+                self.schema_sources += sources
+                self.schema_variables.update(variables)
+                self.share_schema()
+                return True
+
+        stamps = []
+        first_source = len(self.schema_sources)
+        first_stamp = len(self.schema_stamps)
+        loaded = OrderedDict()
+
+        def read_location(location):
+            # Directory mtime changes when schema files are added or removed.
+            return get_stamp(location), self.read_schema_files(location)
+
+        workers = max(1, min(len(locations), self.SCHEMA_LOAD_WORKERS))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in order of locations.
+            results = list(executor.map(read_location, locations))
+
+        for location, (location_stamp, schema_files) in zip(locations, results):
+            stamps += [(location, location_stamp)]
+            schemas = super(JobTemplate, self).load_schemas(location, {}, schema_files)
+            for k, v in schemas.items():
+                self.schema[k] = v
+                loaded[k] = v
+
+        if snapshot:
+            stamps += self.schema_stamps[first_stamp:]
+            sources = self.schema_sources[first_source:]
+            snapshot.store(stamps, (loaded, sources, sorted(self.schema_variables)))
+
+        self.share_schema()
         return True
 
     def dump_local_templates(self, schema_key="job", postfix=".job"):
@@ -476,14 +1056,13 @@ class JobTemplate(LocationTemplate):
         # TODO: Should we save schema' sources or recreate schames from objects?
         # Clear storage before rendering, so we make sure all possible changes in templates
         # (life objects opposite to shemas which are stored on disk.) will take effect.
+        from copy import copy
         from tempfile import NamedTemporaryFile
 
         tmpl_objects = {}
         exclude_inlines = []
-        targets = self.render(clear_storage=True).values()
-        # print(f"Targets: {targets}")
         # FIXME: We need to keep track of inline templates... dirty.
-        for tmpl in targets:
+        for path, tmpl in self.iter_render(clear_storage=True):
             for inline in tmpl["sub_dirs"]:
                 # print(f"Inline: {inline}")
                 if inline["type"] == "location":
@@ -520,9 +1099,9 @@ class JobTemplate(LocationTemplate):
             except:
                 self.logger.exception("Can't make %s", prefix_path)
 
-        # Patch schema with local settings:
+        # Patch schema with local settings (copy, as base schema is shared):
         self.schema[self.schema_type_name] = patch_local_schema(
-            self.schema[self.schema_type_name], self
+            copy(self.schema[self.schema_type_name]), self
         )
 
         # get json-strings recursively:
@@ -565,7 +1144,25 @@ class JobTemplate(LocationTemplate):
         return False
 
     def create(self, targets=None):
-        """TODO: This is only fo testing purposes."""
+        """Makes directories of a job with preferred device driver.
+
+        Params:
+            targets: {path: LocationTemplate or RenderedLocation} (as returned
+                     by render() or render_cached()) or a PathIndex of them.
+                     Links are made for them as well. By default all
+                     directories of project manager are made.
+        Returns: True
+        """
+        from job.index import PathIndex
+        from job.plugin import PathAttributes, get_path_attributes
+
+        def get_attributes(location):
+            """PathAttributes of a template or a record."""
+            if isinstance(location, RenderedLocation):
+                return get_path_attributes(location.permissions, location.ownership)
+            return get_path_attributes(
+                location.get_inherited("permissions"), location.get_inherited("ownership")
+            )
 
         def create_link(path, targets):
             """Create external or interal links between folders.
@@ -580,25 +1177,29 @@ class JobTemplate(LocationTemplate):
             place to our local target.
 
                /@original_root/path --> /@overritten_root/path
+
+            targets is a PathIndex, so parent's path is a lookup, not a scan.
             """
-            # print(targets)
-            if targets[path]["is_link"]:
-                # Remove it
-                parent = targets[path].parent_template
-                assert parent != None
-                # Find parent path by template object.
-                for key, value in targets.items():
-                    if value == parent:
-                        parent_path = key
-                        break
+            location = targets[path]
+            if location["is_link"]:
+                # Records know their parent's path, templates are looked up:
+                if isinstance(location, RenderedLocation):
+                    parent_path = location.parent_path
+                else:
+                    # Find parent path by template object.
+                    parent_path = targets.find(location.parent_template)
+                if parent_path is None:
+                    # i.e. parent template rendered no names.
+                    self.logger.warning("Can't find parent path of link: %s", path)
+                    return False
                 old_path, name = os.path.split(path)
                 link_path = os.path.join(parent_path, name)
                 device.make_link(path, link_path)
 
-            elif targets[path]["link_target"]:
+            elif location["link_target"]:
                 if self["job_current"] == self["job_asset_name"]:
                     return False
-                link_path = self.expand_path_template(targets[path]["link_target"])
+                link_path = self.expand_path_template(location["link_target"])
                 device.make_link(path, link_path)
 
             return True
@@ -609,35 +1210,22 @@ class JobTemplate(LocationTemplate):
         prefered_devices_list = []
         prefered_devices_list.append(prefered_devices)
         device = self.plg_manager.get_first_maching_plugin(prefered_devices_list)
-        print(f"Device: {device}")
         if not device:
             self.logger.exception("Can't find prefered device %s", prefered_devices_list)
             raise IOError
+        self.logger.debug("Selecting device driver %s", device)
+        device = get_profiler().instrument(device, DEVICE_OPERATIONS, prefix="device.")
+
+        if targets is None:
+            # targets = manager.get_all_directories()
+            targets = self.manager.dry_load(str(self.manager.project)).get_all_directories()
+            # Directories are made in one batch, attributes (cosmetics) go with them:
+            device.make_dirs([(path, PathAttributes()) for path in targets])
+            return True
 
-        # device.logger.debug("Selecting device driver %s", device)
-
-        # targets = manager.get_all_directories()
-        targets = self.manager.dry_load(str(self.manager.project)).get_all_directories()
-        # print(f"Targets: {targets}")
-        # print("ENV: " + manager.eval_element('development_variables/OptionReader'))
-    
-
-        # if not targets:
-        #     targets = self.render()
-        # # print(f"Targets: {targets}")
-        # # Should we check what's commig here?
-        # for key in targets:
-        #     print(targets[key])
-        #     assert isinstance(targets[key], LocationTemplate) or issubclass(
-        #         targets[key], LocationTemplate
-        #     )
-
+        if not isinstance(targets, PathIndex):
+            targets = PathIndex(targets.items())
+        device.make_dirs([(path, get_attributes(targets[path])) for path in targets])
         for path in targets:
-            device.make_dir(path)
-            # create_link(path, targets)
-
-            # Commented as lack of attrs
-            # Cosmetics:
-            device.remove_write_permissions(path)
-            device.add_write_permissions(path, {'user': 'read', 'group': 'write'})
-            device.set_ownership(path)
+            create_link(path, targets)
+        return True
@@ -148,13 +148,14 @@ def get_log_level_from_options(self, options={}):
 
 
 # https://wiki.python.org/moin/PythonDecoratorLibrary#Memoize
-# TODO: Support list arguments (whcih are not hashable
-# so we can't use it with this class)
 class CachedMethod(object):
     """
     Decorator. Caches a function's return value each time it is called.
     If called later with the same arguments, the cached value is returned
-    (not reevaluated).
+    (not reevaluated). List (and dict) arguments are frozen to make a key,
+    other unhashable arguments bypass the cache. Cache is dropped with
+    invalidate(), i.e. when data behind the function has changed.
+    CachedMethod.bounded(maxsize) keeps only maxsize latest values.
     Example:
         @CachedMethod
         def fibonacci(n):
@@ -165,29 +166,54 @@ class CachedMethod(object):
         print fibonacci(12)
     """
 
-    def __init__(self, func):
+    def __init__(self, func, maxsize=None):
         self.func = func
+        self.maxsize = maxsize
         self.cache = {}
 
+    @classmethod
+    def bounded(cls, maxsize):
+        """Decorator caching at most maxsize values (the oldest go first)."""
+        return lambda func: cls(func, maxsize)
+
+    @classmethod
+    def freeze(cls, value):
+        """Returns hashable version of lists, tuples and dicts."""
+        if isinstance(value, (list, tuple)):
+            return tuple(cls.freeze(item) for item in value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, cls.freeze(v)) for k, v in value.items()))
+        return value
+
     def __call__(self, *args):
-        _args = tuple(args)
-        if not isinstance(_args, collections.Hashable):
-            # uncacheable. a list, for instance.
+        try:
+            key = self.freeze(args)
+            return self.cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # uncacheable. a set, for instance.
             # better to not cache than blow up.
-            return self.func(*_args)
-        if _args in self.cache:
-            return self.cache[_args]
-        else:
-            value = self.func(*_args)
-            self.cache[_args] = value
-            return value
+            return self.func(*args)
+
+        value = self.func(*args)
+        if self.maxsize is not None and len(self.cache) >= self.maxsize:
+            self.cache.pop(next(iter(self.cache)), None)
+        self.cache[key] = value
+        return value
+
+    def invalidate(self):
+        """Forgets all cached values."""
+        self.cache.clear()
 
     def __repr__(self):
         """Return the function's docstring."""
         return self.func.__doc__
 
     def __get__(self, obj, objtype):
-        """Support instance methods."""
+        """Support instance methods (accessed from class, returns self)."""
+        if obj is None:
+            return self
         return functools.partial(self.__call__, obj)
 
 
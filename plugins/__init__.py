@@ -1,7 +1,9 @@
 import importlib
+import importlib.util
 import pkgutil
-import plugins.localDeviceDriver
-from .localDeviceDriver import *
+# Plugins aren't imported here anymore. PluginManager imports their modules
+# on first lookup of a plugin (see job.plugin.PluginManifest), so a command
+# doesn't pay for plugins it never uses.
 # http://stackoverflow.com/questions/3365740/how-to-import-all-submodules
 def import_submodules(package, recursive=True):
     """Import all submodules of a module, recursively, including subpackages
@@ -21,4 +23,23 @@ def import_submodules(package, recursive=True):
     return results
 
 
-import_submodules(__name__)
+_manifest = None
+
+
+def __getattr__(name):
+    """Keeps plugins.<module> and plugins.<PluginClass> working as they
+    did when everything was imported eagerly.
+    """
+    global _manifest
+    if name.startswith("__"):
+        raise AttributeError(name)
+    if importlib.util.find_spec(__name__ + "." + name) is not None:
+        return importlib.import_module(__name__ + "." + name)
+
+    if _manifest is None:
+        from job.plugin import PluginManifest
+        _manifest = PluginManifest(__name__)
+    module = _manifest.find_class(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    return getattr(importlib.import_module(module), name)
@@ -9,10 +9,11 @@ class FileOptionReader(PluginManager):
         # self.logger.debug("%s registering as %s", self.name, self.type)
         return True
 
-    def load_from_file(self, path, extension, options={}):
+    def load_from_file(self, path, extension, options=None):
         """TODO: Make use of Schematics to very our files
         follow any known convension...
         """
+        from job.pack import get_option_locations
 
         def _from_json(json_object):
             tmp = {}
@@ -27,11 +28,11 @@ class FileOptionReader(PluginManager):
         from os.path import join, split, splitext
         import json
 
+        if options is None:
+            options = {}
         files = []
-        for postfix in self.job.JOB_PATH_POSTFIX:
-            path = join(path, postfix)
-            location = join(path, "*.%s" % extension)
-            files += glob(location)
+        for location in get_option_locations(path, self.job.JOB_PATH_POSTFIX):
+            files += sorted(glob(join(location, "*.%s" % extension)))
 
         # self.job.logger.debug("Options found: %s", files)
 
@@ -47,15 +48,25 @@ class FileOptionReader(PluginManager):
 
     def __call__(self, jobtemplate, extension=None):
         self.job = jobtemplate
-        import job.cli  # Just to find job/schema/* location
         from os.path import join, split, realpath, dirname
 
         if not extension:
             extension = self.job.OPTION_FILE_EXTENSION
 
-        options_paths = [dirname(realpath(job.cli.__file__))]
-        options_paths += self.job.get_local_schema_path()
         options = {}
+        pack = getattr(self.job, "schema_pack", None)
+        if pack and extension in pack.options:
+            # Default options were compiled into schema pack.
+            options_paths = []
+            for k, v in pack.options[extension].items():
+                if isinstance(v, list):
+                    v = tuple(v)
+                options[k] = v
+        else:
+            import job.cli  # Just to find job/schema/* location
+            options_paths = [dirname(realpath(job.cli.__file__))]
+
+        options_paths += self.job.get_local_schema_path()
 
         for path in options_paths:
             opt = self.load_from_file(path, extension=extension)
@@ -5,6 +5,7 @@ from grp import getgrnam
 from pwd import getpwnam, getpwuid
 from getpass import getuser
 from subprocess import Popen, PIPE
+from collections import OrderedDict
 from job.utils import get_log_level_from_options
 import logging
 from logging.handlers import RotatingFileHandler
@@ -13,18 +14,34 @@ from os import mkdir
 # TODO: remove
 USE_SUDO = True
 
+# make_tree() creates directories relative to opened parents:
+DIR_FD_SUPPORTED = (
+    hasattr(os, "O_DIRECTORY")
+    and os.mkdir in os.supports_dir_fd
+    and os.open in os.supports_dir_fd
+)
+# Parents are opened only to look up their children, so they don't need
+# read permission where O_PATH is available (as path lookups don't):
+SEARCH_FLAGS = getattr(os, "O_PATH", os.O_RDONLY) | getattr(os, "O_DIRECTORY", 0)
+
 
 class LocalDevicePython(DeviceDriver, PluginManager):
     name = "LocalDevicePython"
     type = PluginType.DeviceDriver
     logger = None
 
-    def __init__(self, log_level = INFO, **kwargs):
+    def __init__(self, log_level = INFO, jobs=1, **kwargs):
         super().__init__()
         self.logger = logging.getLogger(self.__class__.__name__)
         self.kwargs = kwargs    
         name = self.__class__.__name__
         self.set_logger(level=log_level, filename=str(log_level) + ".log")
+        # Threads of make_dirs(), which pay off on network file systems,
+        # where every operation is a round trip.
+        self.jobs = max(1, int(jobs or 1))
+        self.executor = None
+        # {(getpwnam or getgrnam, name): id}, see get_ids()
+        self.ids = {}
 
 
 
@@ -34,6 +51,15 @@ class LocalDevicePython(DeviceDriver, PluginManager):
         
         self.logger.setLevel(level)
         self.logger.propagate = False
+
+        # Handlers are shared by all instances (next ones only update levels),
+        # so making drivers doesn't open more and more log files.
+        handlers = [h for h in self.logger.handlers if getattr(h, "job_handler", False)]
+        if handlers:
+            for handler in handlers:
+                handler.setLevel(level)
+            return
+
         # Create a console handler
         console_handler = logging.StreamHandler()
         console_handler.setLevel(level)
@@ -45,7 +71,7 @@ class LocalDevicePython(DeviceDriver, PluginManager):
 
         path = join(path, filename)
         # Create a file handler
-        file_handler = RotatingFileHandler(path)
+        file_handler = RotatingFileHandler(path, delay=True)
         file_handler.setLevel(level)
 
         # Create a formatter and add it to the handlers
@@ -54,9 +80,246 @@ class LocalDevicePython(DeviceDriver, PluginManager):
         file_handler.setFormatter(formatter)
 
         # Add the handlers to the logger
+        console_handler.job_handler = True
+        file_handler.job_handler = True
         self.logger.addHandler(console_handler)
         self.logger.addHandler(file_handler)
 
+    def close(self):
+        """Stops threads and closes log file (it's opened again when
+        something is logged).
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for handler in self.logger.handlers:
+            if isinstance(handler, RotatingFileHandler):
+                handler.close()
+
+    def get_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.jobs)
+        return self.executor
+
+    def make_dirs(self, entries):
+        """Makes directories and applies their attributes. With more than
+        one job, directories are made level by level (parents first) with
+        siblings made concurrently, then attributes are applied concurrently.
+        Failures are logged per path and reported with OSError in the end.
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        Return: List of booleans, True for directories made.
+        """
+        if self.jobs <= 1:
+            if DIR_FD_SUPPORTED:
+                return self.make_tree(entries)
+            return super().make_dirs(entries)
+
+        entries = self.get_entries(entries)
+        # {depth: {path: [indices of its entries]}}, so a path listed
+        # more than once is made (and changed) by one thread only.
+        levels = {}
+        for index, (path, attributes) in enumerate(entries):
+            path = os.path.normpath(path)
+            level = levels.setdefault(path.count(os.sep), OrderedDict())
+            level.setdefault(path, []).append(index)
+
+        executor = self.get_executor()
+        made = [False] * len(entries)
+        failed = set()
+
+        def make(indices):
+            try:
+                made[indices[0]] = self.make_dir(entries[indices[0]][0])
+            except OSError:
+                # Already logged by make_dir()
+                failed.update(indices)
+
+        def apply(indices):
+            # Entries of the same path are applied in order, as without jobs.
+            for index in indices:
+                if index in failed:
+                    continue
+                path, attributes = entries[index]
+                try:
+                    self.apply_attributes(path, attributes)
+                except OSError:
+                    self.logger.error("Can't set attributes of %s", path)
+                    failed.add(index)
+
+        for depth in sorted(levels):
+            list(executor.map(make, levels[depth].values()))
+        paths = [indices for depth in sorted(levels) for indices in levels[depth].values()]
+        list(executor.map(apply, paths))
+
+        if failed:
+            raise OSError("Couldn't make %s path(s)" % len(failed))
+        return made
+
+
+    def make_tree(self, entries):
+        """Makes directories walking their tree depth first. Every parent
+        is opened once, its children are made, opened and changed with
+        mkdir(dir_fd)/fchmod()/fchown() and the descriptors are closed
+        depth first, applying attributes on the way back (as make_dirs()
+        applies them after all directories are made). So a path is resolved
+        once instead of once per operation and directories renamed
+        meanwhile are still the ones we've opened.
+        Failures are logged per path and reported with OSError in the end.
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        Return: List of booleans, True for directories made.
+        """
+        entries = self.get_entries(entries)
+        indices = {}
+        for index, (path, attributes) in enumerate(entries):
+            indices.setdefault(os.path.abspath(path), []).append(index)
+
+        made = [False] * len(entries)
+        failed = set()
+        # Open directories: [(path, descriptor, indices of entries)]
+        stack = []
+
+        def close_top():
+            path, fd, opened = stack.pop()
+            try:
+                for index in opened:
+                    self.apply_attributes_fd(fd, path, entries[index][1])
+            except OSError as e:
+                self.logger.error("Can't set attributes of %s: %s", path, e)
+                failed.add(path)
+            finally:
+                os.close(fd)
+
+        def open_directory(path):
+            """Opens path with parents kept on the stack, making missing ones
+            (they aren't entries, so they get no attributes, as with make_dir()).
+            """
+            while stack and not (path + os.sep).startswith(stack[-1][0].rstrip(os.sep) + os.sep):
+                close_top()
+            if not stack:
+                stack.append((os.sep, os.open(os.sep, SEARCH_FLAGS), ()))
+            for name in path[len(stack[-1][0]) :].split(os.sep):
+                if not name:
+                    continue
+                parent = stack[-1]
+                path = os.path.join(parent[0], name)
+                try:
+                    fd = os.open(name, SEARCH_FLAGS, dir_fd=parent[1])
+                except FileNotFoundError:
+                    os.mkdir(name, dir_fd=parent[1])
+                    self.logger.info("Making %s", path)
+                    fd = os.open(name, SEARCH_FLAGS | os.O_NOFOLLOW, dir_fd=parent[1])
+                stack.append((path, fd, ()))
+
+        try:
+            # Sorting by components puts parents right before their children.
+            for path in sorted(indices, key=lambda path: path.split(os.sep)):
+                parent, name = os.path.split(path)
+                try:
+                    open_directory(parent)
+                    parent_fd = stack[-1][1]
+                    try:
+                        os.mkdir(name, dir_fd=parent_fd)
+                    except FileExistsError:
+                        self.logger.warning("Path exists, can't proceed %s", path)
+                        flags = 0
+                    else:
+                        self.logger.info("Making %s", path)
+                        for index in indices[path]:
+                            made[index] = True
+                        # We've just made it, so it can't be a link unless someone raced us:
+                        flags = os.O_NOFOLLOW
+
+                    try:
+                        fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | flags, dir_fd=parent_fd)
+                    except (NotADirectoryError, PermissionError):
+                        if flags:
+                            raise
+                        # Existing file (or directory we can't read) still gets
+                        # its attributes by path, as with make_dir()
+                        for index in indices[path]:
+                            self.apply_attributes(path, entries[index][1])
+                    else:
+                        stack.append((path, fd, indices[path]))
+                except OSError as e:
+                    self.logger.error("Couldn't make %s: %s", path, e)
+                    failed.add(path)
+        finally:
+            while stack:
+                close_top()
+
+        if failed:
+            raise OSError("Couldn't make %s path(s)" % len(failed))
+        return made
+
+    @staticmethod
+    def get_mode(current, attributes):
+        """Returns mode with write bits set as attributes (PathAttributes) say.
+        User's write permission is always kept, other bits are untouched.
+        """
+        mode = (current & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)) | stat.S_IWUSR
+        if attributes.group_write:
+            mode |= stat.S_IWGRP
+        if attributes.others_write:
+            mode |= stat.S_IWOTH
+        return mode
+
+    def get_ids(self, attributes):
+        """Returns (uid, gid) of attributes' names, -1 meaning no change.
+        Names are looked up once per driver.
+        """
+        ids = []
+        for name, lookup in ((attributes.user, getpwnam), (attributes.group, getgrnam)):
+            if not name:
+                ids += [-1]
+                continue
+            if (lookup, name) not in self.ids:
+                try:
+                    self.ids[(lookup, name)] = lookup(name)[2]
+                except KeyError:
+                    self.logger.error("Can't find specified user or group %s", name)
+                    raise OSError("Unknown user or group %s" % name)
+            ids += [self.ids[(lookup, name)]]
+        return tuple(ids)
+
+    def apply_attributes(self, path, attributes):
+        """Sets permissions and ownership of a path in one pass: target mode
+        and ids are computed from a single lstat() and chmod()/chown() are
+        skipped when they wouldn't change anything, so applying attributes
+        to an existing tree again costs a stat per path.
+
+        Params: path, attributes -> PathAttributes.
+        """
+        info = os.lstat(path)
+        if stat.S_ISLNK(info.st_mode):
+            # chmod() and chown() follow links, so does the comparison.
+            info = os.stat(path)
+        self.apply_attributes_info(info, path, attributes, os.chmod, os.chown, path)
+
+    def apply_attributes_fd(self, fd, path, attributes):
+        """Sets permissions and ownership of an opened directory
+        (see apply_attributes()).
+        """
+        self.apply_attributes_info(os.fstat(fd), path, attributes, os.fchmod, os.fchown, fd)
+
+    def apply_attributes_info(self, info, path, attributes, chmod, chown, target):
+        current = stat.S_IMODE(info.st_mode)
+        mode = self.get_mode(current, attributes)
+        if mode != current:
+            chmod(target, mode)
+            self.logger.info("set_permissions: %s (%s)", path, mode)
+
+        uid, gid = self.get_ids(attributes)
+        if uid == info.st_uid:
+            uid = -1
+        if gid == info.st_gid:
+            gid = -1
+        if uid != -1 or gid != -1:
+            chown(target, uid, gid)
+            self.logger.debug("set_ownership: %s (%s, %s)", path, uid, gid)
 
     def register_signals(self):
         return True
@@ -224,6 +487,168 @@ class LocalDevicePython(DeviceDriver, PluginManager):
         return True
 
 
+class ShellSession(object):
+    """One (sudo) bash process running many commands. Commands are streamed
+    to its stdin as NUL delimited argument lists and their return codes and
+    error output are read back in order, so a batch costs one fork/exec of
+    sudo instead of one per command. Process is started on first run()
+    and kept until close().
+
+    Only ALLOWED_COMMANDS are executed, anything else is reported as failed.
+    """
+
+    ALLOWED_COMMANDS = ("mkdir", "cp", "ln", "chmod", "chgrp", "chown")
+    # Idempotent commands taking many paths, which run_many() merges:
+    MERGED_COMMANDS = ("mkdir", "chmod", "chgrp", "chown")
+    MERGED_PATHS = 256
+
+    # Reads: argument count, arguments (all NUL terminated).
+    # Writes: return code, error output (both NUL terminated).
+    SCRIPT = r"""
+allowed=" %s "
+errors=$(mktemp) || exit 1
+trap 'rm -f "$errors"' EXIT
+while IFS= read -r -d '' count; do
+    args=()
+    for ((i = 0; i < count; i++)); do
+        IFS= read -r -d '' arg
+        args+=("$arg")
+    done
+    if [[ $count -lt 1 || "$allowed" != *" ${args[0]} "* ]]; then
+        printf '126\0%%s is not allowed\0' "${args[0]}"
+        continue
+    fi
+    # Error output goes through a file read by a builtin, so a command
+    # costs its own fork/exec only (no subshell):
+    command -- "${args[@]}" >/dev/null 2>"$errors"
+    code=$?
+    err=
+    if [[ $code -ne 0 ]]; then
+        IFS= read -r -d '' err <"$errors"
+    fi
+    printf '%%s\0%%s\0' "$code" "${err%%$'\n'}"
+done
+""" % " ".join(ALLOWED_COMMANDS)
+
+    def __init__(self, sudo=USE_SUDO):
+        self.sudo = sudo
+        self.process = None
+
+    def start(self):
+        if self.process is None or self.process.poll() is not None:
+            command = ["sudo"] if self.sudo else []
+            command += ["bash", "-c", self.SCRIPT]
+            self.process = Popen(command, shell=False, stdin=PIPE, stdout=PIPE, bufsize=0)
+        return self.process
+
+    @staticmethod
+    def encode(command):
+        fields = [str(len(command)).encode()] + [os.fsencode(arg) for arg in command]
+        return b"\0".join(fields) + b"\0"
+
+    @staticmethod
+    def write(stream, data):
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[stream.write(view):]
+        except OSError:
+            # Session died, missing results tell about it.
+            pass
+
+    @staticmethod
+    def read_fields(stream, count):
+        fields = []
+        buffer = b""
+        while len(fields) < count:
+            chunk = os.read(stream.fileno(), 65536)
+            if not chunk:
+                break
+            buffer += chunk
+            complete = buffer.split(b"\0")
+            buffer = complete.pop()
+            fields += complete
+        return fields
+
+    def run(self, commands):
+        """Runs commands (lists of arguments) in order.
+
+        Return: [(return code, error output), ...] per command,
+                return code is None if session ended before running it.
+        """
+        from threading import Thread
+
+        if not commands:
+            return []
+        process = self.start()
+        data = b"".join(self.encode(command) for command in commands)
+        # Written from a thread, as results are read meanwhile and big
+        # batches would otherwise fill up both pipes:
+        writer = Thread(target=self.write, args=(process.stdin, data))
+        writer.daemon = True
+        writer.start()
+        fields = self.read_fields(process.stdout, 2 * len(commands))
+        writer.join()
+
+        results = []
+        for index in range(len(commands)):
+            if 2 * index + 1 < len(fields):
+                code, error = fields[2 * index : 2 * index + 2]
+                results += [(int(code), os.fsdecode(error))]
+            else:
+                results += [(None, "Shell session ended")]
+        if len(fields) < 2 * len(commands):
+            self.close()
+        return results
+
+    def run_many(self, commands):
+        """Like run(), but consecutive MERGED_COMMANDS differing only by
+        their last argument (a path) run as one command with many paths.
+        Merged commands which fail are run again one by one (they are
+        idempotent), so results are still reported per command.
+        """
+        groups = []
+        for index, command in enumerate(commands):
+            if groups:
+                start, end = groups[-1]
+                first = commands[start]
+                if (
+                    command[0] in self.MERGED_COMMANDS
+                    and end - start < self.MERGED_PATHS
+                    and list(command[:-1]) == list(first[:-1])
+                ):
+                    groups[-1] = (start, index + 1)
+                    continue
+            groups += [(index, index + 1)]
+
+        merged = [
+            list(commands[start][:-1]) + [command[-1] for command in commands[start:end]]
+            for start, end in groups
+        ]
+        results = [None] * len(commands)
+        retried = []
+        for (start, end), result in zip(groups, self.run(merged)):
+            if result[0] == 0 or end - start == 1:
+                results[start:end] = [result] * (end - start)
+            else:
+                retried += range(start, end)
+        for index, result in zip(retried, self.run([commands[index] for index in retried])):
+            results[index] = result
+        return results
+
+    def close(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        try:
+            process.stdin.close()
+            process.wait(timeout=10)
+        except Exception:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
 class LocalDeviceShell(DeviceDriver, PluginManager):
     """The purpose of this class is to all sudo commands on local device.
     In time we would like to implement ssh access to a storage.
@@ -233,19 +658,31 @@ class LocalDeviceShell(DeviceDriver, PluginManager):
     type = PluginType.DeviceDriver
     logger = None
 
-    def __init__(self, log_level=INFO, **kwargs):
+    def __init__(self, log_level=INFO, sudo=USE_SUDO, **kwargs):
         name = self.__class__
        
 
         name = self.__class__.__name__
         self.logger = logging.getLogger(self.__class__.__name__)
         self.set_logger(level=log_level, filename=str(log_level) + ".log")
+        # Batch operations share one shell (see ShellSession), started on demand:
+        self.sudo = sudo
+        self.session = None
 
     def set_logger(self, level="DEBUG", filename="app.log"):
         """Set up basic logging configuration."""
 
         self.logger.setLevel(level)
         self.logger.propagate = False
+
+        # Handlers are shared by all instances (next ones only update levels),
+        # so making drivers doesn't open more and more log files.
+        handlers = [h for h in self.logger.handlers if getattr(h, "job_handler", False)]
+        if handlers:
+            for handler in handlers:
+                handler.setLevel(level)
+            return
+
         # Create a console handler
         console_handler = logging.StreamHandler()
         console_handler.setLevel(level)
@@ -257,7 +694,7 @@ class LocalDeviceShell(DeviceDriver, PluginManager):
 
         path = join(path, filename)
         # Create a file handler
-        file_handler = RotatingFileHandler(path)
+        file_handler = RotatingFileHandler(path, delay=True)
         file_handler.setLevel(level)
 
         # Create a formatter and add it to the handlers
@@ -266,9 +703,22 @@ class LocalDeviceShell(DeviceDriver, PluginManager):
         file_handler.setFormatter(formatter)
 
         # Add the handlers to the logger
+        console_handler.job_handler = True
+        file_handler.job_handler = True
         self.logger.addHandler(console_handler)
         self.logger.addHandler(file_handler)
 
+    def close(self):
+        """Ends shell session and closes log file (it's opened again
+        when something is logged).
+        """
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        for handler in self.logger.handlers:
+            if isinstance(handler, RotatingFileHandler):
+                handler.close()
+
     def register_signals(self):
         return True
 
@@ -278,6 +728,97 @@ class LocalDeviceShell(DeviceDriver, PluginManager):
 
         return isdir(path)
 
+    def get_session(self):
+        if self.session is None:
+            self.session = ShellSession(sudo=self.sudo)
+        return self.session
+
+    def make_dirs(self, entries):
+        """Makes directories and applies their attributes with a single shell
+        session. Existing paths are skipped (but get attributes) as make_dir()
+        does. All commands run even if some of them fail, failures are logged
+        per path and their entries are reported as not made.
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        Return: List of booleans, True for directories made.
+        """
+        entries = self.get_entries(entries)
+        commands = []
+        made = []
+        for path, attributes in entries:
+            if os.path.exists(path):
+                self.logger.warning("Path exists %s", path)
+                made += [False]
+            else:
+                commands += [("make", path, ["mkdir", "-p", path])]
+                made += [True]
+        commands += self.get_attribute_commands(entries)
+
+        failed = self.run_commands(commands)
+        for index, (path, attributes) in enumerate(entries):
+            if path in failed:
+                made[index] = False
+        if failed:
+            self.logger.error("Shell commands failed for %s path(s)", len(failed))
+        return made
+
+    def apply_attributes_many(self, entries):
+        """Sets permissions and ownership of many paths with a single shell
+        session. All commands run even if some of them fail, failures are
+        logged per path and reported with OSError in the end.
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        """
+        failed = self.run_commands(self.get_attribute_commands(self.get_entries(entries)))
+        if failed:
+            raise OSError("Shell commands failed for %s path(s)" % len(failed))
+
+    def get_attribute_commands(self, entries):
+        """Returns [(kind, path, command), ...] applying attributes. Write
+        permission of a user is always kept, other bits are left untouched.
+        Unknown users or groups raise OSError before anything is run.
+        """
+        known = set()
+        commands = []
+        for path, attributes in entries:
+            for name, lookup in ((attributes.user, getpwnam), (attributes.group, getgrnam)):
+                if name and (lookup, name) not in known:
+                    try:
+                        lookup(name)
+                    except KeyError:
+                        self.logger.error("Can't find specified user or group %s", name)
+                        raise OSError
+                    known.add((lookup, name))
+
+            mode = "u+w,g%sw,o%sw" % (
+                "+" if attributes.group_write else "-",
+                "+" if attributes.others_write else "-",
+            )
+            commands += [("chmod", path, ["chmod", mode, path])]
+            if attributes.group:
+                commands += [("ownership", path, ["chgrp", attributes.group, path])]
+            if attributes.user:
+                commands += [("ownership", path, ["chown", attributes.user, path])]
+        return commands
+
+    def run_commands(self, commands):
+        """Runs [(kind, path, command), ...] in the session and logs them
+        as single path operations do. Return: set of paths that failed.
+        """
+        results = self.get_session().run_many([command for kind, path, command in commands])
+        failed = set()
+        for (kind, path, command), (code, error) in zip(commands, results):
+            if code != 0:
+                self.logger.error("%s failed for %s: %s", " ".join(command[:-1]), path, error)
+                failed.add(path)
+            elif kind == "make":
+                self.logger.info("Making %s", path)
+            elif kind == "chmod":
+                self.logger.debug("%s (%s)", " ".join(command), "out")
+            else:
+                self.logger.debug("set_ownership: %s (%s)", path, " ".join(command[:-1]))
+        return failed
+
     def make_dir(self, path, sudo=USE_SUDO):
         """Uses Linux shell facility to create a directory tree."""
         from subprocess import Popen, PIPE
@@ -0,0 +1,142 @@
+from job.plugin import PluginType
+from plugins.localDeviceDriver import LocalDeviceShell
+from logging import INFO
+import os
+
+
+class LocalDeviceHelper(LocalDeviceShell):
+    """Device driver sending operations to a privileged helper (see
+    job.helper and 'job helper start') over its Unix socket, so neither
+    sudo nor any process is started per operation. Plugin refuses to
+    register when helper's socket doesn't exist.
+    """
+
+    name = "LocalDeviceHelper"
+    type = PluginType.DeviceDriver
+    logger = None
+
+    def __init__(self, log_level=INFO, socket_path=None, **kwargs):
+        from job.helper import HelperClient
+
+        super().__init__(log_level=log_level, **kwargs)
+        self.client = HelperClient(socket_path)
+
+    def close(self):
+        """Closes connection to helper and log file."""
+        self.client.close()
+        super().close()
+
+    def register_signals(self):
+        return os.path.exists(self.client.path)
+
+    def run_operations(self, operations):
+        """Sends operations to helper and logs failures.
+        Return: list of result dicts (see job.helper.HelperOperations).
+        """
+        from job.helper import HelperError
+
+        try:
+            results = self.client.run(operations)
+        except HelperError as e:
+            self.logger.error("Helper failed: %s", e)
+            raise OSError(str(e))
+        for operation, result in zip(operations, results):
+            if not result["ok"]:
+                self.logger.error("%s failed for %s: %s", operation["op"], operation.get("path"), result["error"])
+        return results
+
+    def run_operation(self, operation):
+        result = self.run_operations([operation])[0]
+        if not result["ok"]:
+            raise OSError(result["error"])
+        return result["value"]
+
+    def make_dir(self, path):
+        """Makes a directory tree with helper."""
+        if not self.run_operation({"op": "mkdir", "path": path}):
+            self.logger.warning("Path exists %s", path)
+            return False
+        self.logger.info("Making %s", path)
+        return True
+
+    def copy_file(self, source, target):
+        if not os.path.exists(source):
+            self.logger.warning("File doesn't exist %s", source)
+            return False
+        if os.path.exists(target):
+            self.logger.warning("File exists %s", target)
+            return False
+        self.run_operation({"op": "copy", "source": source, "path": target})
+        self.logger.debug("Copying %s to %s", source, target)
+        return True
+
+    def make_link(self, path, link_path):
+        if os.path.lexists(link_path):
+            if os.path.islink(link_path):
+                self.logger.warning("Link exists %s", link_path)
+            else:
+                self.logger.warning("Path exists, so I can't make a link here %s", link_path)
+            return False
+        self.run_operation({"op": "symlink", "target": path, "path": link_path})
+        self.logger.debug("Making symlink %s %s", path, link_path)
+        return True
+
+    def set_permissions(self, path, user=None, group=None, others=None):
+        """Set permissions flags as LocalDeviceShell.set_permissions() does."""
+        mode = 0o644 if user else 0o444
+        if group:
+            mode |= 0o020
+        if others:
+            mode |= 0o002
+        self.run_operation({"op": "chmod", "path": path, "mode": mode})
+        self.logger.debug("chmod %o %s", mode, path)
+
+    def set_ownership(self, path, user=None, group=None):
+        if not user and not group:
+            return False
+        self.run_operation({"op": "chown", "path": path, "user": user, "group": group})
+        self.logger.debug("set_ownership: %s (%s, %s)", path, user, group)
+        return True
+
+    def get_attribute_operations(self, entries):
+        return [
+            dict(attributes._asdict(), op="attributes", path=path)
+            for path, attributes in entries
+        ]
+
+    def make_dirs(self, entries):
+        """Makes directories and applies their attributes with a single
+        round trip to helper. Failures are logged per path and reported
+        with OSError in the end.
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        Return: List of booleans, True for directories made.
+        """
+        entries = self.get_entries(entries)
+        operations = [{"op": "mkdir", "path": path} for path, attributes in entries]
+        operations += self.get_attribute_operations(entries)
+        results = self.run_operations(operations)
+
+        made = []
+        for (path, attributes), result in zip(entries, results):
+            if result["ok"] and result["value"]:
+                self.logger.info("Making %s", path)
+            elif result["ok"]:
+                self.logger.warning("Path exists %s", path)
+            made += [bool(result["ok"] and result["value"])]
+        failed = set(operation["path"] for operation, result in zip(operations, results) if not result["ok"])
+        if failed:
+            raise OSError("Helper operations failed for %s path(s)" % len(failed))
+        return made
+
+    def apply_attributes_many(self, entries):
+        """Sets permissions and ownership of many paths with a single
+        round trip to helper.
+
+        Params: entries -> [(path, PathAttributes), ...] or paths.
+        """
+        operations = self.get_attribute_operations(self.get_entries(entries))
+        results = self.run_operations(operations)
+        failed = set(operation["path"] for operation, result in zip(operations, results) if not result["ok"])
+        if failed:
+            raise OSError("Helper operations failed for %s path(s)" % len(failed))
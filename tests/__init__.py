@@ -0,0 +1,7 @@
+import os, sys
+
+
+# Get modules: tests import job and plugins from repository's root.
+job_root_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if job_root_path not in sys.path:
+    sys.path.insert(0, job_root_path)
@@ -0,0 +1,78 @@
+import unittest
+import os, shutil, tempfile
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        from job.cache import RenderCache
+        self.root = tempfile.mkdtemp()
+        self.cache = RenderCache(path=self.root)
+        self.attributes = ("template", "user_dirs")
+        self.items = [
+            ("/jobs/sandbox", {"template": "job", "user_dirs": False}),
+            ("/jobs/sandbox/user", {"template": "user", "user_dirs": True}),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_store_load(self):
+        self.assertIsNone(self.cache.load("key", self.attributes))
+        self.assertTrue(self.cache.store("key", self.attributes, self.items))
+        self.assertEqual(self.cache.load("key", self.attributes), self.items)
+
+    def test_attributes_changed(self):
+        self.cache.store("key", self.attributes, self.items)
+        self.assertIsNone(self.cache.load("key", ("template",)))
+
+    def test_prune(self):
+        for number in range(5):
+            key = "key%d" % number
+            self.cache.store(key, self.attributes, self.items)
+            os.utime(self.cache.get_file(key), (number, number))
+        self.cache.MAX_FILES = 3
+        # Loading marks key0 as recently used:
+        self.assertIsNotNone(self.cache.load("key0", self.attributes))
+        self.cache.store("key5", self.attributes, self.items)
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            ["render-key0.json", "render-key4.json", "render-key5.json"],
+        )
+
+    def test_make_key(self):
+        from job.cache import make_key
+        self.assertEqual(make_key({"a": 1, "b": 2}), make_key({"b": 2, "a": 1}))
+        self.assertNotEqual(make_key({"a": 1}), make_key({"a": 2}))
+
+
+class TestSchemaSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.location = os.path.join(self.root, "schema")
+        os.mkdir(self.location)
+        self.file = os.path.join(self.location, "job.schema")
+        with open(self.file, "w") as file:
+            file.write("{}")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def get_snapshot(self):
+        from job.cache import SchemaSnapshot
+        return SchemaSnapshot([self.location], path=self.root)
+
+    def test_store_load(self):
+        from job.cache import get_stamp
+        stamps = [(self.location, get_stamp(self.location)), (self.file, get_stamp(self.file))]
+        self.assertIsNone(self.get_snapshot().load())
+        self.assertTrue(self.get_snapshot().store(stamps, {"job": {}}))
+        self.assertEqual(self.get_snapshot().load(), {"job": {}})
+
+        # Modified schema file invalidates snapshot:
+        with open(self.file, "w") as file:
+            file.write('{"version": 1}')
+        self.assertIsNone(self.get_snapshot().load())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import logging
+from importlib.util import find_spec
+from unittest.mock import MagicMock
+
+
+def setUpModule():
+    """Puts a stand-in project package (ProjectManager) into sys.modules,
+    unless the real one is installed, so commands can be imported."""
+    import sys
+    import types
+
+    if "project" not in sys.modules and find_spec("project") is None:
+        project = types.ModuleType("project")
+        project.ProjectManager = MagicMock(name="ProjectManager")
+        sys.modules["project"] = project
+        STUBS.append(project)
+
+
+def tearDownModule():
+    import sys
+
+    while STUBS:
+        if sys.modules.get("project") is STUBS.pop():
+            del sys.modules["project"]
+
+
+# Stand-in modules added by setUpModule():
+STUBS = []
+
+
+def make_command(shapes):
+    """CreateJobTemplate rendering assets with a fake ProjectManager,
+    which names directories after shapes[asset] (or asset by default).
+    """
+    from commands.create import CreateJobTemplate
+
+    command = CreateJobTemplate.__new__(CreateJobTemplate)
+    command.logger = logging.getLogger("TestCreateCommand")
+    command.logger.disabled = True
+    command.cli_options = {}
+    command.rendered = []
+
+    def render_job(project):
+        asset = project["asset"]
+        command.rendered += [asset]
+        command.manager = asset
+        name = shapes.get(asset, asset)
+        root = "/jobs/sh/%s" % name
+        return root, [root, root + "/common", root + "/" + name + "_comp"]
+
+    command.render_job = render_job
+    return command
+
+
+class TestRenderJobRange(unittest.TestCase):
+    def check_range(self, command, assets):
+        reference = make_command({})
+        expected = [(asset,) + reference.render_job({"asset": asset}) for asset in assets]
+        managers = []
+        result = []
+        for item in command.render_job_range({"project": "p"}, assets):
+            managers += [command.manager]
+            result += [item]
+        self.assertEqual(result, expected)
+        self.assertEqual(managers[0], assets[0])
+
+    def test_skeleton(self):
+        assets = ["sh%04d" % number for number in range(10, 200, 10)]
+        command = make_command({})
+        self.check_range(command, assets)
+        # First, last and one of each other length of name:
+        self.assertEqual(command.rendered, ["sh0010", "sh0190"])
+
+        assets = ["sh10", "sh20", "sh100", "sh1000", "sh2000", "sh30"]
+        command = make_command({})
+        self.check_range(command, assets)
+        self.assertEqual(command.rendered, ["sh10", "sh30", "sh100", "sh1000"])
+
+    def test_collision(self):
+        # "common" is also a directory of every asset, so it's rendered:
+        command = make_command({})
+        self.check_range(command, ["sh0010", "common", "sh0020", "sh0030"])
+        self.assertEqual(command.rendered, ["sh0010", "sh0030", "common"])
+
+    def test_different_shapes(self):
+        # Middle asset of its own length is rendered to a different shape:
+        shapes = {"sh100": "other"}
+        command = make_command(shapes)
+        assets = ["sh10", "sh20", "sh100", "sh30", "sh40"]
+        result = list(command.render_job_range({"project": "p"}, assets))
+        self.assertEqual(result[2], ("sh100",) + make_command(shapes).render_job({"asset": "sh100"}))
+        # Nothing is rendered twice:
+        self.assertEqual(sorted(command.rendered), sorted(assets))
+
+    def test_device_once(self):
+        command = make_command({})
+        command.plg_manager = MagicMock()
+        command.plg_manager.get_first_maching_plugin.return_value.is_dir.return_value = False
+        command.cli_options = {"fromdb": False, "asset": "sh[1-5]", "project": "p"}
+        devices = []
+        command.get_device = lambda: devices.append(command.manager) or MagicMock()
+        command.create_assets()
+        self.assertEqual(devices, ["sh0010"])
+
+
+if __name__ == '__main__':
+    unittest.main()
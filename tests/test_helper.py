@@ -0,0 +1,172 @@
+import unittest
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+
+class TestHelper(unittest.TestCase):
+    def setUp(self):
+        from job.helper import HelperServer, HelperClient
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "jobs")
+        os.mkdir(self.root)
+        self.socket_path = os.path.join(self.tmp, "helper.sock")
+        self.server = HelperServer(self.socket_path, [self.root])
+        self.server.logger.disabled = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.client = HelperClient(self.socket_path, timeout=10)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def test_operations(self):
+        path = os.path.join(self.root, "shot0010")
+        source = os.path.join(self.root, "source.txt")
+        with open(source, "w") as file:
+            file.write("source")
+        results = self.client.run([
+            {"op": "mkdir", "path": path},
+            {"op": "mkdir", "path": path},
+            {"op": "attributes", "path": path, "group_write": False, "others_write": False},
+            {"op": "symlink", "target": path, "path": os.path.join(self.root, "link")},
+            {"op": "copy", "source": source, "path": os.path.join(path, "copy.txt")},
+            {"op": "unknown"},
+        ])
+        self.assertEqual([result["ok"] for result in results], [True, True, True, True, True, False])
+        self.assertEqual([results[0]["value"], results[1]["value"]], [True, False])
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode) & 0o222, 0o200)
+        self.assertTrue(os.path.islink(os.path.join(self.root, "link")))
+        self.assertTrue(os.path.isfile(os.path.join(path, "copy.txt")))
+
+    def test_roots(self):
+        outside = os.path.join(self.tmp, "outside")
+        os.symlink(self.tmp, os.path.join(self.root, "escape"))
+        results = self.client.run([
+            {"op": "mkdir", "path": outside},
+            {"op": "mkdir", "path": os.path.join(self.root, "escape", "outside")},
+            {"op": "mkdir", "path": "relative"},
+            {"op": "copy", "source": "/etc/passwd", "path": os.path.join(self.root, "passwd")},
+        ])
+        self.assertFalse(any(result["ok"] for result in results))
+        self.assertIn("PermissionError", results[0]["error"])
+        self.assertFalse(os.path.exists(outside))
+
+    def test_links_not_followed(self):
+        outside = os.path.join(self.tmp, "outside")
+        os.mkdir(outside, 0o755)
+        os.symlink(outside, os.path.join(self.root, "escape"))
+        os.symlink(outside, os.path.join(self.root, "swapped"))
+        results = self.client.run([
+            {"op": "chmod", "path": os.path.join(self.root, "escape"), "mode": 0o777},
+            {"op": "attributes", "path": os.path.join(self.root, "escape"), "others_write": True},
+            {"op": "chmod", "path": os.path.join(self.root, "swapped", "."), "mode": 0o777},
+            {"op": "is_dir", "path": os.path.join(self.root, "escape")},
+        ])
+        self.assertFalse(any(result["ok"] for result in results[:3]))
+        self.assertEqual(results[3], {"ok": True, "value": False})
+        self.assertEqual(stat.S_IMODE(os.stat(outside).st_mode), 0o755)
+
+    def test_rejected(self):
+        path = os.path.join(self.root, "shot0010")
+        os.mkdir(path, 0o755)
+        results = self.client.run([
+            {"op": "chmod", "path": path, "mode": 0o6777},
+            {"op": "chmod", "path": path, "mode": 0o1775},
+            {"op": "chown", "path": path, "user": "root"},
+            {"op": "attributes", "path": path, "group": "root"},
+        ])
+        self.assertFalse(any(result["ok"] for result in results))
+        self.assertIn("PermissionError", results[0]["error"])
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o755)
+
+    def test_copy_strips_special_bits(self):
+        source = os.path.join(self.root, "tool")
+        with open(source, "w") as file:
+            file.write("tool")
+        os.chmod(source, 0o4755)
+        target = os.path.join(self.root, "copy")
+        self.assertTrue(self.client.run([{"op": "copy", "source": source, "path": target}])[0]["ok"])
+        self.assertEqual(stat.S_IMODE(os.stat(target).st_mode), 0o755)
+        self.assertEqual(os.stat(target).st_uid, os.getuid())
+
+    def test_can_read(self):
+        from job.helper import HelperOperations, HelperClientCredentials
+        source = os.path.join(self.root, "secret")
+        with open(source, "w") as file:
+            file.write("secret")
+        os.chown(source, 0, 0)
+        os.chmod(source, 0o640)
+        info = os.stat(source)
+        stranger = HelperClientCredentials(1, 65534, 65534, frozenset([65534]))
+        member = HelperClientCredentials(1, 65534, 65534, frozenset([65534, 0]))
+        self.assertFalse(HelperOperations.can_read(stranger, info))
+        self.assertTrue(HelperOperations.can_read(member, info))
+        result = self.server.operations.execute(
+            {"op": "copy", "source": source, "path": os.path.join(self.root, "stolen")}, stranger
+        )
+        self.assertFalse(result["ok"])
+        self.assertFalse(os.path.exists(os.path.join(self.root, "stolen")))
+
+    def test_owners(self):
+        from job.helper import HelperOperations
+        path = os.path.join(self.root, "shot0010")
+        os.mkdir(path)
+        operations = HelperOperations([self.root], users=["nobody"], groups=["nogroup"])
+        result = operations.execute({"op": "chown", "path": path, "user": "nobody", "group": "nogroup"}, None)
+        self.assertTrue(result["ok"])
+        self.assertEqual((os.stat(path).st_uid, os.stat(path).st_gid), (65534, 65534))
+
+    def test_unauthorized_client(self):
+        from job.helper import HelperServer, HelperClient, HelperError
+        path = os.path.join(self.tmp, "other.sock")
+        server = HelperServer(path, [self.root], clients=["nobody"])
+        server.logger.disabled = True
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = HelperClient(path, timeout=10)
+        self.addCleanup(client.close)
+        with self.assertRaises(HelperError):
+            client.run([{"op": "mkdir", "path": os.path.join(self.root, "shot0010")}])
+        self.assertFalse(os.path.exists(os.path.join(self.root, "shot0010")))
+
+    def test_pipelined_batches(self):
+        self.client.BATCH_SIZE = 7
+        paths = [os.path.join(self.root, "asset%04d" % number) for number in range(100)]
+        results = self.client.run([{"op": "mkdir", "path": path} for path in paths])
+        self.assertEqual(len(results), 100)
+        self.assertTrue(all(result["value"] for result in results))
+        self.assertTrue(self.client.ping())
+
+    def test_driver(self):
+        from plugins.localDeviceHelper import LocalDeviceHelper
+        from job.plugin import PathAttributes
+        driver = LocalDeviceHelper(socket_path=self.socket_path)
+        self.addCleanup(driver.close)
+        self.assertTrue(driver.register_signals())
+        parent = os.path.join(self.root, "parent")
+        child = os.path.join(parent, "child")
+        self.assertEqual(driver.make_dirs([parent, (child, PathAttributes(group_write=False))]), [True, True])
+        self.assertEqual(stat.S_IMODE(os.stat(child).st_mode) & 0o222, 0o200)
+        with self.assertRaises(OSError):
+            driver.make_dirs([os.path.join(self.tmp, "outside")])
+
+    def test_unreachable(self):
+        from job.helper import HelperClient, HelperError
+        client = HelperClient(os.path.join(self.tmp, "missing.sock"))
+        self.assertFalse(client.ping())
+        with self.assertRaises(HelperError):
+            client.run([{"op": "ping"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
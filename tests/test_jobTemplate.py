@@ -0,0 +1,461 @@
+import unittest
+import gc
+import json
+import logging
+import weakref
+from importlib.util import find_spec
+from unittest.mock import MagicMock, patch
+
+
+def setUpModule():
+    """Puts a stand-in project package (ProjectManager) into sys.modules,
+    unless the real one is installed, so job.template can be imported."""
+    import sys
+    import types
+
+    if "project" not in sys.modules and find_spec("project") is None:
+        project = types.ModuleType("project")
+        project.ProjectManager = MagicMock(name="ProjectManager")
+        sys.modules["project"] = project
+        STUBS.append(project)
+
+
+def tearDownModule():
+    import sys
+
+    while STUBS:
+        if sys.modules.get("project") is STUBS.pop():
+            del sys.modules["project"]
+
+
+# Stand-in modules added by setUpModule():
+STUBS = []
+
+
+SCHEMA = {
+    "job": {
+        "names": ["proj"],
+        "path_template": "@root",
+        "root": "/jobs",
+        "is_link": False,
+        "link_target": None,
+        "user_dirs": False,
+        "sub_dirs": [{"name": "shot", "type": "template"}],
+    },
+    "shot": {
+        "names": ["sh10", "sh20"],
+        "path_template": None,
+        "sub_dirs": [
+            {"name": "work", "type": "location", "options": {"names": ["work"], "user_dirs": True}},
+            {"name": "linked", "type": "template"},
+        ],
+    },
+    "linked": {"names": ["ln"], "is_link": True, "path_template": "@root", "sub_dirs": []},
+}
+
+
+def make_job(schema=SCHEMA, **kwargs):
+    """JobTemplate with given schema, without loading schema files."""
+    from job.template import JobTemplate, LocationTemplate
+    from job.pathtemplate import snapshot_environment
+
+    job = JobTemplate.__new__(JobTemplate)
+    job.logger = logging.getLogger("TestJobTemplate")
+    job.environ = snapshot_environment()
+    job.used_variables = {}
+    job.reported_variables = set()
+    job.schema_sources = []
+    job.schema_stamps = []
+    job.schema_variables = set()
+    LocationTemplate.__init__(job, schema, "job", **kwargs)
+    job.schema = schema
+    return job
+
+
+class TestResolve(unittest.TestCase):
+    def make_tree(self):
+        from job.template import LocationTemplate
+        root = LocationTemplate(schema={"job": {"root": "/jobs", "user_dirs": False}}, schema_type_name="job")
+        child = LocationTemplate(parent=root, root=None, names=["shot"])
+        grandchild = LocationTemplate(parent=child, user_dirs=None, names=None)
+        return root, child, grandchild
+
+    def test_inheritance(self):
+        root, child, grandchild = self.make_tree()
+        self.assertEqual(grandchild["root"], "/jobs")
+        self.assertEqual(grandchild["names"], ["shot"])
+        # None means inherit, other false values don't:
+        self.assertIs(grandchild["user_dirs"], False)
+        child["user_dirs"] = 0
+        self.assertEqual(grandchild["user_dirs"], 0)
+        self.assertEqual(grandchild.get_inherited("missing", "default"), "default")
+        # dict's get() still sees only own keys:
+        self.assertIsNone(grandchild.get("root"))
+        with self.assertRaises(KeyError):
+            grandchild["missing"]
+
+    def test_root_none(self):
+        from job.template import LocationTemplate
+        # Without a parent None is a value:
+        root = LocationTemplate(path_template=None)
+        self.assertIsNone(root["path_template"])
+
+    def test_invalidation(self):
+        root, child, grandchild = self.make_tree()
+        self.assertEqual(grandchild["root"], "/jobs")
+        root["root"] = "/other"
+        self.assertEqual(grandchild["root"], "/other")
+        child["root"] = "/child"
+        self.assertEqual(grandchild["root"], "/child")
+        del child["root"]
+        self.assertEqual(grandchild["root"], "/other")
+        root.update(root="/updated")
+        self.assertEqual(grandchild["root"], "/updated")
+        root.pop("root")
+        self.assertNotIn("root", grandchild._resolve())
+
+    def test_pickle(self):
+        import copy
+        import pickle
+        root, child, grandchild = self.make_tree()
+        root.child_templates = [child]
+        child.child_templates = [grandchild]
+        for restored in (pickle.loads(pickle.dumps(root)), copy.deepcopy(root)):
+            restored_grandchild = restored.child_templates[0].child_templates[0]
+            self.assertEqual(restored_grandchild["root"], "/jobs")
+            restored["root"] = "/restored"
+            self.assertEqual(restored_grandchild["root"], "/restored")
+        # Originals are left alone:
+        self.assertEqual(grandchild["root"], "/jobs")
+
+        duplicate = copy.copy(grandchild)
+        self.assertEqual(duplicate["root"], "/jobs")
+        child["root"] = "/child"
+        self.assertEqual(duplicate["root"], "/child")
+
+
+class TestExpandMany(unittest.TestCase):
+    template = "@root/@job_current/@job_asset_name/$JOB_TEST_VAR"
+
+    def make_job(self, **kwargs):
+        job = make_job(job_current="proj", **kwargs)
+        job.environ = dict(job.environ, JOB_TEST_VAR="work")
+        return job
+
+    def test_rows(self):
+        names = ["sh10", "sh20"]
+        # Same as a job per row:
+        expected = [
+            self.make_job(job_asset_name=name).expand_path_template(self.template) for name in names
+        ]
+        self.assertEqual(expected, ["/jobs/proj/sh10/work", "/jobs/proj/sh20/work"])
+
+        job = self.make_job()
+        self.assertEqual(job.expand_many(self.template, {"job_asset_name": names}), expected)
+        self.assertEqual(
+            job.expand_many(self.template, [(name,) for name in names], ("job_asset_name",)), expected
+        )
+        self.assertEqual(
+            job.expand_many(self.template, [{"job_asset_name": name} for name in names]), expected
+        )
+        # Rows override job's own keywords:
+        self.assertEqual(
+            job.expand_many(self.template, [("other", "sh10")], ("job_current", "job_asset_name")),
+            ["/jobs/other/sh10/work"],
+        )
+        self.assertEqual(job.used_variables, {"JOB_TEST_VAR": "work"})
+        # Job's path_template by default:
+        self.assertEqual(job.expand_many(rows=[{}, {}]), ["/jobs", "/jobs"])
+
+    def test_unresolved(self):
+        job = self.make_job()
+        job.logger = MagicMock()
+        with self.assertRaises(EnvironmentError):
+            job.expand_many(self.template, [{}])
+        job.logger.error.assert_called_once()
+
+
+class TestLoadSchemas(unittest.TestCase):
+    def test_schema_shop(self):
+        from job.template import LocationTemplate
+        job = make_job()
+        job.make_schema_object = lambda candidate, file: candidate
+        files = [("/schemas/job.schema", None, b"{}", {"version": 1})]
+        first = LocationTemplate.load_schemas(job, "/schemas", schema_files=files)
+        second = LocationTemplate.load_schemas(job, "/schemas", schema_files=files[:0])
+        self.assertEqual(first, {"job": {"version": 1}})
+        self.assertEqual(second, {})
+
+
+class TestLoadLocations(unittest.TestCase):
+    def setUp(self):
+        import os
+        import shutil
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.locations = []
+        for number, schemas in enumerate([
+            {"job": {"version": 1, "root": "/first"}, "shot": {"version": 1}},
+            {},
+            {"job": {"version": 1, "root": "/second"}, "asset": {"version": 1}},
+        ]):
+            location = os.path.join(self.root, str(number))
+            os.makedirs(os.path.join(location, "schema"))
+            os.makedirs(os.path.join(location, ".job"))
+            for name, schema in schemas.items():
+                with open(os.path.join(location, "schema", name + ".schema"), "w") as file:
+                    json.dump(schema, file)
+            self.locations += [location]
+
+    def make_job(self):
+        from job.schemaview import SchemaView
+        job = make_job()
+        job.schema = SchemaView()
+        job.schema_cache = False
+        job.make_schema_object = lambda candidate, file: candidate
+        return job
+
+    def load_serial(self, job):
+        """What load_schemas() did before reading locations in threads."""
+        import os
+        from job.template import LocationTemplate
+        schema = {}
+        for location in self.locations:
+            for postfix in job.JOB_PATH_POSTFIX:
+                path = os.path.join(location, postfix)
+                files = LocationTemplate.read_schema_files(path)
+                schema.update(LocationTemplate.load_schemas(job, path, {}, files))
+        return schema
+
+    def test_same_as_serial(self):
+        serial_job = self.make_job()
+        serial = self.load_serial(serial_job)
+        for workers in (1, 8):
+            job = self.make_job()
+            job.SCHEMA_LOAD_WORKERS = workers
+            self.assertTrue(job.load_schemas(self.locations))
+            self.assertEqual(list(job.schema.keys()), list(serial.keys()))
+            self.assertEqual(dict(job.schema), serial)
+            self.assertEqual(job.schema_sources, serial_job.schema_sources)
+        # Later location overrides the former:
+        self.assertEqual(job.schema["job"]["root"], "/second")
+
+    def test_invalid_schema(self):
+        import os
+        with open(os.path.join(self.locations[1], ".job", "broken.schema"), "w") as file:
+            file.write("{")
+        with self.assertRaises(ValueError):
+            self.load_serial(self.make_job())
+        job = self.make_job()
+        with self.assertRaises(ValueError):
+            job.load_schemas(self.locations)
+
+
+class TestShareSchema(unittest.TestCase):
+    def setUp(self):
+        from job.template import clear_shared_schemas
+        clear_shared_schemas()
+        self.addCleanup(clear_shared_schemas)
+
+    def share(self, source):
+        job = make_job()
+        job.schema_sources = [(source, "sha1")]
+        job.share_schema()
+        return job
+
+    def test_limit(self):
+        import job.template
+        with patch.object(job.template, "MAX_SHARED_SCHEMAS", 2):
+            first = self.share("first.schema")
+            self.share("second.schema")
+            # Recently used one is kept:
+            self.assertIs(self.share("first.schema").schema_graph, first.schema_graph)
+            self.share("third.schema")
+        self.assertEqual(
+            list(job.template._shared_schemas.keys()),
+            [(("first.schema", "sha1"),), (("third.schema", "sha1"),)],
+        )
+        # Dropped base still serves jobs made from it:
+        self.assertEqual(first.schema["job"]["root"], "/jobs")
+
+        job.template.clear_shared_schemas()
+        self.assertEqual(len(job.template._shared_schemas), 0)
+        self.assertIsNot(self.share("first.schema").schema_graph, first.schema_graph)
+
+
+class TestRenderedLocations(unittest.TestCase):
+    def test_records(self):
+        job = make_job()
+        targets = job.render()
+        locations = job.render_locations()
+        self.assertEqual([location.path for location in locations], list(targets.keys()))
+        for location in locations:
+            template = job.rendered_templates[location.template_id]
+            self.assertEqual(template.schema_type_name, targets[location.path].schema_type_name)
+            self.assertEqual(location.template, template.schema_type_name)
+            self.assertEqual(location["is_link"], template.get_inherited("is_link"))
+
+        linked = [location for location in locations if location.is_link]
+        self.assertEqual([location.path for location in linked], ["/jobs/ln"])
+        # Link goes to the first path of its parent template:
+        self.assertEqual(linked[0].parent_path, "/jobs/proj/sh10")
+        self.assertTrue(job.render_locations()[-2]["user_dirs"])
+
+    def test_release(self):
+        job = make_job()
+        job.render_locations()
+        children = [weakref.ref(template) for template in job.rendered_templates[1:]]
+        self.assertTrue(children)
+
+        locations = job.render_locations(release=True)
+        gc.collect()
+        self.assertEqual(job.rendered_templates, [])
+        self.assertEqual(job.child_templates, [])
+        self.assertTrue(all(location.template_id is None for location in locations))
+        self.assertTrue(all(child() is None for child in children))
+        # Records alone still tell everything:
+        self.assertEqual(locations[-1].parent_path, "/jobs/proj/sh10")
+
+    def test_render_cached(self):
+        from job.template import RenderedLocation
+        job = make_job()
+        locations = job.render_cached(cache=False)
+        self.assertEqual(list(locations.keys()), list(job.render().keys()))
+        self.assertTrue(all(isinstance(location, RenderedLocation) for location in locations.values()))
+        self.assertEqual(locations["/jobs/proj/sh20/work"].template, "work")
+
+
+class TestCreate(unittest.TestCase):
+    def make_job(self, schema=SCHEMA):
+        job = make_job(schema, job_current="proj", job_asset_name="sh10")
+        self.device = MagicMock()
+        # Read-only cached attributes live in instance's dict:
+        job.__dict__["manager"] = MagicMock()
+        job.__dict__["plg_manager"] = MagicMock()
+        job.plg_manager.get_first_maching_plugin.return_value = self.device
+        return job
+
+    def check_created(self, job, targets):
+        self.assertTrue(job.create(targets=targets))
+        entries = self.device.make_dirs.call_args[0][0]
+        self.assertEqual(sorted(path for path, attributes in entries), sorted(job.render().keys()))
+        # Link is made in the first path of its parent template:
+        self.device.make_link.assert_called_once_with("/jobs/ln", "/jobs/proj/sh10/ln")
+        job.manager.dry_load.assert_not_called()
+
+    def test_templates(self):
+        job = self.make_job()
+        self.check_created(job, job.render())
+
+    def test_records(self):
+        job = self.make_job()
+        self.check_created(job, job.render_cached(cache=False))
+
+    def test_attributes(self):
+        from job.plugin import PathAttributes
+        schema = dict(SCHEMA)
+        schema["shot"] = dict(
+            SCHEMA["shot"], permissions={"group": "read"}, ownership={"group": "render"}
+        )
+        shot = PathAttributes(group_write=False, group="render")
+        expected = {"/jobs/proj": PathAttributes(), "/jobs/proj/sh10": shot, "/jobs/proj/sh20/work": shot}
+        for render in ("render", "render_cached"):
+            job = self.make_job(schema)
+            targets = job.render() if render == "render" else job.render_cached(cache=False)
+            self.assertTrue(job.create(targets=targets))
+            attributes = dict(self.device.make_dirs.call_args[0][0])
+            for path, path_attributes in expected.items():
+                self.assertEqual(attributes[path], path_attributes)
+
+    def test_link_without_parent(self):
+        job = self.make_job()
+        locations = job.render_cached(cache=False)
+        job.logger = MagicMock()
+        # Parent template rendered no names:
+        locations["/jobs/ln"].parent_path = None
+        self.assertTrue(job.create(targets=locations))
+        self.device.make_link.assert_not_called()
+        job.logger.warning.assert_called_once_with("Can't find parent path of link: %s", "/jobs/ln")
+
+        targets = job.render()
+        del targets["/jobs/proj/sh10"], targets["/jobs/proj/sh20"]
+        self.assertTrue(job.create(targets=targets))
+        self.device.make_link.assert_not_called()
+
+    def test_manager_directories(self):
+        job = self.make_job()
+        job.manager.dry_load.return_value.get_all_directories.return_value = ["/jobs/proj"]
+        self.assertTrue(job.create())
+        self.assertEqual([path for path, attributes in self.device.make_dirs.call_args[0][0]], ["/jobs/proj"])
+        self.device.make_link.assert_not_called()
+
+
+class TestLazyAttributes(unittest.TestCase):
+    def make_job(self):
+        job = make_job()
+        job.log_level = "INFO"
+        job.project_settings = {"project": "proj"}
+        return job
+
+    def test_manager(self):
+        job = self.make_job()
+        with patch("job.template.ProjectManager") as project_manager:
+            self.assertNotIn("manager", job.__dict__)
+            self.assertIs(job.manager, job.manager)
+        project_manager.assert_called_once_with({"project": "proj"})
+        job.manager.dry_load.assert_called_once()
+        with self.assertRaises(AttributeError):
+            job.manager = None
+
+    def test_plugins_and_options(self):
+        job = self.make_job()
+        with patch("job.plugin.PluginManager") as plugin_manager:
+            self.assertIs(job.plg_manager, job.plg_manager)
+        plugin_manager.assert_called_once_with(log_level="INFO")
+
+        reader = job.plg_manager.get_plugin_by_name.return_value
+        job.__dict__["manager"] = MagicMock()
+        job.manager.eval_element.return_value = ["FileOptionReader"]
+        self.assertIs(job.preferences, job.preferences)
+        reader.assert_called_once_with(job, "preferences")
+        # Options aren't read until asked for:
+        self.assertNotIn("job_options", job.__dict__)
+        self.assertIs(job.job_options, job.job_options)
+        self.assertEqual(reader.call_count, 2)
+        job.plg_manager.get_first_maching_plugin.assert_not_called()
+
+
+class TestSetLogger(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        import shutil
+        self.home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home)
+        self.job = make_job()
+        self.job.logger = logging.getLogger("TestSetLogger%d" % id(self))
+
+    def tearDown(self):
+        for handler in list(self.job.logger.handlers):
+            self.job.logger.removeHandler(handler)
+            handler.close()
+
+    def test_levels(self):
+        import os
+        from logging.handlers import RotatingFileHandler
+        with patch.dict("os.environ", {"HOME": self.home}):
+            self.job.set_logger(level="DEBUG", filename="DEBUG.log")
+            self.job.set_logger(level="DEBUG", filename="DEBUG.log")
+            self.assertEqual(len(self.job.logger.handlers), 2)
+            self.job.set_logger(level="INFO", filename="INFO.log")
+
+        handlers = self.job.logger.handlers
+        self.assertEqual(len(handlers), 2)
+        self.assertTrue(all(handler.level == logging.INFO for handler in handlers))
+        files = [handler for handler in handlers if isinstance(handler, RotatingFileHandler)]
+        self.assertEqual([handler.baseFilename for handler in files],
+                         [os.path.join(self.home, ".job", "INFO.log")])
+
+
+if __name__ == '__main__':
+    unittest.main()
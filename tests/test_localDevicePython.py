@@ -19,12 +19,134 @@ class TestLocalDevicePython(unittest.TestCase):
         self.assertTrue(self.driver.is_dir(self.tmp))
         self.assertFalse(self.driver.is_dir(os.path.join(self.tmp, "nonexistent")))
 
+    def test_shared_handlers(self):
+        handlers = list(self.driver.logger.handlers)
+        driver = LocalDevicePython(log_level="INFO")
+        self.assertEqual(driver.logger.handlers, handlers)
+        driver.close()
+        self.driver.logger.debug("Logged after close()")
+
     def test_make_dir(self):
         new_dir = os.path.join(self.tmp, "new_dir")
         self.assertTrue(self.driver.make_dir(new_dir))
         self.assertTrue(os.path.exists(new_dir))
         self.assertFalse(self.driver.make_dir(new_dir))
 
+    def test_make_dirs(self):
+        from job.plugin import PathAttributes
+        parent = os.path.join(self.tmp, "parent")
+        child = os.path.join(parent, "child")
+        made = self.driver.make_dirs([(parent, None), (child, PathAttributes(group_write=False))])
+        self.assertEqual(made, [True, True])
+        self.assertEqual(stat.S_IMODE(os.stat(parent).st_mode) & 0o222, 0o220)
+        self.assertEqual(stat.S_IMODE(os.stat(child).st_mode) & 0o222, 0o200)
+
+    def test_make_dirs_parallel(self):
+        from job.plugin import PathAttributes
+        driver = LocalDevicePython(log_level="ERROR", jobs=4)
+        self.addCleanup(driver.close)
+        paths = [os.path.join(self.tmp, "shot%04d" % number) for number in range(20)]
+        paths += [os.path.join(path, dirname) for path in paths for dirname in ("comp", "anim")]
+        # Children listed before parents still work, as levels go first:
+        entries = [(path, PathAttributes(group_write=False)) for path in reversed(paths)]
+        made = driver.make_dirs(entries + [self.tmp])
+        self.assertEqual(made, [True] * len(paths) + [False])
+        self.assertTrue(all(os.path.isdir(path) for path in paths))
+        self.assertEqual(stat.S_IMODE(os.stat(paths[-1]).st_mode) & 0o222, 0o200)
+
+        with self.assertRaises(OSError):
+            driver.make_dirs(["/proc/nonexistent/path", os.path.join(self.tmp, "good")])
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp, "good")))
+
+        # Same path twice is made once, attributes go in order of entries:
+        twice = os.path.join(self.tmp, "twice")
+        made = driver.make_dirs([twice, (twice + os.sep, PathAttributes(group_write=False))])
+        self.assertEqual(made, [True, False])
+        self.assertEqual(stat.S_IMODE(os.stat(twice).st_mode) & 0o222, 0o200)
+
+    def test_make_dirs_parallel_failures(self):
+        from unittest.mock import patch
+        driver = LocalDevicePython(log_level="ERROR", jobs=4)
+        self.addCleanup(driver.close)
+        good = os.path.join(self.tmp, "good")
+        with patch.object(driver, "apply_attributes") as apply_attributes:
+            with self.assertRaises(OSError):
+                driver.make_dirs(["/proc/nonexistent/path", good])
+        # Attributes aren't applied to paths which weren't made:
+        self.assertEqual([call[0][0] for call in apply_attributes.call_args_list], [good])
+
+    def test_make_tree(self):
+        from getpass import getuser
+        from job.plugin import PathAttributes
+        from plugins.localDeviceDriver import DIR_FD_SUPPORTED
+        if not DIR_FD_SUPPORTED:
+            self.skipTest("dir_fd isn't supported")
+        # Roots behind symbolic links are followed, as with full paths:
+        root = os.path.join(self.tmp, "link")
+        os.symlink(self.tmp, root)
+        existing = os.path.join(root, "file")
+        open(existing, "w").close()
+        paths = [os.path.join(root, "job", "shot0010", name) for name in ("comp", "anim")]
+        paths += [os.path.join(root, "job"), os.path.join(root, "job", "shot0010")]
+        attributes = PathAttributes(group_write=False, user=getuser())
+        made = self.driver.make_tree([(path, attributes) for path in paths] + [existing])
+        self.assertEqual(made, [True, True, True, True, False])
+        for path in paths:
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode) & 0o222, 0o200)
+        self.assertEqual(stat.S_IMODE(os.stat(existing).st_mode) & 0o222, 0o220)
+
+        with self.assertRaises(OSError):
+            self.driver.make_tree([os.path.join(existing, "child"), os.path.join(root, "other")])
+        self.assertTrue(os.path.isdir(os.path.join(root, "other")))
+
+    def test_make_tree_intermediate(self):
+        from plugins.localDeviceDriver import DIR_FD_SUPPORTED
+        if not DIR_FD_SUPPORTED:
+            self.skipTest("dir_fd isn't supported")
+        path = os.path.join(self.tmp, "job", "shot0010")
+        with self.assertLogs(self.driver.logger, "INFO") as logs:
+            self.assertEqual(self.driver.make_tree([path]), [True])
+        messages = [record.getMessage() for record in logs.records]
+        self.assertEqual(messages[:2], ["Making " + os.path.join(self.tmp, "job"), "Making " + path])
+
+    def test_make_tree_unreadable(self):
+        from job.plugin import PathAttributes
+        from plugins.localDeviceDriver import DIR_FD_SUPPORTED
+        if not DIR_FD_SUPPORTED:
+            self.skipTest("dir_fd isn't supported")
+        path = os.path.join(self.tmp, "unreadable")
+        os.mkdir(path, 0o375)
+        child = os.path.join(path, "child")
+        real_open = os.open
+
+        def open_unreadable(name, flags, *args, **kwargs):
+            # As for a user without read permission (root always has it):
+            if name == "unreadable" and not flags & getattr(os, "O_PATH", 0):
+                raise PermissionError(13, "Permission denied", name)
+            return real_open(name, flags, *args, **kwargs)
+
+        with patch("os.open", open_unreadable):
+            made = self.driver.make_tree([(path, PathAttributes(group_write=False)), child])
+        self.assertEqual(made, [False, True])
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o355)
+        self.assertTrue(os.path.isdir(child))
+
+    def test_apply_attributes(self):
+        from getpass import getuser
+        from job.plugin import PathAttributes
+        path = os.path.join(self.tmp, "attributes")
+        os.mkdir(path, 0o755)
+        attributes = PathAttributes(group_write=True, others_write=False, user=getuser())
+        self.driver.apply_attributes(path, attributes)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o775)
+
+        # Nothing changes, nothing is called:
+        with patch("os.chmod") as chmod, patch("os.chown") as chown:
+            self.driver.apply_attributes(path, attributes)
+            self.driver.apply_attributes_many([(path, attributes)])
+        chmod.assert_not_called()
+        chown.assert_not_called()
+
     def test_copy_file(self):
         source_file = os.path.join(self.tmp, "source_file")
         target_file = os.path.join(self.tmp, "target_file")
@@ -1,5 +1,5 @@
 import unittest
-import os, sys, tempfile, logging
+import os, sys, shutil, tempfile, logging
 from logging import INFO
 
 
@@ -79,6 +79,62 @@ class TestLocalDeviceShell(unittest.TestCase):
         os.system("ls -la %s" % self.root)
 
 
+class TestShellSession(unittest.TestCase):
+    def setUp(self):
+        from plugins.localDeviceDriver import ShellSession
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.session = ShellSession(sudo=False)
+        self.addCleanup(self.session.close)
+
+    def test_run(self):
+        target = os.path.join(self.root, "with space\nand newline")
+        results = self.session.run([["mkdir", "-p", target], ["rm", "-rf", target], ["chmod", "g+w", "/nonexistent"]])
+        self.assertEqual(results[0], (0, ""))
+        self.assertTrue(os.path.isdir(target))
+        self.assertEqual(results[1][0], 126)
+        self.assertNotEqual(results[2][0], 0)
+        self.assertIn("/nonexistent", results[2][1])
+        # Session is reused:
+        process = self.session.process
+        self.assertEqual(self.session.run([["chmod", "g-w", target]]), [(0, "")])
+        self.assertIs(self.session.process, process)
+
+    def test_run_many(self):
+        good = [os.path.join(self.root, name) for name in ("a", "b")]
+        commands = [["mkdir", "-p", good[0]], ["mkdir", "-p", "/proc/nonexistent/a"], ["mkdir", "-p", good[1]]]
+        results = self.session.run_many(commands)
+        self.assertEqual([code for code, error in results], [0, 1, 0])
+        self.assertTrue(all(os.path.isdir(path) for path in good))
+
+
+class TestLocalDeviceShellBatch(unittest.TestCase):
+    def setUp(self):
+        from plugins.localDeviceDriver import LocalDeviceShell
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.device = LocalDeviceShell(sudo=False)
+        self.addCleanup(self.device.close)
+
+    def test_make_dirs(self):
+        import stat
+        from job.plugin import PathAttributes
+        parent = os.path.join(self.root, "parent")
+        child = os.path.join(parent, "child")
+        made = self.device.make_dirs([parent, (child, PathAttributes(group_write=False))])
+        self.assertEqual(made, [True, True])
+        self.assertEqual(stat.S_IMODE(os.stat(parent).st_mode) & 0o222, 0o220)
+        self.assertEqual(stat.S_IMODE(os.stat(child).st_mode) & 0o222, 0o200)
+        self.assertEqual(self.device.make_dirs([parent]), [False])
+
+    def test_failures(self):
+        good = os.path.join(self.root, "good")
+        self.device.logger.disabled = True
+        self.addCleanup(setattr, self.device.logger, "disabled", False)
+        self.assertEqual(self.device.make_dirs(["/proc/nonexistent/path", good]), [False, True])
+        self.assertTrue(os.path.isdir(good))
+
+
 # class LocalDevicePythonTest(LocalDeviceShellTest):
 #     def setUp(self):
 #         from job.plugin import PluginManager 
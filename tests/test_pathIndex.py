@@ -0,0 +1,62 @@
+import unittest
+
+
+class TestPathIndex(unittest.TestCase):
+    def setUp(self):
+        from job.index import PathIndex
+        self.paths = [
+            ("/jobs/sandbox", "job"),
+            ("/jobs/sandbox/shot0010", "shot"),
+            ("/jobs/sandbox/shot0010/comp", "comp"),
+            ("/jobs/sandbox/shot0020", "shot"),
+            ("/jobs/sandbox/shot0010/anim", "anim"),
+        ]
+        self.index = PathIndex(self.paths)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertIn("/jobs/sandbox/shot0010", self.index)
+        self.assertIn("/jobs/sandbox/shot0010/", self.index)
+        self.assertNotIn("/jobs", self.index)
+        self.assertNotIn("/jobs/sandbox/shot0030", self.index)
+        self.assertEqual(self.index["/jobs/sandbox/shot0010/comp"], "comp")
+        self.assertIsNone(self.index.get("/jobs"))
+        with self.assertRaises(KeyError):
+            self.index["/jobs"]
+
+    def test_parent_children(self):
+        self.assertEqual(self.index.parent("/jobs/sandbox/shot0010/comp"), "/jobs/sandbox/shot0010")
+        self.assertEqual(self.index.parent("/jobs/sandbox/shot0010/comp/work"), "/jobs/sandbox/shot0010/comp")
+        self.assertIsNone(self.index.parent("/jobs/sandbox"))
+        self.assertEqual(
+            self.index.children("/jobs/sandbox/shot0010"),
+            ["/jobs/sandbox/shot0010/comp", "/jobs/sandbox/shot0010/anim"],
+        )
+        self.assertEqual(self.index.children("/nothing"), [])
+
+    def test_subtree_order(self):
+        self.assertEqual(
+            [path for path, value in self.index.subtree("/jobs/sandbox/shot0010")],
+            ["/jobs/sandbox/shot0010", "/jobs/sandbox/shot0010/comp", "/jobs/sandbox/shot0010/anim"],
+        )
+        self.assertEqual(
+            list(self.index),
+            [
+                "/jobs/sandbox",
+                "/jobs/sandbox/shot0010",
+                "/jobs/sandbox/shot0010/comp",
+                "/jobs/sandbox/shot0010/anim",
+                "/jobs/sandbox/shot0020",
+            ],
+        )
+
+    def test_find(self):
+        from job.index import PathIndex
+        shot = object()
+        index = PathIndex([("/jobs/a", shot), ("/jobs/b", shot)])
+        self.assertEqual(index.find(shot), "/jobs/a")
+        self.assertIsNone(index.find(object()))
+
+
+if __name__ == '__main__':
+    unittest.main()
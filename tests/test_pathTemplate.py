@@ -0,0 +1,111 @@
+import unittest
+
+
+class TestCompiledPathTemplate(unittest.TestCase):
+    def setUp(self):
+        from job.pathtemplate import compile_path_template
+        self.compile = compile_path_template
+        self.keywords = {"root": "/mnt/jobs", "job_current": "sandbox"}
+
+    def test_expand(self):
+        compiled = self.compile("@root/@job_current/$JOB_TEST_VAR/work")
+        path = compiled.expand(self.keywords, environ={"JOB_TEST_VAR": "user"})
+        self.assertEqual(path, "/mnt/jobs/sandbox/user/work")
+        self.assertEqual(compiled.keywords, ("root", "job_current"))
+        self.assertEqual(compiled.variables, ("JOB_TEST_VAR",))
+
+    def test_list_template(self):
+        compiled = self.compile(["@root", "@job_current"])
+        self.assertEqual(compiled.expand(self.keywords), "/mnt/jobs/sandbox")
+
+    def test_cached(self):
+        self.assertIs(self.compile("@root/a"), self.compile("@root/a"))
+        self.assertIs(self.compile(["@root", "a"]), self.compile(["@root", "a"]))
+
+    def test_unresolved(self):
+        compiled = self.compile("@root/@job_asset_name")
+        with self.assertRaises(EnvironmentError) as context:
+            compiled.expand(self.keywords)
+        self.assertEqual(context.exception.args[0], "@job_asset_name")
+
+        with self.assertRaises(EnvironmentError):
+            self.compile("$JOB_NOT_SET_VAR").expand({}, environ={})
+
+    def test_expand_many(self):
+        compiled = self.compile("@root/@job_current/@job_asset_name/$JOB_TEST_VAR")
+        environ = {"JOB_TEST_VAR": "work"}
+        expected = ["/mnt/jobs/sandbox/sh0010/work", "/mnt/jobs/sandbox/sh0020/work"]
+        rows = [("sh0010",), ("sh0020",)]
+        self.assertEqual(
+            compiled.expand_many(rows, ("job_asset_name",), self.keywords, environ), expected
+        )
+        rows = [{"job_asset_name": "sh0010"}, {"job_asset_name": "sh0020"}]
+        self.assertEqual(compiled.expand_many(rows, None, self.keywords, environ), expected)
+
+        with self.assertRaises(EnvironmentError) as context:
+            compiled.expand_many([{}], None, self.keywords, environ)
+        self.assertEqual(context.exception.args[0], "@job_asset_name")
+        with self.assertRaises(EnvironmentError):
+            compiled.expand_many([("sh0010",)], ("job_asset_name",), {}, environ)
+
+    def test_wrong_type(self):
+        with self.assertRaises(EnvironmentError):
+            self.compile(None)
+
+
+class TestCompiledSubstitution(unittest.TestCase):
+    def setUp(self):
+        from job.pathtemplate import compile_substitution, snapshot_environment
+        self.compile = compile_substitution
+        self.environ = snapshot_environment({"JOB_SEQ": "s01", "JOB_EMPTY": ""})
+
+    def test_substitute(self):
+        used = {}
+        text, unresolved = self.compile("/jobs/$JOB_SEQ/${JOB_SEQ}_comp").substitute(self.environ, used)
+        self.assertEqual(text, "/jobs/s01/s01_comp")
+        self.assertEqual(unresolved, ())
+        self.assertEqual(used, {"JOB_SEQ": "s01"})
+        self.assertEqual(self.compile("a$JOB_EMPTY").substitute(self.environ), ("a", ()))
+
+    def test_unresolved(self):
+        text, unresolved = self.compile("/jobs/$JOB_NOT_SET/$JOB_SEQ").substitute(self.environ)
+        self.assertEqual(text, "/jobs/$JOB_NOT_SET/s01")
+        self.assertEqual(unresolved, ("JOB_NOT_SET",))
+
+    def test_snapshot(self):
+        from job.pathtemplate import snapshot_environment
+        environ = {"JOB_SEQ": "s01"}
+        snapshot = snapshot_environment(environ)
+        environ["JOB_SEQ"] = "s02"
+        self.assertEqual(snapshot["JOB_SEQ"], "s01")
+        with self.assertRaises(TypeError):
+            snapshot["JOB_SEQ"] = "s02"
+
+
+class TestPathSkeleton(unittest.TestCase):
+    def test_expand(self):
+        from job.pathtemplate import PathSkeleton
+        paths = ["/jobs/sandbox/shot0010", "/jobs/sandbox/shot0010/shot0010_comp"]
+        skeleton = PathSkeleton(paths, "shot0010")
+        self.assertEqual(skeleton.expand("shot0010"), paths)
+        self.assertEqual(
+            skeleton.expand("shot0020"),
+            ["/jobs/sandbox/shot0020", "/jobs/sandbox/shot0020/shot0020_comp"],
+        )
+        self.assertEqual(len(skeleton), 2)
+
+    def test_verify(self):
+        from job.pathtemplate import PathSkeleton
+        skeleton = PathSkeleton(["/jobs/sh/sh0010", "/jobs/sh/sh0010/comp"], "sh0010")
+        self.assertTrue(skeleton.verify("sh0020", skeleton.expand("sh0020")))
+        # "sh" is also a fixed directory, so its expansion is ambiguous:
+        self.assertFalse(skeleton.verify("sh", skeleton.expand("sh")))
+
+    def test_empty_token(self):
+        from job.pathtemplate import PathSkeleton
+        with self.assertRaises(ValueError):
+            PathSkeleton(["/jobs"], "")
+
+
+if __name__ == '__main__':
+    unittest.main()
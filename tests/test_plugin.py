@@ -0,0 +1,203 @@
+import unittest
+
+
+class TestPluginIndex(unittest.TestCase):
+    def test_lookups(self):
+        from job.plugin import PluginManager, PluginType
+
+        class IndexedSamplePlugin(PluginManager):
+            name = "IndexedSamplePlugin"
+            type = PluginType.Sample
+
+            def register_signals(self):
+                return True
+
+        manager = PluginManager()
+        plugin = manager.get_plugin_by_name("IndexedSamplePlugin")
+        self.assertIsInstance(plugin, IndexedSamplePlugin)
+        self.assertIn(plugin, manager.get_plugin_by_type(PluginType.Sample))
+        with self.assertRaises(OSError):
+            manager.get_plugin_by_name("NoSuchPlugin")
+
+    def test_cache_invalidation(self):
+        from job.plugin import PluginManager, PluginType
+
+        manager = PluginManager()
+        names = ["LateSamplePlugin", "NoSuchPlugin"]
+        self.assertIsNone(manager.get_first_maching_plugin(names))
+
+        class LateSamplePlugin(PluginManager):
+            name = "LateSamplePlugin"
+            type = PluginType.Sample
+
+            def register_signals(self):
+                return True
+
+        plugin = manager.get_first_maching_plugin(names)
+        self.assertIsInstance(plugin, LateSamplePlugin)
+        self.assertIs(manager.get_first_maching_plugin(list(names)), plugin)
+
+    def test_cache_per_class(self):
+        import gc
+        import weakref
+        from job.plugin import PluginManager, PluginType
+
+        class SharedSamplePlugin(PluginManager):
+            name = "SharedSamplePlugin"
+            type = PluginType.Sample
+
+            def register_signals(self):
+                return True
+
+        manager = PluginManager()
+        plugin = manager.get_first_maching_plugin(["SharedSamplePlugin"])
+        self.assertIs(PluginManager().get_first_maching_plugin(["SharedSamplePlugin"]), plugin)
+        # Lookups don't keep managers alive:
+        manager = weakref.ref(manager)
+        gc.collect()
+        self.assertIsNone(manager())
+
+
+class TestPluginPool(unittest.TestCase):
+    def test_pooled_instances(self):
+        from job.plugin import PluginManager, PluginType
+        made = []
+        closed = []
+
+        class PooledSamplePlugin(PluginManager):
+            name = "PooledSamplePlugin"
+            type = PluginType.Sample
+
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                made.append(self)
+
+            def register_signals(self):
+                return True
+
+            def close(self):
+                closed.append(self)
+
+        # Nothing is made until requested:
+        self.assertEqual(made, [])
+        plugin = PluginManager.create("PooledSamplePlugin")
+        self.assertIs(PluginManager().get_plugin_by_name("PooledSamplePlugin"), plugin)
+        debug = PluginManager.create(PooledSamplePlugin, log_level="DEBUG")
+        self.assertIsNot(debug, plugin)
+        self.assertEqual(debug.log_level, "DEBUG")
+        self.assertIs(PluginManager.create(PooledSamplePlugin, log_level="DEBUG"), debug)
+        self.assertEqual(len(made), 2)
+
+        PluginManager.close_plugins()
+        self.assertEqual(sorted(map(id, closed)), sorted([id(plugin), id(debug)]))
+        self.assertIsNot(PluginManager.create("PooledSamplePlugin"), plugin)
+
+    def test_refused_plugin(self):
+        from job.plugin import PluginManager, PluginType
+
+        class RefusedSamplePlugin(PluginManager):
+            name = "RefusedSamplePlugin"
+            type = PluginType.Sample
+
+            def register_signals(self):
+                return False
+
+        manager = PluginManager()
+        self.assertIsNone(PluginManager.create("RefusedSamplePlugin"))
+        self.assertIsNone(manager.get_first_maching_plugin(["RefusedSamplePlugin"]))
+        with self.assertRaises(OSError):
+            manager.get_plugin_by_name("RefusedSamplePlugin")
+        self.assertNotIn(RefusedSamplePlugin, map(type, manager.get_plugin_by_type(PluginType.Sample)))
+
+
+class TestDeviceDriverBatch(unittest.TestCase):
+    def test_fallback(self):
+        from job.plugin import DeviceDriver, PathAttributes
+        calls = []
+
+        class LegacyDriver(DeviceDriver):
+            def make_dir(self, path):
+                calls.append(("make_dir", path))
+                return True
+
+            def set_permissions(self, path, user=None, group=None, others=None):
+                calls.append(("set_permissions", path, user, group, others))
+
+            def set_ownership(self, path, user=None, group=None):
+                calls.append(("set_ownership", path, user, group))
+
+        made = LegacyDriver().make_dirs(["/a", ("/a/b", PathAttributes(False, user="render"))])
+        self.assertEqual(made, [True, True])
+        self.assertEqual(
+            calls,
+            [
+                ("make_dir", "/a"),
+                ("make_dir", "/a/b"),
+                ("set_permissions", "/a", True, True, False),
+                ("set_permissions", "/a/b", True, False, False),
+                ("set_ownership", "/a/b", "render", None),
+            ],
+        )
+
+    def test_native_operations(self):
+        from job.plugin import DeviceDriver, PluginManager
+
+        class LegacyDriver(DeviceDriver):
+            pass
+
+        class BatchDriver(DeviceDriver):
+            def make_dirs(self, entries):
+                return []
+
+        self.assertEqual(PluginManager.get_native_operations(LegacyDriver()), [])
+        self.assertEqual(PluginManager.get_native_operations(BatchDriver), ["make_dirs"])
+        self.assertEqual(PluginManager.get_native_operations(object()), [])
+
+    def test_path_attributes(self):
+        from job.plugin import PathAttributes, get_path_attributes
+        self.assertEqual(get_path_attributes(), PathAttributes())
+        self.assertEqual(
+            get_path_attributes({"group": "read", "others": "write"}, {"user": "render"}),
+            PathAttributes(group_write=False, others_write=True, user="render"),
+        )
+        self.assertEqual(get_path_attributes({"group": False}, {"group": "fx"}),
+                         PathAttributes(group_write=False, group="fx"))
+
+
+class TestCachedMethod(unittest.TestCase):
+    def test_list_arguments(self):
+        from job.utils import CachedMethod
+        calls = []
+
+        @CachedMethod
+        def total(values):
+            calls.append(values)
+            return sum(values)
+
+        self.assertEqual(total([1, 2]), 3)
+        self.assertEqual(total([1, 2]), 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(total(set([1, 2])), 3)
+        self.assertEqual(len(calls), 2)
+
+        total.invalidate()
+        total([1, 2])
+        self.assertEqual(len(calls), 3)
+
+    def test_bounded(self):
+        from job.utils import CachedMethod
+        calls = []
+
+        @CachedMethod.bounded(2)
+        def double(value):
+            calls.append(value)
+            return value * 2
+
+        for value in (1, 2, 3, 3, 2, 1):
+            double(value)
+        self.assertEqual(calls, [1, 2, 3, 1])
+        self.assertEqual(len(double.cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
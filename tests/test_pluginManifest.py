@@ -0,0 +1,92 @@
+import unittest
+import os, sys
+import shutil
+import tempfile
+
+
+SAMPLE_PLUGIN = """
+from job.plugin import PluginManager, PluginType
+
+
+class ManifestSamplePlugin(PluginManager):
+    name = "ManifestSamplePlugin"
+    type = PluginType.Sample
+
+    def register_signals(self):
+        return True
+
+
+class DerivedSamplePlugin(ManifestSamplePlugin):
+    name = "DerivedSamplePlugin"
+
+
+class NotAPlugin(object):
+    name = "NotAPlugin"
+"""
+
+
+class TestPluginManifest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.package = "jobtestplugins_%d" % id(self)
+        self.package_path = os.path.join(self.root, self.package)
+        os.mkdir(self.package_path)
+        with open(os.path.join(self.package_path, "__init__.py"), "w") as file:
+            file.write("")
+        with open(os.path.join(self.package_path, "sample.py"), "w") as file:
+            file.write(SAMPLE_PLUGIN)
+        sys.path.insert(0, self.root)
+
+    def tearDown(self):
+        sys.path.remove(self.root)
+        shutil.rmtree(self.root)
+
+    def test_scan(self):
+        from job.plugin import PluginManifest
+        manifest = PluginManifest(self.package, path=self.root)
+        module = self.package + ".sample"
+        self.assertEqual(
+            manifest.entries,
+            [
+                {"name": "ManifestSamplePlugin", "type": "Sample", "module": module,
+                 "class": "ManifestSamplePlugin"},
+                {"name": "DerivedSamplePlugin", "type": None, "module": module,
+                 "class": "DerivedSamplePlugin"},
+            ],
+        )
+        self.assertEqual(manifest.find_modules(name="ManifestSamplePlugin"), [module])
+        self.assertEqual(manifest.find_modules(type="DeviceDriver"), [module])
+        self.assertEqual(manifest.find_modules(name="Nothing", type="Sample"), [])
+        self.assertEqual(manifest.find_class("DerivedSamplePlugin"), module)
+        self.assertIsNone(manifest.find_class("NotAPlugin"))
+        # Nothing was imported:
+        self.assertNotIn(module, sys.modules)
+
+    def test_cache(self):
+        from job.plugin import PluginManifest
+        entries = PluginManifest(self.package, path=self.root).entries
+        manifest = PluginManifest(self.package, path=self.root)
+        self.assertEqual(manifest.load_cached(), entries)
+
+        with open(os.path.join(self.package_path, "other.py"), "w") as file:
+            file.write(SAMPLE_PLUGIN.replace("Manifest", "Other"))
+        self.assertIsNone(manifest.load_cached())
+        manifest = PluginManifest(self.package, path=self.root)
+        self.assertEqual(len(manifest.entries), 4)
+
+    def test_lazy_import(self):
+        from job.plugin import PluginManager
+        module = self.package + ".sample"
+        manifest = PluginManager.add_plugins_package(self.package, path=self.root)
+        self.addCleanup(PluginManager._plugins_manifests.remove, manifest)
+        manager = PluginManager()
+        self.assertNotIn(module, sys.modules)
+        plugin = manager.get_plugin_by_name("ManifestSamplePlugin")
+        self.assertIn(module, sys.modules)
+        self.assertEqual(plugin.__class__.__name__, "ManifestSamplePlugin")
+        with self.assertRaises(OSError):
+            manager.get_plugin_by_name("NoSuchPlugin")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import os, json, shutil, tempfile
+
+
+class Device(object):
+    def make_dir(self, path):
+        return path
+
+    def is_dir(self, path):
+        return False
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        from job.profile import Profiler
+        self.profiler = Profiler()
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_phases_and_counters(self):
+        with self.profiler.phase("schemas.load"):
+            pass
+        with self.profiler.phase("schemas.load"):
+            pass
+        self.profiler.count("schemas.files", 3)
+        self.profiler.add_template("shot", 0.001, 2, 1)
+        self.profiler.add_template("shot", 0.001, 2, 3)
+
+        self.assertEqual(self.profiler.phases["schemas.load"][0], 2)
+        self.assertEqual(self.profiler.counters["schemas.files"], 3)
+        self.assertEqual(self.profiler.templates["shot"][2:], [4, 3])
+        self.assertIn("schemas.load", self.profiler.report())
+
+    def test_disabled(self):
+        from job.profile import Profiler
+        profiler = Profiler(enabled=False)
+        with profiler.phase("schemas.load"):
+            pass
+        profiler.add_time("render", 0.001)
+        profiler.count("schemas.files", 3)
+        profiler.add_template("shot", 0.001, 2, 1)
+        self.assertEqual(profiler.phases, {})
+        self.assertEqual(profiler.templates, {})
+        self.assertEqual(profiler.counters, {})
+
+    def test_instrument(self):
+        from job.profile import Profiler
+        device = self.profiler.instrument(Device(), ("make_dir",), prefix="device.")
+        self.assertEqual(device.make_dir("/tmp/a"), "/tmp/a")
+        self.assertFalse(device.is_dir("/tmp/a"))
+        self.assertEqual(list(self.profiler.phases), ["device.make_dir"])
+
+        device = Device()
+        self.assertIs(Profiler(enabled=False).instrument(device, ("make_dir",)), device)
+
+    def test_profiled(self):
+        from job.profile import profiled, get_profiler
+        path = os.path.join(self.root, "profile.json")
+        with profiled(path) as profiler:
+            self.assertIs(get_profiler(), profiler)
+            with get_profiler().phase("render"):
+                pass
+        self.assertFalse(get_profiler().enabled)
+
+        with open(path) as file:
+            report = json.load(file)
+        self.assertEqual(report["phases"]["render"]["calls"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
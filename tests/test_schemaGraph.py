@@ -0,0 +1,64 @@
+import unittest
+import logging
+
+
+class TestSchemaGraph(unittest.TestCase):
+    def setUp(self):
+        self.schema = {
+            "job": {
+                "names": ["@job_current"],
+                "sub_dirs": [
+                    {"name": "shot", "type": "template"},
+                    {"name": "missing", "type": "template"},
+                    {"name": "docs", "type": "location", "options": {"user_dirs": True}},
+                ],
+            },
+            "shot": {
+                "names": ["sh10"],
+                "sub_dirs": [{"name": "work", "type": "location", "options": None}],
+            },
+        }
+        self.logger = logging.getLogger("TestSchemaGraph")
+        self.logger.disabled = True
+
+    def test_build(self):
+        from job.graph import SchemaGraph
+        graph = SchemaGraph.build(self.schema, self.logger)
+        resolved = graph.get(self.schema["job"]["sub_dirs"])
+        self.assertEqual([name for name, definition in resolved], ["shot", "docs"])
+        self.assertIs(resolved[0][1], self.schema["shot"])
+        self.assertEqual(resolved[1][1], {"sub_dirs": [], "user_dirs": True, "names": ["docs"]})
+        self.assertEqual(graph.missing, [("job", "missing")])
+        # Schemas stay untouched:
+        self.assertEqual(sorted(self.schema), ["job", "shot"])
+
+    def test_overridden_sub_dirs(self):
+        from job.graph import SchemaGraph
+        graph = SchemaGraph.build(self.schema, self.logger)
+        sub_dirs = list(self.schema["job"]["sub_dirs"])
+        self.assertIsNone(graph.get(sub_dirs))
+        self.assertEqual([name for name, definition in graph.children(sub_dirs)], ["shot", "docs"])
+
+    def test_changed_templates(self):
+        from job.graph import SchemaGraph
+        graph = SchemaGraph.build(self.schema, self.logger)
+        sub_dirs = self.schema["job"]["sub_dirs"]
+        self.assertIsNotNone(graph.get(sub_dirs, set(["docs", "other"])))
+        self.assertIsNone(graph.get(sub_dirs, set(["shot"])))
+
+    def test_cycle(self):
+        from job.graph import SchemaGraph, SchemaGraphError
+        self.schema["shot"]["sub_dirs"] += [{"name": "job", "type": "template"}]
+        with self.assertRaises(SchemaGraphError):
+            SchemaGraph.build(self.schema, self.logger)
+
+    def test_inherited_sub_dirs_cycle(self):
+        from job.graph import SchemaGraph, SchemaGraphError
+        # Template without own sub_dirs renders its parent's ones again.
+        del self.schema["shot"]["sub_dirs"]
+        with self.assertRaises(SchemaGraphError):
+            SchemaGraph.build(self.schema, self.logger)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os, json, shutil, tempfile
+
+
+class TestSchemaPack(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.locations = [os.path.join(self.root, "a"), os.path.join(self.root, "b")]
+        for location in self.locations:
+            os.mkdir(location)
+        self.write("a", "job.schema", {"version": "0.1.0", "names": ["$JOB_ROOT"]})
+        self.write("b", "job.schema", {"version": "0.1.0", "names": ["jobs"]})
+        self.write("a", "job.options", {"--rez": ["maya"]})
+        self.write("b", "job.preferences", {"plugin": {"DeviceDriver": "LocalDevicePython"}})
+        self.pack_file = os.path.join(self.root, "schema.pack")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, location, name, document):
+        with open(os.path.join(self.root, location, name), "w") as file:
+            json.dump(document, file)
+
+    def test_build(self):
+        from job.pack import SchemaPack
+        pack = SchemaPack.build(self.locations)
+        # Later location overrides former one:
+        self.assertEqual(pack.schemas["job"]["names"], ["jobs"])
+        # Options only come from option locations:
+        self.assertEqual(pack.options, {})
+        self.assertEqual(pack.variables, ["JOB_ROOT"])
+        self.assertEqual(len(pack.sources), 2)
+
+    def test_write_read(self):
+        from job.pack import SchemaPack
+        pack = SchemaPack.build(self.locations)
+        pack.write(self.pack_file)
+        loaded = SchemaPack.read(self.pack_file)
+        self.assertEqual(loaded.schemas, pack.schemas)
+        self.assertEqual(loaded.options, pack.options)
+        self.assertEqual(loaded.digest, pack.digest)
+        self.assertFalse(loaded.is_stale())
+
+        self.write("a", "shot.schema", {"version": "0.1.0"})
+        self.assertTrue(loaded.is_stale())
+
+    def test_quick_stale(self):
+        from job.pack import SchemaPack
+        SchemaPack.build(self.locations).write(self.pack_file)
+        loaded = SchemaPack.read(self.pack_file)
+        self.assertFalse(loaded.is_stale(quick=True))
+
+        schema = os.path.join(self.root, "b", "job.schema")
+        self.write("b", "job.schema", {"version": "0.1.0", "names": ["edit"]})
+        os.utime(schema, (1, 1))
+        self.assertTrue(loaded.is_stale(quick=True))
+
+        SchemaPack.build(self.locations).write(self.pack_file)
+        loaded = SchemaPack.read(self.pack_file)
+        self.write("a", "shot.schema", {"version": "0.1.0"})
+        os.utime(self.locations[0], (1, 1))
+        self.assertTrue(loaded.is_stale(quick=True))
+
+    def test_option_locations(self):
+        from job.pack import SchemaPack
+        pack = SchemaPack.build(self.locations, self.locations[:1])
+        self.assertEqual(pack.options["options"]["--rez"], ["maya"])
+        self.assertEqual(pack.options["preferences"], {})
+        self.assertEqual(len(pack.sources), 3)
+        pack.write(self.pack_file)
+        self.assertEqual(SchemaPack.read(self.pack_file).option_locations, self.locations[:1])
+        self.assertFalse(SchemaPack.read(self.pack_file).is_stale())
+
+    def test_option_reads(self):
+        from job.pack import SchemaPack, get_option_locations
+        from plugins.fileOptionReader import FileOptionReader
+
+        class Job(object):
+            JOB_PATH_POSTFIX = ["schema", ".job"]
+            OPTION_FILE_EXTENSION = "options"
+            schema_pack = None
+
+            def get_local_schema_path(self):
+                return []
+
+        for location in ("schema", os.path.join("schema", ".job"), ".job"):
+            os.makedirs(os.path.join(self.root, "job", location))
+        self.write(os.path.join("job", "schema"), "job.options", {"--rez": ["maya"], "--root": "/a"})
+        self.write(os.path.join("job", "schema", ".job"), "job.options", {"--root": "/b"})
+        # FileOptionReader never reads job/.job:
+        self.write(os.path.join("job", ".job"), "job.options", {"--root": "/c"})
+
+        job = Job()
+        reader = FileOptionReader()
+        reader.job = job
+        directory = os.path.join(self.root, "job")
+        unpacked = reader.load_from_file(directory, "options")
+        self.assertEqual(unpacked, {"--rez": ("maya",), "--root": "/b"})
+
+        locations = get_option_locations(directory, Job.JOB_PATH_POSTFIX)
+        SchemaPack.build(self.locations, locations).write(self.pack_file)
+        job.schema_pack = SchemaPack.read(self.pack_file)
+        self.assertEqual(reader(job), unpacked)
+
+    def test_corrupted(self):
+        from job.pack import SchemaPack, SchemaPackError
+        data = SchemaPack.build(self.locations).dumps()
+        with open(self.pack_file, "wb") as file:
+            file.write(data[:-1] + b" ")
+        with self.assertRaises(SchemaPackError):
+            SchemaPack.read(self.pack_file)
+        with self.assertRaises(SchemaPackError):
+            SchemaPack.loads(data[:10])
+
+
+if __name__ == '__main__':
+    unittest.main()
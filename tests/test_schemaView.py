@@ -0,0 +1,41 @@
+import unittest
+
+
+class TestSchemaView(unittest.TestCase):
+    def setUp(self):
+        from job.schemaview import SchemaView
+        self.base = SchemaView({"job": {"names": ["job"]}, "shot": {"names": ["shot"]}}).freeze()
+        self.first = SchemaView(self.base)
+        self.second = SchemaView(self.base)
+
+    def test_copy_on_write(self):
+        self.first["shot"] = {"names": ["changed"]}
+        self.first["docs"] = {"names": ["docs"]}
+        del self.first["job"]
+        self.assertEqual(list(self.first), ["shot", "docs"])
+        self.assertEqual(self.first["shot"], {"names": ["changed"]})
+        self.assertNotIn("job", self.first)
+        self.assertEqual(self.first.changed, set(["job", "shot", "docs"]))
+
+        # Neither base nor other views see it:
+        self.assertEqual(list(self.second), ["job", "shot"])
+        self.assertEqual(self.second["shot"], {"names": ["shot"]})
+        self.assertEqual(self.base["shot"], {"names": ["shot"]})
+        with self.assertRaises(TypeError):
+            self.base["shot"] = {}
+
+    def test_freeze(self):
+        self.assertIs(self.first.freeze(), self.base)
+        self.first["docs"] = {}
+        self.assertEqual(list(self.first.freeze()), ["job", "shot", "docs"])
+
+    def test_pickle(self):
+        import pickle
+        self.first["docs"] = {}
+        view = pickle.loads(pickle.dumps(self.first))
+        self.assertEqual(dict(view), dict(self.first))
+        self.assertEqual(view.changed, set(["docs"]))
+
+
+if __name__ == '__main__':
+    unittest.main()